@@ -0,0 +1,486 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+import ssl
+import json
+import time
+import queue
+import asyncio
+from urllib.parse import urlparse, urlencode
+import src.utils.config as config
+import src.utils.helper as helper
+import src.utils.metrics as metrics
+import src.utils.logger as logger
+import src.api.simulator as simulator
+from src.api.client import VmiRecord, WATCH_TIMEOUT, HTTP_GONE
+from src.utils.logger import vm_event
+
+logger = logger.MyLogger.__call__().get_logger()
+
+kube_client = helper.LazyModule('kubernetes.client')
+kube_config = helper.LazyModule('kubernetes.config')
+exceptions = helper.LazyModule('openshift.dynamic.exceptions')
+
+JSON = "application/json"
+MERGE_PATCH = "application/merge-patch+json"
+APPLY_PATCH = "application/apply-patch+yaml"
+HTTP_CONFLICT = 409
+SIM_WATCH_POLL = 0.05  # seconds between simulated watch queue polls
+
+
+def api_path(api_version, plural, namespace=None, name=None):
+    """
+    :param api_version: like 'v1' or 'kubevirt.io/v1alpha3'
+    :return: REST path, like /apis/kubevirt.io/v1alpha3/namespaces/ns/virtualmachines/vm
+    """
+    path = ("/apis/" if "/" in api_version else "/api/") + api_version
+    if namespace is not None:
+        path += "/namespaces/" + namespace
+    path += "/" + plural
+    if name is not None:
+        path += "/" + name
+    return path
+
+
+class AsyncApiError(Exception):
+    def __init__(self, status, reason, method, path):
+        Exception.__init__(self, status, reason, method, path)
+        self.status = status
+        self.reason = reason
+        self.method = method
+        self.path = path
+
+    def summary(self):
+        return "{method} {path}: {status} {reason}".format(
+            method=self.method, path=self.path, status=self.status, reason=self.reason)
+
+    def __str__(self):
+        return self.summary()
+
+
+async def _read_head(reader):
+    """
+    :return: (status, reason, headers with lower case names)
+    """
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("apiserver closed the connection")
+    parts = line.decode('latin-1').split(" ", 2)
+    status, reason = int(parts[1]), parts[2].strip() if len(parts) > 2 else ""
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return status, reason, headers
+        key, _, value = line.decode('latin-1').partition(":")
+        headers[key.strip().lower()] = value.strip()
+
+
+async def _body(reader, headers):
+    """
+    Response body pieces: chunked, Content-Length or up to the end of the connection
+    """
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("apiserver closed the connection")
+            size = int(line.split(b";")[0].strip(), 16)
+            if size == 0:
+                # trailers end with an empty line
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return
+            yield await reader.readexactly(size)
+            await reader.readexactly(2)
+    elif 'content-length' in headers:
+        length = int(headers['content-length'])
+        if length:
+            yield await reader.readexactly(length)
+    else:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            yield data
+
+
+def _json(data):
+    if not data:
+        return {}
+    try:
+        return json.loads(data.decode('utf-8'))
+    except ValueError:
+        return {'message': data.decode('utf-8', 'replace')}
+
+
+class HttpTransport(object):
+    """
+    HTTP/1.1 to the apiserver on asyncio streams. Requests share up to
+    pool_size keep-alive connections, a watch gets a connection of its own.
+    """
+
+    def __init__(self, host, headers=None, ssl_context=None, pool_size=config.ASYNC_POOL_MAXSIZE):
+        """
+        :param host: apiserver URL, like https://api.example.com:6443
+        :param headers: headers of every request (Authorization)
+        :param ssl_context: SSLContext for https
+        :param pool_size: max open connections for requests
+        """
+        url = urlparse(host)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == 'https' else 80)
+        self.prefix = url.path.rstrip("/")
+        self.ssl_context = (ssl_context or ssl.create_default_context()) if url.scheme == 'https' else None
+        self.headers = {'Host': url.netloc, 'Accept': JSON, 'User-Agent': config.RUN_LABEL_VALUE}
+        self.headers.update(headers or {})
+        self.connects = 0  # connections opened
+        self._idle = []  # keep-alive (reader, writer)
+        self._connections = asyncio.Semaphore(pool_size)
+
+    @classmethod
+    def from_kubeconfig(cls, pool_size=config.ASYNC_POOL_MAXSIZE):
+        """
+        Transport with the cluster URL, TLS files and token of the kubeconfig
+        """
+        configuration = kube_client.Configuration()
+        kube_config.load_kube_config(client_configuration=configuration)
+        ssl_context = ssl.create_default_context(cafile=configuration.ssl_ca_cert)
+        if not configuration.verify_ssl:
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+        if configuration.cert_file:
+            ssl_context.load_cert_chain(configuration.cert_file, configuration.key_file)
+        headers = {}
+        token = configuration.get_api_key_with_prefix('authorization')
+        if token:
+            headers['Authorization'] = token
+        return cls(configuration.host, headers=headers, ssl_context=ssl_context, pool_size=pool_size)
+
+    async def _open(self):
+        self.connects += 1
+        return await asyncio.open_connection(self.host, self.port, ssl=self.ssl_context)
+
+    def _head(self, method, path, params, data, content_type):
+        params = [(key, value) for key, value in sorted((params or {}).items()) if value is not None]
+        headers = dict(self.headers)
+        if data is not None:
+            headers['Content-Type'] = content_type
+            headers['Content-Length'] = str(len(data))
+        elif method != 'GET':
+            headers['Content-Length'] = "0"
+        lines = ["{method} {target} HTTP/1.1".format(
+            method=method, target=self.prefix + path + ("?" + urlencode(params) if params else ""))]
+        lines.extend("{key}: {value}".format(key=key, value=value) for key, value in headers.items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + (data or b"")
+
+    async def request(self, method, path, params=None, body=None, content_type=JSON):
+        """
+        :param body: JSON body
+        :return: (status, reason, response body dict)
+        """
+        data = json.dumps(body, separators=(',', ':')).encode('utf-8') if body is not None else None
+        async with self._connections:
+            while True:
+                reused = bool(self._idle)
+                reader, writer = self._idle.pop() if reused else await self._open()
+                try:
+                    writer.write(self._head(method, path, params, data, content_type))
+                    await writer.drain()
+                    status, reason, headers = await _read_head(reader)
+                    payload = b"".join([piece async for piece in _body(reader, headers)])
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused:
+                        # the apiserver closed the idle connection, take the next one
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                if headers.get('connection', '').lower() == 'close' or \
+                        ('content-length' not in headers and 'chunked' not in headers.get('transfer-encoding', '')):
+                    writer.close()
+                else:
+                    self._idle.append((reader, writer))
+                return status, reason, _json(payload)
+
+    async def stream(self, path, params=None):
+        """
+        Streaming GET (watch) on a connection of its own
+        :return: async generator of the JSON lines of the response
+        """
+        reader, writer = await self._open()
+        try:
+            writer.write(self._head('GET', path, params, None, None))
+            await writer.drain()
+            status, reason, headers = await _read_head(reader)
+            if status >= 400:
+                payload = b"".join([piece async for piece in _body(reader, headers)])
+                raise AsyncApiError(status, _json(payload).get('message') or reason, 'GET', path)
+            pending = b""
+            async for piece in _body(reader, headers):
+                lines = (pending + piece).split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    if line.strip():
+                        yield json.loads(line.decode('utf-8'))
+        finally:
+            writer.close()
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop()[1].close()
+
+
+SIM_PATH = re.compile(
+    r"^/(?:api/v1|apis/[^/]+/[^/]+)(?:/namespaces/(?P<namespace>[^/]+))?/(?P<plural>[a-z]+)"
+    r"(?:/(?P<name>[^/]+))?(?:/(?P<subresource>[a-z]+))?$"
+)
+SIM_KINDS = {
+    'namespaces': 'Namespace', 'virtualmachines': 'VirtualMachine', 'virtualmachineinstances': 'VirtualMachineInstance'
+}
+
+
+class SimulatedTransport(object):
+    """
+    Transport over the in process SimulatedCluster, the API latency is an asyncio sleep
+    """
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+
+    def _route(self, path):
+        match = SIM_PATH.match(path)
+        if match is None or match.group('plural') not in SIM_KINDS:
+            raise simulator._api_error(exceptions.NotFoundError, 404, "Simulated path not found: {path}".format(
+                path=path))
+        return SIM_KINDS[match.group('plural')], match.group('namespace'), match.group('name'), \
+            match.group('subresource')
+
+    def _handle(self, method, path, params, body, content_type):
+        kind, namespace, name, subresource = self._route(path)
+        if subresource is not None and method == 'PUT' and kind == 'VirtualMachine':
+            self.cluster.vm_action(namespace, name, subresource)
+            return {}
+        if subresource is None and method == 'GET' and name is None:
+            after = tuple(params['continue'].split("/", 1)) if params.get('continue') else None
+            items, resource_version, more = self.cluster.list(
+                kind, namespace=namespace, label_selector=params.get('labelSelector'),
+                field_selector=params.get('fieldSelector'), limit=params.get('limit'), after=after)
+            metadata = {'resourceVersion': resource_version}
+            if more:
+                last = items[-1]['metadata']
+                metadata['continue'] = "{ns}/{name}".format(ns=last.get('namespace', ''), name=last['name'])
+            return {'metadata': metadata, 'items': items}
+        if subresource is None and method == 'POST' and name is None and kind == 'Namespace':
+            self.cluster.create_namespace(body)
+            return body
+        if subresource is None and method == 'POST' and name is None and kind == 'VirtualMachine':
+            self.cluster.create_vm(body, namespace)
+            return body
+        if subresource is None and method == 'PATCH' and kind == 'VirtualMachine':
+            if content_type == APPLY_PATCH:
+                # create or leave as is, like SimulatedResource.server_side_apply
+                try:
+                    self.cluster.create_vm(body, namespace)
+                except exceptions.ConflictError:
+                    pass
+                return body
+            if 'running' in (body.get('spec') or {}):
+                self.cluster.vm_action(namespace, name, 'start' if body['spec']['running'] else 'stop')
+                return {}
+        raise simulator._api_error(exceptions.MethodNotAllowedError, 405, "Simulated {method} {path}".format(
+            method=method, path=path))
+
+    async def request(self, method, path, params=None, body=None, content_type=JSON):
+        if self.cluster.api_latency:
+            await asyncio.sleep(self.cluster.api_latency)
+        try:
+            self.cluster.admit()
+            return 200, "OK", self._handle(method, path, params or {}, body, content_type)
+        except exceptions.DynamicApiError as err:
+            return err.status, err.reason, {'message': err.reason}
+
+    async def stream(self, path, params=None):
+        params = params or {}
+        kind = self._route(path)[0]
+        self.cluster.admit()
+        watcher = self.cluster.subscribe(kind, params.get('resourceVersion'))
+        if watcher is None:
+            yield {'type': 'ERROR', 'object': {'code': HTTP_GONE}}
+            return
+        end_time = time.time() + int(params['timeoutSeconds']) if params.get('timeoutSeconds') else None
+        try:
+            while end_time is None or time.time() < end_time:
+                try:
+                    _, event_type, obj = watcher.get_nowait()
+                except queue.Empty:
+                    await asyncio.sleep(SIM_WATCH_POLL)
+                    continue
+                if simulator.match_labels(obj['metadata'].get('labels'), params.get('labelSelector')):
+                    yield {'type': event_type, 'object': obj}
+        finally:
+            self.cluster.unsubscribe(kind, watcher)
+
+    async def close(self):
+        pass
+
+
+class AsyncClient(object):
+    """
+    Asyncio API to the cluster (python 3): VM create, namespaces, lifecycle
+    subresources and VMI list/watch. All calls run on one event loop over the
+    keep-alive connections of the transport, a semaphore caps the requests in
+    flight. Create it in the loop that uses it.
+    """
+
+    def __init__(self, transport, concurrency=config.ASYNC_CONCURRENCY):
+        """
+        :param transport: HttpTransport or SimulatedTransport
+        :param concurrency: max requests in flight
+        """
+        self.transport = transport
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    @classmethod
+    def for_client(cls, client, concurrency=config.ASYNC_CONCURRENCY):
+        """
+        :param client: Client, its simulated cluster or else the kubeconfig cluster is used
+        :return: AsyncClient to the cluster of client
+        """
+        if isinstance(client.dyn_client, simulator.SimulatedDynamicClient):
+            return cls(SimulatedTransport(client.dyn_client.cluster), concurrency=concurrency)
+        return cls(HttpTransport.from_kubeconfig(), concurrency=concurrency)
+
+    async def request(self, call, method, path, params=None, body=None, content_type=JSON):
+        """
+        :param call: call label of the API metrics
+        :return: response body dict
+        :raise AsyncApiError: the apiserver answered with an error status
+        """
+        async with self.semaphore:
+            start = time.time()
+            try:
+                status, reason, data = await self.transport.request(
+                    method, path, params=params, body=body, content_type=content_type)
+            except Exception:
+                metrics.API_ERRORS.inc(call)
+                raise
+            finally:
+                metrics.API_LATENCY.observe(time.time() - start, call)
+        if status >= 400:
+            metrics.API_ERRORS.inc(call)
+            raise AsyncApiError(status, data.get('message') or reason, method, path)
+        return data
+
+    async def add_namespace(self, ns_name):
+        """
+        Add namespace, an existing one is not an error
+        """
+        body = {
+            'apiVersion': 'v1',
+            'kind': 'Namespace',
+            'metadata': {'name': ns_name, 'labels': {config.RUN_LABEL_KEY: config.RUN_LABEL_VALUE}}
+        }
+        try:
+            await self.request("add_namespace", 'POST', api_path('v1', 'namespaces'), body=body)
+        except AsyncApiError as err:
+            if err.status != HTTP_CONFLICT:
+                raise
+            logger.info("Namespace {ns} already exists".format(ns=ns_name))
+            return
+        logger.info("Namespace {ns} added".format(ns=ns_name))
+
+    async def create_vm(self, yaml_body, namespace, method=config.CREATE_POST):
+        """
+        :param yaml_body: VM body
+        :param method: CREATE_POST or CREATE_APPLY (server side apply, VM may exist)
+        """
+        if method == config.CREATE_APPLY:
+            await self.request(
+                "create_vm", 'PATCH',
+                api_path(config.KUBEVIRT_API_VERSION, 'virtualmachines', namespace, yaml_body['metadata']['name']),
+                params={'fieldManager': config.RUN_LABEL_VALUE, 'force': 'true'}, body=yaml_body,
+                content_type=APPLY_PATCH
+            )
+        else:
+            await self.request("create_vm", 'POST', api_path(config.KUBEVIRT_API_VERSION, 'virtualmachines', namespace),
+                               body=yaml_body)
+
+    async def vm_action(self, action, vm_name, namespace, mode=config.LIFECYCLE_SUBRESOURCE):
+        """
+        :param action: start, stop or restart
+        :param mode: LIFECYCLE_SUBRESOURCE or LIFECYCLE_PATCH
+        :return: True if the apiserver accepted the action
+        """
+        try:
+            if mode == config.LIFECYCLE_PATCH and action != 'restart':
+                await self.request(
+                    "vm_action", 'PATCH', api_path(config.KUBEVIRT_API_VERSION, 'virtualmachines', namespace, vm_name),
+                    body={'spec': {'running': action == 'start'}}, content_type=MERGE_PATCH
+                )
+            else:
+                await self.request("vm_action", 'PUT', config.VM_SUBRESOURCE_PATH.format(
+                    namespace=namespace, vm_name=vm_name, action=action))
+        except AsyncApiError as err:
+            logger.error("VM {ns}/{vm}: {action} failed, err: {err}".format(
+                ns=namespace, vm=vm_name, action=action, err=err.summary()))
+            metrics.VM_ACTIONS.inc(action, "failed")
+            vm_event('action', vm=vm_name, ns=namespace, action=action, ok=False)
+            return False
+        metrics.VM_ACTIONS.inc(action, "ok")
+        vm_event('action', vm=vm_name, ns=namespace, action=action, ok=True)
+        return True
+
+    async def vm_action_bulk(self, action, vms, mode=config.LIFECYCLE_SUBRESOURCE):
+        """
+        :param vms: list of (vm_name, namespace)
+        :return: list of results (True/False) in the order of vms
+        """
+        return await asyncio.gather(*[self.vm_action(action, vm_name, ns_name, mode=mode) for vm_name, ns_name in vms])
+
+    async def list_vmis(self, namespace=None, label_selector=None, limit=config.LIST_PAGE_SIZE):
+        """
+        Paginated VMI LIST
+        :return: (list of VmiRecord, resourceVersion to watch from)
+        """
+        records, _continue = [], None
+        while True:
+            page = await self.request(
+                "list_vmis", 'GET', api_path(config.KUBEVIRT_API_VERSION, 'virtualmachineinstances', namespace),
+                params={'limit': limit, 'continue': _continue, 'labelSelector': label_selector}
+            )
+            records.extend(VmiRecord(vmi) for vmi in page.get('items') or [])
+            _continue = page['metadata'].get('continue')
+            if not _continue:
+                return records, page['metadata'].get('resourceVersion')
+
+    async def watch_vmis(self, resource_version=None, timeout=WATCH_TIMEOUT, label_selector=None):
+        """
+        VMI watch, an ERROR event with code 410 means resource_version is too old
+        :return: async generator of events like the DynamicClient watch ({'type', 'raw_object'})
+        """
+        params = {'watch': 'true', 'resourceVersion': resource_version, 'timeoutSeconds': timeout,
+                  'labelSelector': label_selector}
+        async for event in self.transport.stream(
+                api_path(config.KUBEVIRT_API_VERSION, 'virtualmachineinstances'), params=params):
+            yield {'type': event['type'], 'raw_object': event['object']}
+
+    async def close(self):
+        await self.transport.close()
+
+
+def run(coroutine):
+    """
+    Run coroutine on a new event loop
+    :return: coroutine result
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
@@ -1,82 +1,631 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import yaml
-import logging
-import urllib3
-from kubernetes import config as kube_config
-from openshift.dynamic import DynamicClient
+import os
+import time
+import hashlib
+import threading
+from collections import defaultdict, OrderedDict
+from multiprocessing.pool import ThreadPool
+from src.api.vm_template import VmTemplate
 import src.utils.config as config
+import src.utils.helper as helper
+import src.utils.metrics as metrics
 import src.utils.logger as logger
+from src.utils.logger import vm_event
 
 logger = logger.MyLogger.__call__().get_logger()
 
+# imported on first use, kubernetes alone takes a good part of a second to import
+urllib3 = helper.LazyModule('urllib3')
+kube_client = helper.LazyModule('kubernetes.client')
+kube_config = helper.LazyModule('kubernetes.config')
+dynamic = helper.LazyModule('openshift.dynamic')
+exceptions = helper.LazyModule('openshift.dynamic.exceptions')
+
+WATCH_TIMEOUT = 300  # seconds before the apiserver closes a VMI watch
+HTTP_GONE = 410
+POD_ACTIVE_SELECTOR = "status.phase!=Succeeded,status.phase!=Failed"  # pods holding node resources
+
+
+def _raw(client, data):
+    # DynamicClient serializer keeping the plain dict instead of a ResourceInstance tree
+    return data
+
+
+def list_pages(resource, limit=config.LIST_PAGE_SIZE, **kwargs):
+    """
+    Paginated LIST with limit/continue, one page in memory at a time
+    :param resource: DynamicClient resource
+    :param limit: objects per page
+    :param kwargs: namespace, label_selector, field_selector
+    :return: generator of page dicts, the last page has the resourceVersion of the list
+    """
+    _continue = None
+    while True:
+        page = resource.get(limit=limit, _continue=_continue, serializer=_raw, **kwargs)
+        yield page
+        _continue = (page.get('metadata') or {}).get('continue')
+        if not _continue:
+            return
+
+
+def pod_requests(pod):
+    """
+    Node resources the scheduler accounts for a pod: the sum of its containers
+    or its largest init container, requests default to the limits
+    :param pod: Pod dict
+    :return: dict {'cpu': cores, 'memory': bytes, 'kvm': devices}
+    """
+    def _requests(container):
+        resources = container.get('resources') or {}
+        values = dict(resources.get('limits') or {})
+        values.update(resources.get('requests') or {})
+        return {
+            'cpu': helper.parse_quantity(values.get('cpu', 0)),
+            'memory': helper.parse_quantity(values.get('memory', 0)),
+            'kvm': int(helper.parse_quantity(values.get(config.KVM_RESOURCE, 0)))
+        }
+
+    spec = pod.get('spec') or {}
+    total = {'cpu': 0.0, 'memory': 0.0, 'kvm': 0}
+    for container in spec.get('containers') or []:
+        for resource, value in _requests(container).items():
+            total[resource] += value
+    for container in spec.get('initContainers') or []:
+        for resource, value in _requests(container).items():
+            total[resource] = max(total[resource], value)
+    return total
+
+
+class VmiRecord(object):
+    __slots__ = ["name", "namespace", "phase", "node"]
+
+    def __init__(self, vmi):
+        """
+        :param vmi: VMI dict
+        """
+        status = vmi.get('status') or {}
+        self.name = vmi['metadata']['name']
+        self.namespace = vmi['metadata']['namespace']
+        self.phase = status.get('phase') or 'Unknown'
+        self.node = status.get('nodeName')
+
+    def __repr__(self):
+        return "{ns}/{name}({phase})".format(ns=self.namespace, name=self.name, phase=self.phase)
+
+
+class NodeRecord(object):
+    __slots__ = ["name", "ready", "kvm_capacity", "allocatable"]
+
+    def __init__(self, node):
+        """
+        :param node: Node dict
+        """
+        status = node.get('status') or {}
+        allocatable = status.get('allocatable') or {}
+        self.name = node['metadata']['name']
+        self.ready = any(condition.get('reason') == 'KubeletReady' and condition.get('status') == 'True'
+                         for condition in status.get('conditions') or [])
+        capacity = status.get('capacity') or {}
+        self.kvm_capacity = int(helper.parse_quantity(capacity.get(config.KVM_RESOURCE, 0)))
+        self.allocatable = {
+            'cpu': helper.parse_quantity(allocatable.get('cpu', 0)),
+            'memory': helper.parse_quantity(allocatable.get('memory', 0)),
+            'kvm': int(helper.parse_quantity(allocatable.get(config.KVM_RESOURCE, 0)))
+        }
+
+    def __repr__(self):
+        return "{name}(ready={ready})".format(name=self.name, ready=self.ready)
+
+
+class VmiCache(object):
+    """
+    Informer style local cache of VirtualMachineInstances.
+    Do one LIST, then WATCH from the returned resourceVersion and keep
+    counters by phase, node and namespace so summaries cost no API calls.
+    """
+
+    def __init__(self, vmi_resource):
+        self.vmi_resource = vmi_resource
+        self.resource_version = None
+        self._lock = threading.Lock()
+        self._synced = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._error = None  # last LIST/WATCH error
+        self._listeners = []
+        self._vmis = {}  # 'namespace/name' -> (phase, node, namespace)
+        self.by_phase = defaultdict(int)
+        self.by_node = defaultdict(int)
+        self.by_namespace = defaultdict(int)
+        self.by_phase_node = defaultdict(int)
+
+    def add_listener(self, callback):
+        """
+        Call callback(event_type, vmi) for every VMI seen by LIST or WATCH
+        :param callback: function getting event type and VMI dict
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, event_type, vmi):
+        for callback in self._listeners:
+            try:
+                callback(event_type, vmi)
+            except Exception as err:
+                logger.error("VMI cache listener failed, err: {err}".format(err=err))
+
+    @staticmethod
+    def _record(vmi):
+        status = vmi.get('status') or {}
+        return status.get('phase') or 'Unknown', status.get('nodeName'), vmi['metadata']['namespace']
+
+    def _add(self, key, record):
+        self._vmis[key] = record
+        phase, node, namespace = record
+        self.by_phase[phase] += 1
+        self.by_namespace[namespace] += 1
+        self.by_phase_node[(phase, node or "")] += 1
+        if node:
+            self.by_node[node] += 1
+
+    def _remove(self, key):
+        record = self._vmis.pop(key, None)
+        if record is None:
+            return
+        phase, node, namespace = record
+        self.by_phase[phase] -= 1
+        self.by_namespace[namespace] -= 1
+        self.by_phase_node[(phase, node or "")] -= 1
+        if node:
+            self.by_node[node] -= 1
+
+    def _list(self):
+        """
+        Paginated LIST, rebuild the indexes and remember the resourceVersion.
+        Only the (phase, node, namespace) records are kept, the VMI pages are
+        dropped after the listeners saw them.
+        """
+        records = {}
+        resource_version = None
+        for page in list_pages(self.vmi_resource):
+            for vmi in page.get('items') or []:
+                key = "{ns}/{name}".format(ns=vmi['metadata']['namespace'], name=vmi['metadata']['name'])
+                records[key] = self._record(vmi)
+                self._notify('LIST', vmi)
+            resource_version = page['metadata'].get('resourceVersion')
+        with self._lock:
+            self._vmis = {}
+            self.by_phase.clear()
+            self.by_node.clear()
+            self.by_namespace.clear()
+            self.by_phase_node.clear()
+            for key, record in records.items():
+                self._add(key, record)
+            self.resource_version = resource_version
+        self._synced.set()
+
+    def _handle_event(self, event):
+        vmi = event['raw_object']
+        if event['type'] == 'ERROR':
+            if vmi.get('code') == HTTP_GONE:
+                # resourceVersion is too old, start over with a new LIST
+                self.resource_version = None
+            return
+        key = "{ns}/{name}".format(ns=vmi['metadata']['namespace'], name=vmi['metadata']['name'])
+        with self._lock:
+            self._remove(key)
+            if event['type'] != 'DELETED':
+                self._add(key, self._record(vmi))
+            self.resource_version = vmi['metadata']['resourceVersion']
+        self._notify(event['type'], vmi)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                if self.resource_version is None:
+                    self._list()
+                for event in self.vmi_resource.watch(resource_version=self.resource_version, timeout=WATCH_TIMEOUT):
+                    self._handle_event(event)
+                    if self._stopped.is_set() or self.resource_version is None:
+                        break
+            except Exception as err:
+                logger.error("VMI watch failed, err: {err}".format(err=err))
+                self._error = err
+                self.resource_version = None
+                self._stopped.wait(1)
+
+    def start(self, timeout=config.VMI_CACHE_SYNC_TIMEOUT):
+        """
+        Start the watch thread and wait for the first LIST
+        :param timeout: seconds to wait for the initial sync
+        :raise RuntimeError: the first LIST did not complete in timeout seconds
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="vmi-cache")
+            self._thread.daemon = True
+            self._thread.start()
+        if not self._synced.wait(timeout):
+            self.stop()
+            raise RuntimeError("VMI cache not synced after {timeout}s, last error: {err}".format(
+                timeout=timeout, err=self._error))
+
+    def stop(self):
+        self._stopped.set()
+
+    def count(self, phase):
+        return self.by_phase.get(phase, 0)
+
+    def count_on_node(self, node_name):
+        return self.by_node.get(node_name, 0)
+
+    def count_in_namespace(self, namespace):
+        return self.by_namespace.get(namespace, 0)
+
+    def phase_summary(self):
+        """
+        :return: dict with phase: vmi amount
+        """
+        with self._lock:
+            return dict(self.by_phase)
+
+    def phase_node_summary(self):
+        """
+        :return: dict with (phase, node): vmi amount
+        """
+        with self._lock:
+            return dict((key, value) for key, value in self.by_phase_node.items() if value)
+
+
+def discovery_cache_file(api_client, dirname=config.DISCOVERY_CACHE_DIR, ttl=config.DISCOVERY_CACHE_TTL):
+    """
+    API discovery cache file for the DynamicClient, keyed by cluster URL and
+    server version so an upgraded cluster is discovered again. A file older
+    than ttl seconds is removed, the DynamicClient then rediscovers and writes it.
+    :param api_client: kubernetes ApiClient
+    :param dirname: cache directory
+    :param ttl: max cache age in seconds
+    :return: cache file path
+    """
+    host = api_client.configuration.host
+    version = kube_client.VersionApi(api_client).get_code().git_version
+    dirname = os.path.expanduser(dirname)
+    if not os.path.isdir(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            # another worker made it
+            pass
+    key = hashlib.sha1("{host}-{version}".format(host=host, version=version).encode('utf-8')).hexdigest()
+    path = os.path.join(dirname, "discovery-{key}.json".format(key=key))
+    try:
+        if time.time() - os.path.getmtime(path) > ttl:
+            logger.info("Discovery cache of {host} expired".format(host=host))
+            os.remove(path)
+    except OSError:
+        # no cache yet
+        pass
+    return path
+
 
 class Client(object):
-    def __init__(self):
+    def __init__(self, dyn_client=None):
+        """
+        :param dyn_client: DynamicClient to use (like SimulatedDynamicClient),
+                           None to connect with the kubeconfig
+        """
+        self._vmi_cache = None
+        self._vmi_cache_lock = threading.Lock()
+        self._vm_templates = {}
+        self._resources = {}  # (api_version, kind) -> resource, resolved once
+        self._create_pool = None
+        if dyn_client is not None:
+            self.dyn_client = dyn_client
+            return
+        start = time.time()
         urllib3.disable_warnings()
         try:
-            self.dyn_client = DynamicClient(kube_config.new_client_from_config())
+            configuration = kube_client.Configuration()
+            kube_config.load_kube_config(client_configuration=configuration)
+            # one pooled connection per concurrent request
+            configuration.connection_pool_maxsize = config.CONNECTION_POOL_MAXSIZE
+            api_client = kube_client.ApiClient(configuration=configuration)
+            self.dyn_client = dynamic.DynamicClient(api_client, cache_file=discovery_cache_file(api_client))
         except kube_config.ConfigException:
             logger.error("You need to be login to cluster")
             exit(1)
         except urllib3.exceptions.MaxRetryError:
             logger.error("You need to be login to cluster")
             exit(1)
+        except exceptions.ApiException as err:
+            logger.error("You need to be login to cluster, err: {err}".format(err=err.reason))
+            exit(1)
+        logger.info("Connected to {host} in {seconds:.2f}s".format(
+            host=configuration.host, seconds=time.time() - start))
+
+    def _resource(self, api_version, kind):
+        """
+        Resolve API resource once, later calls skip the discovery lookup
+        """
+        resource = self._resources.get((api_version, kind))
+        if resource is None:
+            resource = self._resources[(api_version, kind)] = self.dyn_client.resources.get(
+                api_version=api_version, kind=kind)
+        return resource
+
+    @property
+    def vmi_cache(self):
+        """
+        VMI cache, started on first use (one cache for all worker threads)
+        :return: VmiCache
+        """
+        if self._vmi_cache is None:
+            with self._vmi_cache_lock:
+                if self._vmi_cache is None:
+                    vmi_cache = VmiCache(self.get_vmis())
+                    vmi_cache.start()
+                    self._vmi_cache = vmi_cache
+        return self._vmi_cache
+
+    def list_objects(self, api_version, kind, namespace=None, label_selector=None, field_selector=None,
+                     limit=config.LIST_PAGE_SIZE):
+        """
+        Paginated LIST of any kind, filtered on the server by the selectors
+        :param field_selector: like 'spec.unschedulable=false' (custom resources only support metadata fields)
+        :param limit: objects per page
+        :return: generator of object dicts
+        """
+        resource = self._resource(api_version, kind)
+        for page in list_pages(resource, limit=limit, namespace=namespace, label_selector=label_selector,
+                               field_selector=field_selector):
+            for item in page.get('items') or []:
+                yield item
+
+    def iter_nodes(self, label_selector=config.COMPUTE_NODE_SELECTOR, field_selector=None,
+                   limit=config.LIST_PAGE_SIZE):
+        """
+        :return: generator of NodeRecord
+        """
+        for node in self.list_objects('v1', 'Node', label_selector=label_selector, field_selector=field_selector,
+                                      limit=limit):
+            yield NodeRecord(node)
+
+    def iter_vmis(self, phase=None, namespace=None, label_selector=None, field_selector=None,
+                  limit=config.LIST_PAGE_SIZE):
+        """
+        :param phase: VMI phase, like 'Running' (filtered here, status.phase is not a VMI field selector)
+        :return: generator of VmiRecord
+        """
+        for vmi in self.list_objects(config.KUBEVIRT_API_VERSION, 'VirtualMachineInstance', namespace=namespace,
+                                     label_selector=label_selector, field_selector=field_selector, limit=limit):
+            record = VmiRecord(vmi)
+            if phase is None or record.phase == phase:
+                yield record
 
     def get_num_of_kvm_devices_from_node(self):
         """
         Get from the first compute node the number of devices
         :return: int number of devices
         """
-        label_selector = 'node-role.kubernetes.io/compute=true'
-        v1_nodes = self.dyn_client.resources.get(api_version='v1', kind='Node').get(
-            label_selector=label_selector).items
-        return int(v1_nodes[0]['status']['capacity']['devices.kubevirt.io/kvm'])
+        for node in self.iter_nodes(limit=1):
+            return node.kvm_capacity
+        logger.error("No compute node found ({selector})".format(selector=config.COMPUTE_NODE_SELECTOR))
+        exit(1)
 
-    def get_ready_node_list(self, label_selector='node-role.kubernetes.io/compute=true'):
+    def get_ready_node_list(self, label_selector=config.COMPUTE_NODE_SELECTOR):
         """
         Return list of node in the desire state
         :return: List of nodes name
         """
-        node_list = []
-        v1_nodes = self.dyn_client.resources.get(api_version='v1', kind='Node').get(label_selector=label_selector).items
-        for node in v1_nodes:
-            for condition in node.status.conditions:
-                if condition.reason == 'KubeletReady' and condition.status == 'True':
-                    node_list.append(node.metadata.name)
-        return node_list
+        return [node.name for node in self.iter_nodes(label_selector=label_selector) if node.ready]
+
+    def get_node_resources(self, label_selector=config.COMPUTE_NODE_SELECTOR):
+        """
+        Allocatable resources of the ready nodes
+        :return: OrderedDict node name -> {'cpu': cores, 'memory': bytes, 'kvm': devices}
+        """
+        return OrderedDict((node.name, node.allocatable) for node in self.iter_nodes(label_selector=label_selector)
+                           if node.ready)
+
+    def get_node_requests(self, nodes=None):
+        """
+        Resources requested by the pods on the nodes, virt-launcher pods of running VMIs included
+        :param nodes: node names, None for all nodes
+        :return: dict node name -> {'cpu': cores, 'memory': bytes, 'kvm': devices}
+        """
+        used = {}
+        for pod in self.list_objects('v1', 'Pod', field_selector=POD_ACTIVE_SELECTOR):
+            node_name = (pod.get('spec') or {}).get('nodeName')
+            if not node_name or (nodes is not None and node_name not in nodes):
+                continue
+            total = used.setdefault(node_name, {'cpu': 0.0, 'memory': 0.0, 'kvm': 0})
+            for resource, value in pod_requests(pod).items():
+                total[resource] += value
+        return used
+
+    def cluster_fingerprint(self):
+        """
+        What the run ran on, to tell apart results of different clusters and builds
+        :return: dict with host, versions, ready nodes and their allocatable totals
+        """
+        nodes = self.get_node_resources()
+        kubevirt_version = None
+        try:
+            for kubevirt in self.list_objects(config.KUBEVIRT_API_VERSION, 'KubeVirt'):
+                kubevirt_version = (kubevirt.get('status') or {}).get('observedKubeVirtVersion')
+        except Exception as err:
+            # the user may not be allowed to read the KubeVirt CR
+            logger.info("KubeVirt version not found, err: {err}".format(err=err))
+        return {
+            'host': self.dyn_client.configuration.host,
+            'kubernetes_version': (self.dyn_client.version.get('kubernetes') or {}).get('gitVersion'),
+            'kubevirt_version': kubevirt_version,
+            'nodes': len(nodes),
+            'cpu': sum(node['cpu'] for node in nodes.values()),
+            'memory': sum(node['memory'] for node in nodes.values()),
+            'kvm': sum(node['kvm'] for node in nodes.values())
+        }
 
+    @metrics.timed("add_namespace")
     def add_namespace(self, ns_name):
         """
         Add namespace
         :param ns_name: namespace name
         """
 
-        v1_ns = self.dyn_client.resources.get(api_version='v1', kind='Namespace')
+        v1_ns = self._resource('v1', 'Namespace')
         ns_body = {
             'apiVersion': 'v1',
             'kind': 'Namespace',
-            'metadata': {'name': ns_name}
+            'metadata': {'name': ns_name, 'labels': {config.RUN_LABEL_KEY: config.RUN_LABEL_VALUE}}
         }
 
-        v1_ns.create(body=ns_body, namespace='default')
-        logging.info("Namespace {ns} added".format(ns=ns_name))
+        try:
+            v1_ns.create(body=ns_body, namespace='default')
+        except exceptions.ConflictError:
+            # resumed run or another worker added it
+            logger.info("Namespace {ns} already exists".format(ns=ns_name))
+            return
+        logger.info("Namespace {ns} added".format(ns=ns_name))
+
+    def get_namespaces(self, label_selector=config.RUN_LABEL_SELECTOR):
+        """
+        Return list of namespaces with label
+        :return: List of namespaces name
+        """
+        return [ns['metadata']['name'] for ns in self.list_objects('v1', 'Namespace', label_selector=label_selector)]
+
+    def delete_namespace(self, ns_name):
+        """
+        Delete namespace
+        :param ns_name: namespace name
+        """
+        v1_ns = self._resource('v1', 'Namespace')
+        v1_ns.delete(name=ns_name)
+        logger.info("Namespace {ns} deleted".format(ns=ns_name))
+
+    def create_daemonset(self, body, namespace):
+        """
+        Create DaemonSet, an existing one (from an interrupted run) is replaced
+        :param body: DaemonSet body
+        :param namespace: namespace name
+        """
+        apps_ds = self._resource('apps/v1', 'DaemonSet')
+        try:
+            apps_ds.create(body=body, namespace=namespace)
+        except exceptions.ConflictError:
+            logger.info("DaemonSet {ns}/{name} already exists, replace it".format(
+                ns=namespace, name=body['metadata']['name']))
+            self.delete_daemonset(body['metadata']['name'], namespace)
+            apps_ds.create(body=body, namespace=namespace)
+
+    def get_daemonset_status(self, name, namespace):
+        """
+        :return: DaemonSet status dict (desiredNumberScheduled, numberReady...)
+        """
+        return self._resource('apps/v1', 'DaemonSet').get(name=name, namespace=namespace,
+                                                          serializer=_raw).get('status') or {}
+
+    def delete_daemonset(self, name, namespace):
+        apps_ds = self._resource('apps/v1', 'DaemonSet')
+        try:
+            apps_ds.delete(name=name, namespace=namespace)
+        except exceptions.NotFoundError:
+            pass
+
+    def wait_for_namespaces_deleted(self, ns_names, timeout=config.CLEANUP_TIMEOUT):
+        """
+        Watch namespaces till all of them are deleted
+        :param ns_names: namespaces name
+        :param timeout: seconds to wait
+        :return: dict with namespace: deletion time, missing for namespaces not deleted in time
+        """
+        v1_ns = self._resource('v1', 'Namespace')
+        ns_list = v1_ns.get(label_selector=config.RUN_LABEL_SELECTOR)
+        remaining = set(ns_names) & set(ns.metadata.name for ns in ns_list.items)
+        deleted = dict((ns_name, time.time()) for ns_name in set(ns_names) - remaining)
+        end_time = time.time() + timeout
+        while remaining and time.time() < end_time:
+            for event in v1_ns.watch(label_selector=config.RUN_LABEL_SELECTOR,
+                                     resource_version=ns_list.metadata.resourceVersion,
+                                     timeout=max(1, int(end_time - time.time()))):
+                ns_name = event['raw_object']['metadata'].get('name')
+                if event['type'] == 'DELETED' and ns_name in remaining:
+                    remaining.discard(ns_name)
+                    deleted[ns_name] = time.time()
+                if not remaining:
+                    break
+            if remaining:
+                ns_list = v1_ns.get(label_selector=config.RUN_LABEL_SELECTOR)
+                remaining &= set(ns.metadata.name for ns in ns_list.items)
+        return deleted
+
+    def count_vms(self, namespace, label_selector=config.RUN_LABEL_SELECTOR):
+        """
+        Return amount of VMs in namespace
+        :return: int
+        """
+        return sum(1 for _ in self.list_objects(config.KUBEVIRT_API_VERSION, 'VirtualMachine', namespace=namespace,
+                                                label_selector=label_selector))
+
+    @metrics.timed("delete_vms")
+    def delete_vms(self, namespace, label_selector=config.RUN_LABEL_SELECTOR):
+        """
+        Delete all VMs with label in namespace with one deletecollection call
+        :param namespace: namespace name
+        :param label_selector: VM label selector
+        """
+        v3_vms = self._resource(config.KUBEVIRT_API_VERSION, 'VirtualMachine')
+        v3_vms.delete(namespace=namespace, label_selector=label_selector)
+
+    @metrics.timed("delete_vm")
+    def delete_vm(self, vm_name, namespace):
+        """
+        Delete one VM
+        :return: True if the apiserver accepted the delete
+        """
+        v3_vms = self._resource(config.KUBEVIRT_API_VERSION, 'VirtualMachine')
+        try:
+            v3_vms.delete(name=vm_name, namespace=namespace)
+        except exceptions.DynamicApiError as err:
+            logger.error("VM {ns}/{vm}: delete failed, err: {err}".format(ns=namespace, vm=vm_name, err=err.summary()))
+            vm_event('deleted', vm=vm_name, ns=namespace, ok=False)
+            return False
+        vm_event('deleted', vm=vm_name, ns=namespace, ok=True)
+        return True
 
     def get_vmis(self):
         """
         Return List with all the VMI objects
         :return: list
         """
-        return self.dyn_client.resources.get(api_version='kubevirt.io/v1alpha3', kind='VirtualMachineInstance')
+        return self._resource(config.KUBEVIRT_API_VERSION, 'VirtualMachineInstance')
 
-    def get_vmis_at_status(self, status):
+    def get_vmis_at_status(self, status, label_selector=None):
         """
         Return List with all the VMIs in status
         VMI status: Running,Scheduling, Pending, Unknown, CrashLoopBackOff
-        :return: list
+        :return: list of VmiRecord
+        """
+        return list(self.iter_vmis(phase=status, label_selector=label_selector))
+
+    def count_vmis_at_status(self, status):
+        """
+        Return amount of VMIs in status, read from the VMI cache
+        :return: int
         """
-        return [vmi for vmi in self.get_vmis().get().items if vmi.status.phase == status]
+        return self.vmi_cache.count(status)
+
+    def get_vm_template(self, yaml_file, constraints):
+        """
+        Return the compiled template of the VM yaml, parsed on first use
+        :param yaml_file: Path to yaml file
+        :param constraints: dict with constraints common to all VMs
+        :return: VmTemplate
+        """
+        if yaml_file not in self._vm_templates:
+            self._vm_templates[yaml_file] = VmTemplate.from_file(yaml_file, constraints)
+        return self._vm_templates[yaml_file]
 
     def update_vm_yaml(self, yaml_file, vm_name, constraints):
         """
@@ -84,35 +633,118 @@ class Client(object):
         :param yaml_file: Path to yaml file
         :param vm_name: VM name to update the yaml
         :param constraints: dict with constraints for this VM:
-                            like { 'nodeSelector': 'nodeName'}
+                            like { 'node_selector': 'nodeName'}
         :return: updated yaml object
         """
-        yaml_obj = None
-        with open(yaml_file, 'r') as stream:
-            try:
-                yaml_obj = yaml.load(stream)
-            except yaml.YAMLError as exc:
-                logger.error("Failed to read yaml file {yaml}, err: \n {err}".format(yaml=yaml_file, err=exc.message))
-                exit(1)
-        yaml_obj['metadata']['name'] = vm_name
-        if "node_selector" in constraints.keys():
-            yaml_obj['spec']['template']['spec'].update({'nodeSelector': {'kubernetes.io/hostname': constraints['node_selector']}})
-        if "running_state" in constraints.keys():
-            yaml_obj['spec'].update({'running': constraints['running_state']})
-        if "cpu" in constraints.keys():
-            yaml_obj['spec']['domain'].update({'cpu': constraints['cpu']})
-        if "memory" in constraints.keys():
-            yaml_obj['spec']['resources']['requests'].update({'memory': constraints['memory']})
-        return yaml_obj
-
-    def create_vm(self, yaml_body, namespace='default'):
+        node_name = constraints.get('node_selector')
+        if isinstance(node_name, bool):
+            node_name = None
+        return self.get_vm_template(yaml_file, constraints).render(vm_name, node_name=node_name)
+
+    @metrics.timed("create_vm")
+    def create_vm(self, yaml_body, namespace='default', method=config.CREATE_POST):
         """
         Create VM with given yaml
         :param yaml_body: yaml body
         :param namespace: namespace to create vm
+        :param method: CREATE_POST or CREATE_APPLY (server side apply, VM may exist)
+        """
+        v3_vms = self._resource(config.KUBEVIRT_API_VERSION, 'VirtualMachine')
+        if method == config.CREATE_APPLY:
+            v3_vms.server_side_apply(
+                body=yaml_body, namespace=namespace, field_manager=config.RUN_LABEL_VALUE, force_conflicts=True)
+        else:
+            v3_vms.create(body=yaml_body, namespace=namespace)
+
+    def validate_vm(self, yaml_body, namespace):
+        """
+        Validate VM body with a server side dry run create
+        :param namespace: namespace the VMs go to, its quotas and admission policies apply
+        :return: None if the apiserver accepts it, else the error summary
+        """
+        v3_vms = self._resource(config.KUBEVIRT_API_VERSION, 'VirtualMachine')
+        try:
+            v3_vms.create(body=yaml_body, namespace=namespace, dry_run='All')
+        except exceptions.DynamicApiError as err:
+            return err.summary()
+        return None
+
+    @metrics.timed("create_vm_batch")
+    def create_vms(self, yaml_bodies, namespace, method=config.CREATE_POST):
+        """
+        Create VMs in one namespace, the requests are pipelined over the
+        connection pool
+        :param yaml_bodies: list of VM bodies
+        :param method: CREATE_POST or CREATE_APPLY
+        :return: list of results (True/False) in the order of yaml_bodies
+        """
+        if self._create_pool is None:
+            self._create_pool = ThreadPool(config.CONNECTION_POOL_MAXSIZE)
+
+        def _create(body):
+            try:
+                self.create_vm(body, namespace=namespace, method=method)
+            except exceptions.DynamicApiError as err:
+                logger.error("VM {ns}/{vm}: create failed, err: {err}".format(
+                    ns=namespace, vm=body['metadata']['name'], err=err.summary()))
+                return False
+            return True
+
+        return self._create_pool.map(_create, yaml_bodies)
+
+    @metrics.timed("vm_action")
+    def vm_action(self, action, vm_name, namespace, mode=config.LIFECYCLE_SUBRESOURCE):
+        """
+        Run VM lifecycle action through the API
+        :param action: start, stop or restart
+        :param vm_name: VM name
+        :param namespace: VM namespace
+        :param mode: LIFECYCLE_SUBRESOURCE or LIFECYCLE_PATCH
+        :return: True if the apiserver accepted the action
         """
-        v3_vms = self.dyn_client.resources.get(api_version='kubevirt.io/v1alpha3', kind='VirtualMachine')
-        v3_vms.create(body=yaml_body, namespace=namespace)
+        try:
+            if mode == config.LIFECYCLE_PATCH and action != 'restart':
+                v3_vms = self._resource(config.KUBEVIRT_API_VERSION, 'VirtualMachine')
+                v3_vms.patch(
+                    body={'spec': {'running': action == 'start'}}, name=vm_name, namespace=namespace,
+                    content_type='application/merge-patch+json'
+                )
+            else:
+                self.dyn_client.request(
+                    'put', config.VM_SUBRESOURCE_PATH.format(namespace=namespace, vm_name=vm_name, action=action)
+                )
+        except exceptions.DynamicApiError as err:
+            logger.error("VM {ns}/{vm}: {action} failed, err: {err}".format(
+                ns=namespace, vm=vm_name, action=action, err=err.summary()))
+            metrics.VM_ACTIONS.inc(action, "failed")
+            vm_event('action', vm=vm_name, ns=namespace, action=action, ok=False)
+            return False
+        metrics.VM_ACTIONS.inc(action, "ok")
+        vm_event('action', vm=vm_name, ns=namespace, action=action, ok=True)
+        return True
+
+    def vm_action_bulk(self, action, vms, mode=config.LIFECYCLE_SUBRESOURCE, workers=config.LIFECYCLE_WORKERS,
+                       rate_limiter=None):
+        """
+        Run VM lifecycle action on list of VMs in parallel
+        :param action: start, stop or restart
+        :param vms: list of (vm_name, namespace)
+        :param mode: LIFECYCLE_SUBRESOURCE or LIFECYCLE_PATCH
+        :param workers: number of threads
+        :param rate_limiter: object with acquire(), called before every action (None: no limit)
+        :return: list of results (True/False) in the order of vms
+        """
+        def _action(vm):
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            return self.vm_action(action, vm[0], vm[1], mode=mode)
+
+        pool = ThreadPool(min(workers, len(vms)) or 1)
+        try:
+            return pool.map(_action, vms)
+        finally:
+            pool.close()
+            pool.join()
 
     def get_vmis_status_summary(self):
         """
@@ -120,13 +752,11 @@ class Client(object):
         :return dict with status: vmi amount
         """
         vmi_summary = {}
-        logging.info("VMIs status:")
-        logger.info("VMIs status:\n")
+        logger.info("VMIs status:")
 
         for status in config.VMI_STATUS:
-            num_of_vms = len(self.get_vmis_at_status(status))
+            num_of_vms = self.vmi_cache.count(status)
             out_format = "{status} VMIs:  {amount_of_vms}".format(status=status, amount_of_vms=num_of_vms)
             logger.info(out_format)
-            logging.info(out_format)
             vmi_summary.update({status:num_of_vms})
         return vmi_summary
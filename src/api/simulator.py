@@ -0,0 +1,507 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import heapq
+import bisect
+import itertools
+import random
+import threading
+from collections import deque
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+import src.utils.config as config
+import src.utils.helper as helper
+import src.utils.logger as logger
+
+logger = logger.MyLogger.__call__().get_logger()
+
+exceptions = helper.LazyModule('openshift.dynamic.exceptions')
+
+SUBRESOURCE_PATH = re.compile(
+    r"^/apis/subresources\.kubevirt\.io/[^/]+/namespaces/(?P<namespace>[^/]+)/virtualmachines/"
+    r"(?P<name>[^/]+)/(?P<action>start|stop|restart)$"
+)
+EVENT_HISTORY = 100000  # events kept per kind for watch resume
+
+
+def _api_error(cls, status, reason):
+    return cls(exceptions.ApiException(status=status, reason=reason))
+
+
+def match_labels(labels, label_selector):
+    """
+    Match equality based label selector ('a=b,c=d')
+    """
+    if not label_selector:
+        return True
+    labels = labels or {}
+    for term in label_selector.split(","):
+        key, _, value = term.partition("=")
+        if labels.get(key.strip()) != value.strip():
+            return False
+    return True
+
+
+def match_fields(obj, field_selector):
+    """
+    Match equality based field selector ('status.phase=Running,spec.unschedulable!=true')
+    """
+    if not field_selector:
+        return True
+    for term in field_selector.split(","):
+        negate = "!=" in term
+        path, _, value = term.partition("!=" if negate else "=")
+        field = obj
+        for key in path.strip().split("."):
+            field = field.get(key) if isinstance(field, dict) else None
+        field = "" if field is None else str(field).lower() if isinstance(field, bool) else str(field)
+        if (field == value.strip()) == negate:
+            return False
+    return True
+
+
+class Field(object):
+    """
+    Attribute and item access over a dict, like the openshift ResourceField
+    """
+
+    def __init__(self, data):
+        self.__dict__['_data'] = data
+
+    @staticmethod
+    def wrap(value):
+        if isinstance(value, dict):
+            return Field(value)
+        if isinstance(value, list):
+            return [Field.wrap(item) for item in value]
+        return value
+
+    def __getattr__(self, name):
+        return self.wrap(self._data.get(name))
+
+    def __getitem__(self, name):
+        return self.wrap(self._data[name])
+
+    def to_dict(self):
+        return self._data
+
+
+class SimulatedCluster(object):
+    """
+    In process fake KubeVirt apiserver: nodes, namespaces, VMs and VMIs.
+    Every API call costs api_latency seconds and fails with failure_rate.
+    A started VM gets a VMI that goes Pending -> Scheduled -> Running after
+    schedule_delay and start_delay seconds, plus image_pull_delay the first
+    time its containerDisk image is used on the node (a DaemonSet pulls its
+    images on the nodes it runs on the same way).
+    """
+
+    def __init__(self, num_of_nodes=config.SIM_NODES, api_latency=config.SIM_API_LATENCY,
+                 schedule_delay=config.SIM_SCHEDULE_DELAY, start_delay=config.SIM_START_DELAY,
+                 failure_rate=config.SIM_FAILURE_RATE, kvm_devices=config.SIM_KVM_DEVICES,
+                 image_pull_delay=config.SIM_IMAGE_PULL_DELAY, seed=None):
+        self.api_latency = api_latency
+        self.image_pull_delay = image_pull_delay
+        self.schedule_delay = schedule_delay
+        self.start_delay = start_delay
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.nodes = dict(
+            ("sim-node-{i}".format(i=i), {
+                'metadata': {'name': "sim-node-{i}".format(i=i), 'labels': {'node-role.kubernetes.io/compute': 'true'}},
+                'status': {
+                    'conditions': [{'type': 'Ready', 'reason': 'KubeletReady', 'status': 'True'}],
+                    'capacity': {'devices.kubevirt.io/kvm': str(kvm_devices)},
+                    'allocatable': {'cpu': '64', 'memory': '256Gi', 'devices.kubevirt.io/kvm': str(kvm_devices)}
+                }
+            }) for i in range(num_of_nodes)
+        )
+        self.stores = dict(
+            (kind, {}) for kind in ['Namespace', 'VirtualMachine', 'VirtualMachineInstance', 'DaemonSet', 'Pod'])
+        self.vmis_on_node = dict((node_name, 0) for node_name in self.nodes)
+        self.vm_nodes = {}  # (namespace, name) -> node of the VMI
+        self.pulled = {}  # (node, image) -> time the image is on the node
+        self.api_calls = 0
+        self._version = 0
+        self._history = dict((kind, deque(maxlen=EVENT_HISTORY)) for kind in self.stores)
+        self._watchers = dict((kind, []) for kind in self.stores)
+        self._lock = threading.RLock()
+        self._timers = []
+        self._timer_ids = itertools.count()
+        self._timer_cv = threading.Condition(self._lock)
+        t = threading.Thread(target=self._run_timers, name="sim-timers")
+        t.daemon = True
+        t.start()
+
+    # api call accounting
+    def call(self):
+        if self.api_latency:
+            time.sleep(self.api_latency)
+        self.admit()
+
+    def admit(self):
+        """
+        Count an API call and fail it with failure_rate, the caller waited api_latency
+        """
+        with self._lock:
+            self.api_calls += 1
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            raise _api_error(exceptions.DynamicApiError, 500, "Simulated failure")
+
+    # store and events
+    def _publish(self, kind, event_type, obj):
+        self._version += 1
+        obj['metadata']['resourceVersion'] = str(self._version)
+        event = (self._version, event_type, dict(obj, metadata=dict(obj['metadata'])))
+        self._history[kind].append(event)
+        for watcher in self._watchers[kind]:
+            watcher.put(event)
+
+    def _put(self, kind, obj, event_type):
+        key = (obj['metadata'].get('namespace'), obj['metadata']['name'])
+        self.stores[kind][key] = obj
+        self._publish(kind, event_type, obj)
+
+    def _delete(self, kind, key):
+        obj = self.stores[kind].pop(key, None)
+        if obj is not None:
+            self._publish(kind, 'DELETED', obj)
+        return obj
+
+    def list(self, kind, namespace=None, label_selector=None, field_selector=None, limit=None, after=None):
+        """
+        :param limit: max objects, in (namespace, name) order like the apiserver pages
+        :param after: (namespace, name) of the last object of the previous page
+        :return: (objects, resourceVersion, True if more objects are left)
+        """
+        with self._lock:
+            if kind == 'Node':
+                store = dict((('', name), node) for name, node in self.nodes.items())
+            else:
+                store = self.stores[kind]
+            keys = sorted(store) if limit or after else list(store)
+            if after is not None:
+                keys = keys[bisect.bisect_right(keys, after):]
+            items = []
+            for key in keys:
+                if namespace is not None and key[0] != namespace:
+                    continue
+                obj = store[key]
+                if match_labels(obj['metadata'].get('labels'), label_selector) and match_fields(obj, field_selector):
+                    if limit and len(items) == limit:
+                        return items, str(self._version), True
+                    items.append(obj)
+            return items, str(self._version), False
+
+    def subscribe(self, kind, resource_version=None):
+        """
+        :return: queue of the (version, type, object) events after resource_version,
+                 None when resource_version is older than the event history
+        """
+        watcher = queue.Queue()
+        with self._lock:
+            history = self._history[kind]
+            if resource_version is not None and history and int(resource_version) < history[0][0] - 1:
+                return None
+            for event in history:
+                if resource_version is None or event[0] > int(resource_version):
+                    watcher.put(event)
+            self._watchers[kind].append(watcher)
+        return watcher
+
+    def unsubscribe(self, kind, watcher):
+        with self._lock:
+            self._watchers[kind].remove(watcher)
+
+    def watch(self, kind, resource_version=None, timeout=None, label_selector=None):
+        """
+        :return: generator of watch events like the DynamicClient watch
+        """
+        watcher = self.subscribe(kind, resource_version)
+        if watcher is None:
+            yield {'type': 'ERROR', 'raw_object': {'code': 410}, 'object': None}
+            return
+        end_time = time.time() + (timeout or 0)
+        try:
+            while not timeout or time.time() < end_time:
+                try:
+                    _, event_type, obj = watcher.get(timeout=max(0.01, end_time - time.time()) if timeout else 1)
+                except queue.Empty:
+                    continue
+                if match_labels(obj['metadata'].get('labels'), label_selector):
+                    yield {'type': event_type, 'raw_object': obj, 'object': Field(obj)}
+        finally:
+            self.unsubscribe(kind, watcher)
+
+    # timers for phase transitions
+    def _later(self, delay, func, *args):
+        with self._timer_cv:
+            heapq.heappush(self._timers, (time.time() + delay, next(self._timer_ids), func, args))
+            self._timer_cv.notify()
+
+    def _run_timers(self):
+        with self._timer_cv:
+            while True:
+                if not self._timers:
+                    self._timer_cv.wait()
+                    continue
+                due = self._timers[0][0]
+                now = time.time()
+                if due > now:
+                    self._timer_cv.wait(due - now)
+                    continue
+                _, _, func, args = heapq.heappop(self._timers)
+                func(*args)
+
+    # namespaces
+    def create_namespace(self, body):
+        with self._lock:
+            key = (None, body['metadata']['name'])
+            if key in self.stores['Namespace']:
+                raise _api_error(exceptions.ConflictError, 409, "AlreadyExists")
+            self._put('Namespace', {'metadata': dict(body['metadata'])}, 'ADDED')
+
+    def delete_namespace(self, name):
+        with self._lock:
+            for key in [key for key in self.stores['VirtualMachine'] if key[0] == name]:
+                self._delete_vm(key)
+            for key in [key for key in self.stores['DaemonSet'] if key[0] == name]:
+                self._delete('DaemonSet', key)
+            if self._delete('Namespace', (None, name)) is None:
+                raise _api_error(exceptions.NotFoundError, 404, "NotFound")
+
+    # VMs
+    def create_vm(self, body, namespace):
+        with self._lock:
+            if (None, namespace) not in self.stores['Namespace']:
+                raise _api_error(exceptions.NotFoundError, 404, "Namespace not found")
+            key = (namespace, body['metadata']['name'])
+            if key in self.stores['VirtualMachine']:
+                raise _api_error(exceptions.ConflictError, 409, "AlreadyExists")
+            metadata = dict(body['metadata'], namespace=namespace)
+            vm = {'metadata': metadata, 'spec': body['spec']}
+            self._put('VirtualMachine', vm, 'ADDED')
+            if body['spec'].get('running'):
+                self._start_vmi(key)
+
+    def _delete_vm(self, key):
+        self._delete('VirtualMachineInstance', key)
+        self._free_node(key)
+        self._delete('VirtualMachine', key)
+
+    def delete_vms(self, namespace, label_selector=None):
+        with self._lock:
+            vms, _, _ = self.list('VirtualMachine', namespace=namespace, label_selector=label_selector)
+            for vm in vms:
+                self._delete_vm((namespace, vm['metadata']['name']))
+            return vms
+
+    def vm_action(self, namespace, name, action):
+        with self._lock:
+            key = (namespace, name)
+            if key not in self.stores['VirtualMachine']:
+                raise _api_error(exceptions.NotFoundError, 404, "VM not found")
+            if action in ('stop', 'restart'):
+                self._delete('VirtualMachineInstance', key)
+                self._free_node(key)
+            if action in ('start', 'restart') and key not in self.stores['VirtualMachineInstance']:
+                self._start_vmi(key)
+
+    # images
+    def _pull(self, node_name, images):
+        """
+        :return: time all images are on the node
+        """
+        ready = time.time()
+        for image in images:
+            ready = max(ready, self.pulled.setdefault((node_name, image), time.time() + self.image_pull_delay))
+        return ready
+
+    # DaemonSets
+    def create_daemonset(self, body, namespace):
+        with self._lock:
+            key = (namespace, body['metadata']['name'])
+            if key in self.stores['DaemonSet']:
+                raise _api_error(exceptions.ConflictError, 409, "AlreadyExists")
+            pod_spec = body['spec']['template']['spec']
+            nodes = self._daemonset_nodes(pod_spec)
+            images = [container['image'] for container in pod_spec.get('initContainers', []) + pod_spec['containers']]
+            daemonset = {'metadata': dict(body['metadata'], namespace=namespace), 'spec': body['spec'],
+                         'status': {'desiredNumberScheduled': len(nodes), 'numberReady': 0}}
+            self._put('DaemonSet', daemonset, 'ADDED')
+            for node_name in nodes:
+                self._later(max(self._pull(node_name, images) - time.time(), 0), self._daemonset_pod_ready, key,
+                            daemonset)
+
+    def _daemonset_nodes(self, pod_spec):
+        """
+        Nodes matching the nodeSelector and the hostname 'In' node affinity of the pod spec
+        """
+        selector = ",".join("{key}={value}".format(key=key, value=value)
+                            for key, value in (pod_spec.get('nodeSelector') or {}).items())
+        required = pod_spec.get('affinity', {}).get('nodeAffinity', {}).get(
+            'requiredDuringSchedulingIgnoredDuringExecution', {})
+        hostnames = None
+        for term in required.get('nodeSelectorTerms', []):
+            for expression in term.get('matchExpressions', []):
+                if expression['key'] == 'kubernetes.io/hostname' and expression['operator'] == 'In':
+                    hostnames = set(expression['values'])
+        return [name for name, node in self.nodes.items()
+                if match_labels(node['metadata']['labels'], selector) and (hostnames is None or name in hostnames)]
+
+    def _daemonset_pod_ready(self, key, daemonset):
+        if self.stores['DaemonSet'].get(key) is daemonset:
+            daemonset['status']['numberReady'] += 1
+
+    # VMIs
+    def _free_node(self, key):
+        node_name = self.vm_nodes.pop(key, None)
+        if node_name:
+            self.vmis_on_node[node_name] -= 1
+
+    def _start_vmi(self, key):
+        vm = self.stores['VirtualMachine'][key]
+        vmi = {
+            'metadata': {'namespace': key[0], 'name': key[1],
+                         'labels': dict(vm['spec']['template'].get('metadata', {}).get('labels') or {})},
+            'status': {'phase': 'Pending'}
+        }
+        self._put('VirtualMachineInstance', vmi, 'ADDED')
+        self._later(self.schedule_delay, self._schedule_vmi, key, vmi)
+
+    def _schedule_vmi(self, key, vmi):
+        if self.stores['VirtualMachineInstance'].get(key) is not vmi:
+            return
+        vm = self.stores['VirtualMachine'][key]
+        selector = vm['spec']['template']['spec'].get('nodeSelector') or {}
+        node_name = selector.get('kubernetes.io/hostname')
+        if node_name not in self.nodes:
+            node_name = min(self.vmis_on_node, key=self.vmis_on_node.get)
+        self.vmis_on_node[node_name] += 1
+        self.vm_nodes[key] = node_name
+        vmi = {'metadata': dict(vmi['metadata']), 'status': {'phase': 'Scheduled', 'nodeName': node_name}}
+        self._put('VirtualMachineInstance', vmi, 'MODIFIED')
+        images = [volume['containerDisk']['image'] for volume in vm['spec']['template']['spec'].get('volumes') or []
+                  if (volume.get('containerDisk') or {}).get('image')]
+        pulled = self._pull(node_name, images)
+        self._later(max(pulled - time.time(), 0) + self.start_delay, self._run_vmi, key, vmi)
+
+    def _run_vmi(self, key, vmi):
+        if self.stores['VirtualMachineInstance'].get(key) is not vmi:
+            return
+        vmi = {'metadata': dict(vmi['metadata']), 'status': dict(vmi['status'], phase='Running')}
+        self._put('VirtualMachineInstance', vmi, 'MODIFIED')
+
+
+class SimulatedResource(object):
+    """
+    DynamicClient resource API over the simulated cluster
+    """
+
+    def __init__(self, cluster, kind):
+        self.cluster = cluster
+        self.kind = kind
+
+    def get(self, name=None, namespace=None, label_selector=None, field_selector=None, limit=None, _continue=None,
+            serializer=None, **kwargs):
+        self.cluster.call()
+        after = tuple(_continue.split("/", 1)) if _continue else None
+        items, resource_version, more = self.cluster.list(
+            self.kind, namespace=namespace, label_selector=label_selector, field_selector=field_selector,
+            limit=None if name is not None else limit, after=after)
+        serializer = serializer or (lambda client, data: Field(data))
+        if name is not None:
+            items = [item for item in items if item['metadata']['name'] == name]
+            if not items:
+                raise _api_error(exceptions.NotFoundError, 404, "NotFound")
+            return serializer(self, items[0])
+        metadata = {'resourceVersion': resource_version}
+        if more:
+            # continue token: key of the last object returned
+            last = items[-1]['metadata']
+            metadata['continue'] = "{ns}/{name}".format(ns=last.get('namespace', ''), name=last['name'])
+        return serializer(self, {'metadata': metadata, 'items': items})
+
+    def watch(self, resource_version=None, timeout=None, label_selector=None, **kwargs):
+        return self.cluster.watch(self.kind, resource_version=resource_version, timeout=timeout,
+                                  label_selector=label_selector)
+
+    def create(self, body, namespace=None, dry_run=None, **kwargs):
+        self.cluster.call()
+        if dry_run:
+            if self.kind == 'VirtualMachine' and not (body.get('metadata', {}).get('name') and
+                                                      body.get('spec', {}).get('template', {}).get('spec', {})
+                                                      .get('domain')):
+                raise _api_error(exceptions.UnprocessibleEntityError, 422, "Invalid")
+            return Field(body)
+        if self.kind == 'Namespace':
+            self.cluster.create_namespace(body)
+        elif self.kind == 'VirtualMachine':
+            self.cluster.create_vm(body, namespace or body['metadata'].get('namespace'))
+        elif self.kind == 'DaemonSet':
+            self.cluster.create_daemonset(body, namespace or body['metadata'].get('namespace'))
+        return Field(body)
+
+    def server_side_apply(self, body, name=None, namespace=None, **kwargs):
+        """
+        Create or leave as is (the simulator does not merge fields)
+        """
+        try:
+            return self.create(body, namespace=namespace)
+        except exceptions.ConflictError:
+            return Field(body)
+
+    def delete(self, name=None, namespace=None, label_selector=None, **kwargs):
+        self.cluster.call()
+        if self.kind == 'Namespace':
+            self.cluster.delete_namespace(name)
+        elif self.kind == 'VirtualMachine':
+            if name is not None:
+                self.cluster.vm_action(namespace, name, 'stop')
+                with self.cluster._lock:
+                    self.cluster._delete_vm((namespace, name))
+            else:
+                return Field({'items': self.cluster.delete_vms(namespace, label_selector)})
+        elif self.kind == 'DaemonSet':
+            with self.cluster._lock:
+                if self.cluster._delete('DaemonSet', (namespace, name)) is None:
+                    raise _api_error(exceptions.NotFoundError, 404, "NotFound")
+
+    def patch(self, body, name=None, namespace=None, **kwargs):
+        self.cluster.call()
+        if self.kind == 'VirtualMachine' and 'running' in body.get('spec', {}):
+            self.cluster.vm_action(namespace, name, 'start' if body['spec']['running'] else 'stop')
+
+
+class SimulatedResources(object):
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self._resources = {}
+
+    def get(self, api_version=None, kind=None, **kwargs):
+        if kind not in self._resources:
+            self._resources[kind] = SimulatedResource(self.cluster, kind)
+        return self._resources[kind]
+
+
+class SimulatedDynamicClient(object):
+    """
+    Drop in for openshift DynamicClient, pass it to Client(dyn_client=...)
+    """
+
+    def __init__(self, cluster=None):
+        self.cluster = cluster or SimulatedCluster()
+        self.resources = SimulatedResources(self.cluster)
+        self.configuration = Field({'host': "simulated"})
+        self.version = {'kubernetes': {'gitVersion': "simulated"}}
+
+    def request(self, method, path, body=None, **params):
+        self.cluster.call()
+        match = SUBRESOURCE_PATH.match(path)
+        if method.lower() != 'put' or match is None:
+            raise _api_error(exceptions.NotFoundError, 404, "Simulated path not found: {path}".format(path=path))
+        self.cluster.vm_action(match.group('namespace'), match.group('name'), match.group('action'))
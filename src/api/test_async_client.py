@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import asyncio
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import src.utils.config as config
+import src.api.client as client
+import src.api.simulator as simulator
+from src.api.async_client import AsyncClient, AsyncApiError, HttpTransport, SimulatedTransport, run
+
+VM_BODY = {
+    'apiVersion': config.KUBEVIRT_API_VERSION, 'kind': 'VirtualMachine',
+    'metadata': {'name': 'vm-1', 'labels': {config.RUN_LABEL_KEY: config.RUN_LABEL_VALUE}},
+    'spec': {'running': True, 'template': {'metadata': {'labels': {config.RUN_LABEL_KEY: config.RUN_LABEL_VALUE}},
+                                           'spec': {}}}
+}
+
+
+def test_simulated_create_lifecycle_list_and_watch():
+    cluster = simulator.SimulatedCluster()
+
+    async def scenario():
+        aclient = AsyncClient(SimulatedTransport(cluster))
+        await aclient.add_namespace("ns-1")
+        # an existing namespace is not an error
+        await aclient.add_namespace("ns-1")
+        await aclient.create_vm(VM_BODY, "ns-1")
+        await aclient.create_vm(VM_BODY, "ns-1", method=config.CREATE_APPLY)
+        with pytest.raises(AsyncApiError) as err:
+            await aclient.create_vm(VM_BODY, "ns-1")
+        assert err.value.status == 409
+        vmis, resource_version = await aclient.list_vmis(limit=1)
+        assert [(vmi.name, vmi.namespace) for vmi in vmis] == [("vm-1", "ns-1")]
+        assert await aclient.vm_action_bulk('stop', [("vm-1", "ns-1"), ("vm-2", "ns-1")]) == [True, False]
+        events = []
+        async for event in aclient.watch_vmis(resource_version=resource_version, timeout=1):
+            events.append(event['type'])
+            if event['type'] == 'DELETED':
+                break
+        await aclient.close()
+        return events
+
+    assert run(scenario())[-1] == 'DELETED'
+    assert (None, "ns-1") in cluster.stores['Namespace']
+
+
+def test_for_client_uses_the_simulated_cluster():
+    cluster_client = client.Client(dyn_client=simulator.SimulatedDynamicClient())
+
+    async def scenario():
+        aclient = AsyncClient.for_client(cluster_client)
+        await aclient.add_namespace("ns-1")
+        return aclient.transport
+
+    assert run(scenario()).cluster is cluster_client.dyn_client.cluster
+    assert cluster_client.get_namespaces() == ["ns-1"]
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.server.peers.add(self.client_address)
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if body['metadata']['name'] == 'exists':
+            self._reply(409, {'message': 'AlreadyExists'})
+        else:
+            self._reply(201, body)
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        lines = [json.dumps({'type': 'ADDED', 'object': {'metadata': {'name': 'vm-{i}'.format(i=i)}}}) + "\n"
+                 for i in range(3)]
+        # split a line over two chunks
+        for chunk in [lines[0][:10], lines[0][10:] + lines[1], lines[2]]:
+            data = chunk.encode('utf-8')
+            self.wfile.write("{size:x}\r\n".format(size=len(data)).encode('ascii') + data + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class ApiServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def api_server():
+    server = ApiServer(("127.0.0.1", 0), ApiHandler)
+    server.peers = set()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_transport_shares_keep_alive_connections(api_server):
+    host = "http://127.0.0.1:{port}".format(port=api_server.server_address[1])
+
+    async def scenario():
+        transport = HttpTransport(host, pool_size=2)
+        aclient = AsyncClient(transport, concurrency=50)
+        bodies = [dict(VM_BODY, metadata={'name': 'vm-{i}'.format(i=i)}) for i in range(50)]
+        await asyncio.gather(*[aclient.create_vm(body, "ns-1") for body in bodies])
+        with pytest.raises(AsyncApiError) as err:
+            await aclient.create_vm(dict(VM_BODY, metadata={'name': 'exists'}), "ns-1")
+        events = [event['raw_object']['metadata']['name'] async for event in aclient.watch_vmis()]
+        await aclient.close()
+        return transport, err.value, events
+
+    transport, err, events = run(scenario())
+    assert len(api_server.peers) <= 2
+    assert transport.connects == len(api_server.peers) + 1  # the watch connection
+    assert (err.status, err.reason) == (409, 'AlreadyExists')
+    assert events == ['vm-0', 'vm-1', 'vm-2']
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import pytest
+import src.api.client as client
+import src.api.simulator as simulator
+
+
+class FailingResource(object):
+    def get(self, **kwargs):
+        raise IOError("apiserver down")
+
+    def watch(self, **kwargs):
+        raise IOError("apiserver down")
+
+
+def test_vmi_cache_start_raises_without_sync():
+    vmi_cache = client.VmiCache(FailingResource())
+    with pytest.raises(RuntimeError) as err:
+        vmi_cache.start(timeout=0.5)
+    assert "apiserver down" in str(err.value)
+
+
+def test_vmi_cache_counts_listed_vmis():
+    dyn_client = simulator.SimulatedDynamicClient()
+    cluster = client.Client(dyn_client=dyn_client)
+    cluster.add_namespace("ns-1")
+    body = {
+        'apiVersion': 'kubevirt.io/v1alpha3', 'kind': 'VirtualMachine',
+        'metadata': {'name': 'vm-1', 'namespace': 'ns-1'}, 'spec': {'running': True, 'template': {'spec': {}}}
+    }
+    cluster.create_vm(yaml_body=body, namespace="ns-1")
+    assert cluster.vmi_cache.count_in_namespace("ns-1") == 1
+
+
+def test_vmi_cache_is_created_once():
+    cluster = client.Client(dyn_client=simulator.SimulatedDynamicClient())
+    caches = []
+    threads = [threading.Thread(target=lambda: caches.append(cluster.vmi_cache)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(id(vmi_cache) for vmi_cache in caches)) == 1
+
+
+def test_pod_requests():
+    pod = {'spec': {
+        'containers': [
+            {'resources': {'requests': {'cpu': '500m', 'memory': '1Gi'}}},
+            {'resources': {'limits': {'cpu': '1', 'memory': '512Mi', 'devices.kubevirt.io/kvm': '1'}}}
+        ],
+        'initContainers': [{'resources': {'requests': {'cpu': '2'}}}]
+    }}
+    assert client.pod_requests(pod) == {'cpu': 2.0, 'memory': 1.5 * 1024 ** 3, 'kvm': 1}
+
+
+def test_node_requests_of_active_pods():
+    dyn_client = simulator.SimulatedDynamicClient()
+    cluster = dyn_client.cluster
+    for name, node, phase in [('a', 'sim-node-0', 'Running'), ('b', 'sim-node-0', 'Pending'),
+                              ('c', 'sim-node-0', 'Succeeded'), ('d', None, 'Pending')]:
+        cluster._put('Pod', {
+            'metadata': {'name': name, 'namespace': 'ns-1'},
+            'spec': {'nodeName': node, 'containers': [{'resources': {'requests': {'cpu': '1'}}}]},
+            'status': {'phase': phase}
+        }, 'ADDED')
+    used = client.Client(dyn_client=dyn_client).get_node_requests()
+    assert used == {'sim-node-0': {'cpu': 2.0, 'memory': 0.0, 'kvm': 0}}
+
+
+def test_node_record_parses_kvm_quantities():
+    node = client.NodeRecord({
+        'metadata': {'name': 'node-1'},
+        'status': {
+            'conditions': [{'type': 'Ready', 'reason': 'KubeletReady', 'status': 'True'}],
+            'capacity': {'devices.kubevirt.io/kvm': '1k'},
+            'allocatable': {'cpu': '64', 'memory': '256Gi', 'devices.kubevirt.io/kvm': '1k'}
+        }
+    })
+    assert node.ready
+    assert node.kvm_capacity == node.allocatable['kvm'] == 1000
+    pod = {'spec': {'containers': [{'resources': {'requests': {'devices.kubevirt.io/kvm': '1k'}}}]}}
+    assert client.pod_requests(pod)['kvm'] == 1000
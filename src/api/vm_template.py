@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import yaml
+import src.utils.config as config
+import src.utils.helper as helper
+import src.utils.logger as logger
+
+logger = logger.MyLogger.__call__().get_logger()
+
+NODE_SELECTOR_LABEL = 'kubernetes.io/hostname'
+
+
+def _is_set(value):
+    return value not in (None, 'None', '')
+
+
+class VmTemplate(object):
+    """
+    VM manifest parsed once with the constraints that are the same for all VMs
+    and the run label.
+    Per VM bodies share the parsed tree and only copy the dicts on the path to
+    the fields that change (name, namespace, node selector).
+    """
+
+    def __init__(self, manifest, constraints=None):
+        """
+        :param manifest: parsed VM manifest (dict)
+        :param constraints: dict with common constraints:
+                            running_state, vm_cpu, vm_memory
+        """
+        constraints = constraints or {}
+        self.manifest = manifest
+        spec = manifest['spec']
+        manifest['metadata'].setdefault('labels', {})[config.RUN_LABEL_KEY] = config.RUN_LABEL_VALUE
+        spec['template'].setdefault('metadata', {}).setdefault('labels', {})[config.RUN_LABEL_KEY] = \
+            config.RUN_LABEL_VALUE
+        vm_spec = spec['template']['spec']
+        if _is_set(constraints.get('running_state')):
+            spec['running'] = constraints['running_state']
+        if _is_set(constraints.get('vm_cpu')):
+            vm_spec['domain'].setdefault('cpu', {})['cores'] = int(constraints['vm_cpu'])
+        if _is_set(constraints.get('vm_memory')):
+            vm_spec['domain'].setdefault('resources', {}).setdefault('requests', {})['memory'] = \
+                constraints['vm_memory']
+
+    def requests(self):
+        """
+        Node resources one VM of the template takes
+        :return: dict {'cpu': cores, 'memory': bytes, 'kvm': devices}
+        """
+        domain = self.manifest['spec']['template']['spec']['domain']
+        requests = (domain.get('resources') or {}).get('requests') or {}
+        if 'cpu' in requests:
+            cpu = helper.parse_quantity(requests['cpu'])
+        else:
+            topology = domain.get('cpu') or {}
+            vcpus = int(topology.get('cores', 1)) * int(topology.get('sockets', 1)) * int(topology.get('threads', 1))
+            cpu = float(vcpus) / config.CPU_ALLOCATION_RATIO
+        memory = requests.get('memory') or (domain.get('memory') or {}).get('guest') or 0
+        return {
+            'cpu': cpu,
+            'memory': helper.parse_quantity(memory) + helper.parse_quantity(config.VM_MEMORY_OVERHEAD),
+            'kvm': 1
+        }
+
+    def images(self):
+        """
+        containerDisk images of the template
+        :return: list of (image, imagePullPolicy or None)
+        """
+        images = []
+        for volume in self.manifest['spec']['template']['spec'].get('volumes') or []:
+            container_disk = volume.get('containerDisk') or {}
+            if container_disk.get('image'):
+                image = (container_disk['image'], container_disk.get('imagePullPolicy'))
+                if image not in images:
+                    images.append(image)
+        return images
+
+    @classmethod
+    def from_file(cls, yaml_file, constraints=None):
+        """
+        Parse the VM yaml file
+        :param yaml_file: Path to yaml file
+        :param constraints: dict with common constraints
+        :return: VmTemplate
+        """
+        with open(yaml_file, 'r') as stream:
+            try:
+                manifest = yaml.safe_load(stream)
+            except yaml.YAMLError as exc:
+                logger.error("Failed to read yaml file {yaml}, err: \n {err}".format(yaml=yaml_file, err=exc))
+                exit(1)
+        return cls(manifest, constraints)
+
+    def render(self, vm_name, namespace=None, node_name=None):
+        """
+        Stamp VM body
+        :param vm_name: VM name
+        :param namespace: namespace to set in metadata
+        :param node_name: node to pin the VM to with node selector
+        :return: VM body (dict), shares the unchanged parts with the template
+        """
+        body = dict(self.manifest)
+        metadata = dict(body['metadata'])
+        metadata['name'] = vm_name
+        if namespace is not None:
+            metadata['namespace'] = namespace
+        body['metadata'] = metadata
+        if node_name is not None:
+            spec = dict(body['spec'])
+            template = dict(spec['template'])
+            vm_spec = dict(template['spec'])
+            vm_spec['nodeSelector'] = {NODE_SELECTOR_LABEL: node_name}
+            template['spec'] = vm_spec
+            spec['template'] = template
+            body['spec'] = spec
+        return body
+
+    def bodies(self, vm_names, namespace=None, node_name=None):
+        """
+        Generator of ready VM bodies
+        :param vm_names: iterable of VM names
+        :param namespace: namespace to set in metadata
+        :param node_name: node to pin the VMs to
+        :return: generator of (vm_name, body)
+        """
+        for vm_name in vm_names:
+            yield vm_name, self.render(vm_name, namespace=namespace, node_name=node_name)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import asyncio
+import src.utils.config as config
+import src.utils.logger as logger
+from src.api import async_client
+from src.api.async_client import AsyncClient
+from src.scale.creation_engine import TokenBucket
+from src.scale.ramp import AdaptiveRamp
+from src.utils.node_sampler import NodeGate
+from src.scale.registry import STATE_CREATED, STATE_RUNNING
+
+logger = logger.MyLogger.__call__().get_logger()
+
+
+async def add_vm(executor, aclient, index, ns_name, vm_name, node_name=None):
+    """
+    Coroutine version of ScaleExecutor.add_vm
+    """
+    if (vm_name, ns_name) in executor.registry:
+        return
+    constraints = executor.constraints
+    interval = int(constraints['number_of_vms_in_interval'])
+    executor.latency.record_create(vm_name, ns_name, node=node_name, batch=index // interval)
+    await aclient.create_vm(
+        executor.vm_template.render(vm_name, namespace=ns_name, node_name=node_name), ns_name,
+        method=constraints['create_method']
+    )
+    state = STATE_RUNNING if constraints["running_state"] is True else STATE_CREATED
+    if state == STATE_CREATED:
+        if constraints['lifecycle_mode'] == config.LIFECYCLE_VIRTCTL:
+            started = await asyncio.get_event_loop().run_in_executor(
+                None, executor._vm_action, executor.action_list[0], vm_name, ns_name)
+        else:
+            started = await aclient.vm_action(executor.action_list[0], vm_name, ns_name,
+                                              mode=constraints['lifecycle_mode'])
+        if started:
+            state = STATE_RUNNING
+    executor._vm_created(vm_name, ns_name, node_name, state)
+
+
+async def _gated(gate, jobs, room):
+    """
+    Async version of NodeGate.jobs, waits on the node CPU without blocking the loop
+    """
+    for job in jobs:
+        await room()
+        for ready in gate.release():
+            yield ready
+            await room()
+        if gate.offer(job):
+            yield job
+    while gate.pending:
+        released = gate.release()
+        if not released:
+            logger.info("Waiting for CPU idle on nodes {nodes}".format(nodes=list(gate.pending)))
+            await asyncio.sleep(gate.interval)
+        for ready in released:
+            await room()
+            yield ready
+
+
+async def _run_jobs(executor, jobs, nodes=None):
+    constraints = executor.constraints
+    max_in_flight = int(constraints['max_in_flight'])
+    rate_limiter = TokenBucket(float(constraints['create_rate']))
+    ramp = None
+    if constraints['ramp_mode'] == config.RAMP_ADAPTIVE:
+        ramp = AdaptiveRamp(
+            rate_limiter, executor.client.vmi_cache, node_sampler=executor.cpu_sampler(), nodes=nodes,
+            max_backlog=int(constraints['ramp_max_backlog'])
+        ).start()
+    aclient = AsyncClient.for_client(executor.client)
+    stats = {'submitted': 0, 'done': 0, 'failed': 0}
+    tasks = set()
+
+    async def _job(index, ns_name, vm_name, node_name):
+        try:
+            await add_vm(executor, aclient, index, ns_name, vm_name, node_name)
+            stats['done'] += 1
+        except Exception as err:
+            logger.error("Job add_vm ({index}, {ns}, {vm}) failed, err: {err}".format(
+                index=index, ns=ns_name, vm=vm_name, err=err))
+            stats['failed'] += 1
+
+    async def _room():
+        if len(tasks) >= max_in_flight:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+
+    start = time.time()
+    loop = asyncio.get_event_loop()
+    jobs = (job for job in jobs if (job[2], job[1]) not in executor.registry)
+    try:
+        # CPU gate before the rate token and the task slot
+        async for job in _gated(NodeGate(executor.cpu_sampler), jobs, _room):
+            wait = rate_limiter.reserve()
+            if wait:
+                await asyncio.sleep(wait)
+            task = loop.create_task(_job(*job))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            stats['submitted'] += 1
+            if executor._interval_end(job[0]):
+                # fixed ramp: no coroutine creates during the delay
+                if tasks:
+                    await asyncio.wait(tasks)
+                await asyncio.sleep(int(constraints['delay_between_intervals']))
+                executor.client.get_vmis_status_summary()
+        if tasks:
+            await asyncio.wait(tasks)
+    finally:
+        await aclient.close()
+    stats['elapsed'] = time.time() - start
+    stats['rate'] = stats['done'] / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+    logger.info("Async engine: {done} done, {failed} failed in {elapsed:.1f}s ({rate:.2f} ops/s)".format(**stats))
+    if ramp is not None:
+        stats['max_safe_rate'] = ramp.stop()
+    return stats
+
+
+def run_jobs(executor, jobs, nodes=None):
+    """
+    Create the VMs of jobs as coroutines on one event loop
+    :param executor: ScaleExecutor
+    :param jobs: iterable of (index, ns_name, vm_name, node_name)
+    :param nodes: nodes the VMs go to, for the ramp CPU check
+    :return: engine stats
+    """
+    return async_client.run(_run_jobs(executor, jobs, nodes=nodes))
+
+
+async def _run_action(executor, action, vms):
+    aclient = AsyncClient.for_client(executor.client)
+    try:
+        return await aclient.vm_action_bulk(action, vms, mode=executor.constraints['lifecycle_mode'])
+    finally:
+        await aclient.close()
+
+
+def run_action(executor, action, vms):
+    """
+    Run lifecycle action on the VMs as coroutines on one event loop
+    :param vms: list of (vm_name, namespace)
+    :return: list of results (True/False) in the order of vms
+    """
+    return async_client.run(_run_action(executor, action, vms))
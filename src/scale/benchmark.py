@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import copy
+import json
+import time
+import shutil
+import logging
+import datetime
+import resource
+import tempfile
+import multiprocessing
+import src.utils.config as config
+import src.utils.logger as logger
+
+logger = logger.MyLogger.__call__().get_logger()
+
+VM_YAML = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "manifests", "cirros_vm.yaml")
+
+
+def bench_constraints(scenario, num_of_vms, journal, engine=config.ENGINE_THREADS):
+    """
+    Constraints to run scenario with num_of_vms VMs on the simulated backend
+    """
+    constraints = copy.deepcopy(config.SCALE_TEST_CONSTRAINTS)
+    constraints.update({
+        'backend': config.BACKEND_SIMULATED,
+        'current_test': scenario,
+        'vm_yaml': VM_YAML,
+        'node': None,
+        'create_rate': 0,
+        'ramp_mode': config.RAMP_FIXED,
+        'delay_between_intervals': 0,
+        'number_of_vms_in_interval': 1000,
+        'vm_lifecycle_action_list': '',
+        'journal': journal,
+        'engine': engine,
+        'max_number_of_vm_per_node': num_of_vms,
+        'ocp_scheduling_total_vms': num_of_vms
+    })
+    if scenario == config.MULTI_NODE:
+        constraints['max_number_of_vm_per_node'] = num_of_vms // config.SIM_NODES
+    return constraints
+
+
+def _bench_case(scenario, num_of_vms, engine, results):
+    """
+    Run one case, in its own process so peak RSS is per case
+    """
+    import src.scale.scale_actions as executor
+
+    workdir = tempfile.mkdtemp(prefix="endurance-bench-")
+    try:
+        constraints = bench_constraints(scenario, num_of_vms, os.path.join(workdir, "journal.jsonl"), engine)
+        cpu_start = os.times()
+        start = time.time()
+        scale_executor = executor.ScaleExecutor(scale_test_constraints=constraints)
+        scale_executor.execute()
+        elapsed = time.time() - start
+        cpu_end = os.times()
+        cpu = (cpu_end[0] - cpu_start[0]) + (cpu_end[1] - cpu_start[1])
+        created = len(scale_executor.registry)
+        results.put({
+            'scenario': scenario,
+            'engine': engine,
+            'vms': created,
+            'seconds': elapsed,
+            'creates_per_second': created / elapsed if elapsed > 0 else 0.0,
+            'cpu_ms_per_vm': 1000.0 * cpu / created if created else None,
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+            'api_calls': scale_executor.client.dyn_client.cluster.api_calls
+        })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        # the process ends with os._exit, write the queued log records first
+        logging.shutdown()
+
+
+def run_benchmarks(scenarios=config.BENCH_SCENARIOS, sizes=config.BENCH_SIZES, engine=config.ENGINE_THREADS,
+                   dirname=config.RESULTS_DIR):
+    """
+    Run the scale scenarios against the simulated cluster and report the tool
+    overhead: creates per second, CPU per VM (tool and simulated apiserver
+    share the process) and peak RSS.
+    :return: list of result dicts
+    """
+    report = []
+    for num_of_vms in sizes:
+        for scenario in scenarios:
+            results = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_bench_case, args=(scenario, num_of_vms, engine, results))
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                logger.error("Benchmark {scenario} with {vms} VMs failed".format(scenario=scenario, vms=num_of_vms))
+                continue
+            result = results.get()
+            report.append(result)
+            logger.info(
+                "Benchmark {scenario:<15} {vms:>7} VMs: {creates_per_second:9.1f} creates/s  "
+                "{cpu_ms_per_vm:7.3f} CPU ms/VM  {peak_rss_mb:8.1f} MB peak RSS".format(**result)
+            )
+    if not os.path.isdir(dirname):
+        os.mkdir(dirname)
+    path = os.path.join(dirname, "bench_" + datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".json")
+    with open(path, 'w') as stream:
+        json.dump(report, stream, indent=2, sort_keys=True)
+    logger.info("Benchmark report written to {path}".format(path=path))
+    return report
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+import src.utils.logger as logger
+
+logger = logger.MyLogger.__call__().get_logger()
+
+
+class TokenBucket(object):
+    """
+    Token bucket rate limiter, thread safe.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: tokens per second (0 or None means no limit)
+        :param burst: bucket size, default one second of tokens
+        """
+        self.rate = float(rate) if rate else 0.0
+        self.burst = float(burst) if burst else max(self.rate, 1.0)
+        self._tokens = self.burst
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self.rate = float(rate) if rate else 0.0
+
+    def reserve(self, tokens=1):
+        """
+        Take tokens without waiting
+        :param tokens: tokens to take
+        :return: seconds the caller has to wait before using them
+        """
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def acquire(self, tokens=1):
+        """
+        Block until tokens are available
+        """
+        wait = self.reserve(tokens)
+        if wait:
+            time.sleep(wait)
+
+
+class CreationEngine(object):
+    """
+    Fixed size worker pool fed by a queue.
+    Every job takes a token from the rate limiter and a slot from the
+    in-flight limit, so a slow node holds one worker and not the whole run.
+    """
+
+    def __init__(self, workers=10, rate=None, max_in_flight=None):
+        """
+        :param workers: number of worker threads
+        :param rate: max jobs started per second (None: no limit)
+        :param max_in_flight: max jobs running at the same time (None: workers)
+        """
+        self.workers = int(workers)
+        self.rate_limiter = TokenBucket(rate)
+        self.in_flight = threading.BoundedSemaphore(int(max_in_flight or workers))
+        self.submitted = 0
+        self.done = 0
+        self.failed = 0
+        self.start_time = None
+        self.end_time = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._room = threading.Condition(threading.Lock())
+        self._threads = []
+
+    def start(self):
+        self.start_time = time.time()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name="create-worker-{i}".format(i=i))
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue a job
+        :param func: callable to run in a worker
+        """
+        self._put(1, func, args, kwargs)
+
+    def submit_batch(self, func, batch):
+        """
+        Queue a job working on a batch, it takes a token and counts once per item,
+        so a batch of n VMs costs n tokens of the create rate
+        :param func: callable getting the batch
+        :param batch: list of items
+        """
+        self._put(len(batch), func, (batch,), {})
+
+    def wait_for_room(self):
+        """
+        Block while a job per worker is queued and not started yet,
+        so a dispatcher decides on a job just before a worker takes it
+        """
+        with self._room:
+            while self._queue.qsize() >= self.workers:
+                self._room.wait()
+
+    def _put(self, cost, func, args, kwargs):
+        with self._lock:
+            self.submitted += cost
+        self._queue.put((cost, func, args, kwargs))
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            with self._room:
+                self._room.notify()
+            if job is None:
+                self._queue.task_done()
+                return
+            cost, func, args, kwargs = job
+            self.rate_limiter.acquire(cost)
+            self.in_flight.acquire()
+            try:
+                func(*args, **kwargs)
+                with self._lock:
+                    self.done += cost
+            except Exception as err:
+                logger.error("Job {func} {args} failed, err: {err}".format(func=func.__name__, args=args, err=err))
+                with self._lock:
+                    self.failed += cost
+            finally:
+                self.in_flight.release()
+                self._queue.task_done()
+
+    def wait(self):
+        """
+        Wait for the queued jobs, the workers keep running
+        """
+        self._queue.join()
+
+    def join(self):
+        """
+        Wait for all queued jobs and stop the workers
+        :return: dict with run stats
+        """
+        self._queue.join()
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        self.end_time = time.time()
+        stats = self.stats()
+        logger.info("Creation engine: {done} done, {failed} failed in {elapsed:.1f}s ({rate:.2f} ops/s)".format(
+            **stats))
+        return stats
+
+    def stats(self):
+        elapsed = (self.end_time or time.time()) - (self.start_time or time.time())
+        return {
+            'submitted': self.submitted,
+            'done': self.done,
+            'failed': self.failed,
+            'elapsed': elapsed,
+            'rate': self.done / elapsed if elapsed > 0 else 0.0
+        }
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import copy
+import time
+import logging
+import threading
+import multiprocessing
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+import src.utils.config as config
+import src.utils.logger as logger
+from src.scale.latency import LatencyTracker
+from src.scale.warmup import ImageWarmup, target_nodes
+from src.scale.results import RunStore
+from src.scale.journal import RunJournal
+
+logger = logger.MyLogger.__call__().get_logger()
+
+MSG_LATENCY = "latency"
+MSG_PROGRESS = "progress"
+MSG_DONE = "done"
+
+
+def split_range(start, end, parts):
+    """
+    Split [start, end) to parts contiguous ranges
+    :return: list of (start, end), empty ranges are dropped
+    """
+    if parts < 1:
+        return []
+    size, extra = divmod(max(end - start, 0), parts)
+    ranges = []
+    for part in range(parts):
+        stop = start + size + (1 if part < extra else 0)
+        if stop > start:
+            ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def split_constraints(constraints, node_list, workers):
+    """
+    Split the scenario of constraints between workers.
+    multi_node gets a share of the nodes, single_node and ocp_scheduling a
+    share of the VM index range (vm_offset to the end index).
+    :param node_list: ready compute nodes
+    :return: list of worker constraints, empty when the scenario can not be split
+    """
+    scenario = constraints['current_test']
+    offset = int(constraints['vm_offset'])
+    shares = []
+    if scenario == config.MULTI_NODE:
+        nodes = constraints['nodes'] or node_list
+        shares = [{'nodes': nodes[i::workers]} for i in range(min(workers, len(nodes)))]
+    elif scenario == config.SINGLE_NODE:
+        end = int(constraints['max_number_of_vm_per_node'])
+        shares = [{'vm_offset': start, 'max_number_of_vm_per_node': stop}
+                  for start, stop in split_range(offset, end, workers)]
+    elif scenario == config.OCP_SCHEDULING:
+        end = int(constraints['ocp_scheduling_total_vms'])
+        shares = [{'vm_offset': start, 'ocp_scheduling_total_vms': stop}
+                  for start, stop in split_range(offset, end, workers)]
+    else:
+        logger.error("Scenario {scenario} can not be split between workers".format(scenario=scenario))
+        return []
+    action_vms = split_range(0, int(constraints['vm_lifecycle_number_of_vms'] or 0), len(shares))
+    worker_constraints = []
+    for worker_id, share in enumerate(shares):
+        worker = copy.deepcopy(constraints)
+        worker.update(share)
+        worker['worker_id'] = worker_id
+        if int(constraints['metrics_port']):
+            # every worker serves its own endpoint on the next ports
+            worker['metrics_port'] = int(constraints['metrics_port']) + 1 + worker_id
+        worker['journal'] = RunJournal.worker_path(constraints['journal'], worker_id)
+        worker['vm_lifecycle_number_of_vms'] = action_vms[worker_id][1] - action_vms[worker_id][0] \
+            if worker_id < len(action_vms) else 0
+        worker_constraints.append(worker)
+    return worker_constraints
+
+
+def _worker(constraints, messages, interval):
+    """
+    Worker process: run the scenario share and stream progress and latency
+    records to the coordinator
+    """
+    import src.scale.scale_actions as executor
+
+    worker_id = constraints['worker_id']
+    running = queue.Queue()
+    scale_executor = executor.ScaleExecutor(scale_test_constraints=constraints)
+    scale_executor.latency.on_running = running.put
+    stop = threading.Event()
+
+    def _drain():
+        records = []
+        while True:
+            try:
+                records.append(running.get_nowait().to_dict())
+            except queue.Empty:
+                break
+        if records:
+            messages.put((MSG_LATENCY, worker_id, records))
+
+    def _report():
+        while not stop.wait(interval):
+            _drain()
+            messages.put((MSG_PROGRESS, worker_id, len(scale_executor.registry)))
+
+    reporter = threading.Thread(target=_report, name="worker-reporter")
+    reporter.daemon = True
+    reporter.start()
+    error = None
+    try:
+        scale_executor.execute()
+    except Exception as err:
+        logger.error("Worker {worker_id} failed, err: {err}".format(worker_id=worker_id, err=err))
+        error = str(err)
+    finally:
+        stop.set()
+        reporter.join()
+        _drain()
+        # VMs that never got to Running
+        pending = [record.to_dict() for record in list(scale_executor.latency.records.values())
+                   if record.running is None]
+        if pending:
+            messages.put((MSG_LATENCY, worker_id, pending))
+        messages.put((MSG_DONE, worker_id, {'vms': len(scale_executor.registry), 'error': error}))
+        # the process ends with os._exit, write the queued log records first
+        logging.shutdown()
+
+
+class Coordinator(object):
+    """
+    Run the scale scenario from several local load generator processes.
+    Every worker runs a ScaleExecutor on its share of the nodes or VM index
+    range; the coordinator merges their latency records into one live summary
+    and report.
+    """
+
+    def __init__(self, constraints, workers=config.DISTRIBUTED_WORKERS, interval=config.PROGRESS_INTERVAL):
+        """
+        :param constraints: scale test constraints
+        :param workers: number of worker processes
+        :param interval: seconds between progress messages
+        """
+        self.constraints = constraints
+        self.workers = int(workers)
+        self.interval = interval
+        self.latency = LatencyTracker()
+        self.started = 0
+        self.progress = {}
+        self.results = {}
+
+    def _client(self):
+        import src.api.client as client
+        import src.api.simulator as simulator
+
+        simulated = self.constraints['backend'] == config.BACKEND_SIMULATED
+        return client.Client(dyn_client=simulator.SimulatedDynamicClient() if simulated else None)
+
+    def _prepull(self, node_list=None):
+        """
+        Pull the images once for all workers, before they start
+        """
+        cluster = self._client()
+        vm_template = cluster.get_vm_template(self.constraints['vm_yaml'], self.constraints)
+        nodes = target_nodes(self.constraints, node_list or cluster.get_ready_node_list())
+        return ImageWarmup(cluster, vm_template, nodes, timeout=self.constraints['prepull_timeout']).run()
+
+    def run(self, node_list=None):
+        """
+        Start the workers and wait for all of them
+        :param node_list: ready compute nodes, default read from the cluster
+        :return: dict worker id -> worker result
+        """
+        started = time.time()
+        if node_list is None and self.constraints['current_test'] == config.MULTI_NODE \
+                and not self.constraints['nodes']:
+            node_list = self._client().get_ready_node_list()
+        if self.constraints['prepull'] is True:
+            self._prepull(node_list)
+        worker_constraints = split_constraints(self.constraints, node_list, self.workers)
+        if not worker_constraints:
+            logger.error("Coordinator: no work to split between {workers} workers".format(workers=self.workers))
+            exit(1)
+        self.started = len(worker_constraints)
+        messages = multiprocessing.Queue()
+        processes = []
+        for constraints in worker_constraints:
+            process = multiprocessing.Process(
+                target=_worker, args=(constraints, messages, self.interval),
+                name="endurance-worker-{worker_id}".format(worker_id=constraints['worker_id'])
+            )
+            process.start()
+            processes.append(process)
+        logger.info("Coordinator: started {num} workers".format(num=len(processes)))
+        start = time.time()
+        last_summary = start
+        while len(self.results) < len(processes):
+            try:
+                self._handle(*messages.get(timeout=self.interval))
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    logger.error("Coordinator: workers exited without result")
+                    break
+            if time.time() - last_summary >= self.interval:
+                last_summary = time.time()
+                self.log_summary(last_summary - start)
+        for process in processes:
+            process.join()
+        self.log_summary(time.time() - start)
+        self.latency.report()
+        RunStore().save(self.constraints, self._client().cluster_fingerprint(), self.latency, started)
+        return self.results
+
+    def _handle(self, msg_type, worker_id, payload):
+        if msg_type == MSG_LATENCY:
+            for record in payload:
+                self.latency.add_record(record)
+        elif msg_type == MSG_PROGRESS:
+            self.progress[worker_id] = payload
+        elif msg_type == MSG_DONE:
+            self.progress[worker_id] = payload['vms']
+            self.results[worker_id] = payload
+            if payload['error']:
+                logger.error("Coordinator: worker {worker_id} failed: {err}".format(
+                    worker_id=worker_id, err=payload['error']))
+
+    def log_summary(self, elapsed):
+        created = sum(self.progress.values())
+        summary = self.latency.summary()
+        logger.info(
+            "Coordinator: {created} VMs created ({rate:.1f}/s), {running} Running, "
+            "{done}/{workers} workers done, time to Running: {ttr}".format(
+                created=created, rate=created / elapsed if elapsed > 0 else 0.0, running=summary['running'],
+                done=len(self.results), workers=self.started, ttr=summary['time_to_running']
+            )
+        )
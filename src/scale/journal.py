@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import threading
+import src.utils.config as config
+import src.utils.logger as logger
+
+logger = logger.MyLogger.__call__().get_logger()
+
+OP_CREATE = "create"
+OP_ACTION = "action"
+OP_DELETE = "delete"
+OP_DONE = "done"  # the run got to its end
+STAGE_LIFECYCLE = "lifecycle"  # actions of the vm lifecycle stage
+
+
+class RunJournal(object):
+    """
+    Append only run journal, one JSON record per line.
+    Records are buffered and written with one fsync per batch, by size or
+    by time from a background thread.
+    """
+
+    def __init__(self, path=config.JOURNAL_FILE, batch_size=config.JOURNAL_BATCH_SIZE,
+                 flush_interval=config.JOURNAL_FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        dirname = os.path.dirname(path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stream = open(path, 'a+')
+        self._stream.seek(0, os.SEEK_END)
+        if self._stream.tell() > 0:
+            self._stream.seek(self._stream.tell() - 1)
+            if self._stream.read(1) != "\n":
+                # end the torn record of a crashed run
+                self._stream.write("\n")
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="journal")
+        self._thread.daemon = True
+        self._thread.start()
+
+    @staticmethod
+    def replay(path=config.JOURNAL_FILE):
+        """
+        Read journal records, a torn last line is skipped
+        :return: generator of dict records
+        """
+        if not os.path.isfile(path):
+            return
+        with open(path, 'r') as stream:
+            for line in stream:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.error("Journal {path}: skip bad record {line}".format(path=path, line=line.strip()))
+
+    @staticmethod
+    def worker_path(path, worker_id):
+        """
+        :return: journal file of a distributed worker
+        """
+        return "{path}.{worker_id}".format(path=path, worker_id=worker_id)
+
+    @staticmethod
+    def worker_paths(path=config.JOURNAL_FILE):
+        """
+        :return: journal files of the distributed workers of a run
+        """
+        dirname, basename = os.path.split(path)
+        if not os.path.isdir(dirname or "."):
+            return []
+        return sorted(os.path.join(dirname, name) for name in os.listdir(dirname or ".")
+                      if name.startswith(basename + ".") and name[len(basename) + 1:].isdigit())
+
+    @staticmethod
+    def rotate(path=config.JOURNAL_FILE):
+        """
+        Move the journal of a completed run aside (to <path>.done, replacing the
+        one of the run before), so the next run starts with an empty journal
+        :return: new path of the journal
+        """
+        done_path = path + ".done"
+        if os.path.isfile(done_path):
+            os.remove(done_path)
+        os.rename(path, done_path)
+        return done_path
+
+    @staticmethod
+    def remove(path=config.JOURNAL_FILE):
+        """
+        Remove the journal and the journals of the distributed workers
+        :return: list of removed files
+        """
+        paths = RunJournal.worker_paths(path)
+        if os.path.isfile(path):
+            paths.append(path)
+        for journal in paths:
+            os.remove(journal)
+        return paths
+
+    def _append(self, record):
+        record['t'] = time.time()
+        line = json.dumps(record, separators=(',', ':')) + "\n"
+        with self._lock:
+            self._buffer.append(line)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def record_create(self, vm_name, namespace, node=None, state=None):
+        self._append({'op': OP_CREATE, 'vm': vm_name, 'ns': namespace, 'node': node, 'state': state})
+
+    def record_action(self, action, vm_name, namespace, ok, stage=None):
+        """
+        :param stage: STAGE_LIFECYCLE for the actions of the lifecycle stage, its progress on resume
+        """
+        record = {'op': OP_ACTION, 'action': action, 'vm': vm_name, 'ns': namespace, 'ok': ok}
+        if stage is not None:
+            record['stage'] = stage
+        self._append(record)
+
+    def record_delete(self, vm_name, namespace):
+        self._append({'op': OP_DELETE, 'vm': vm_name, 'ns': namespace})
+
+    def record_done(self):
+        self._append({'op': OP_DONE})
+
+    def flush(self):
+        """
+        Write the buffered records and fsync. The batch is taken under the
+        write lock, so batches reach the file in the order of their records.
+        """
+        with self._write_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+            if not lines:
+                return
+            self._stream.write("".join(lines))
+            self._stream.flush()
+            os.fsync(self._stream.fileno())
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as err:
+                logger.error("Journal flush failed, err: {err}".format(err=err))
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+        self._stream.close()
+
+    def reset(self):
+        """
+        Drop all records, for a new run
+        """
+        with self._write_lock:
+            with self._lock:
+                self._buffer = []
+            self._stream.seek(0)
+            self._stream.truncate()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import csv
+import math
+import json
+import time
+import datetime
+import threading
+from collections import defaultdict
+import src.utils.config as config
+import src.utils.metrics as metrics
+import src.utils.logger as logger
+from src.utils.logger import vm_event
+
+logger = logger.MyLogger.__call__().get_logger()
+
+SCHEDULED_PHASES = ["Scheduled", "Running"]
+RECORD_FIELDS = ["vm_name", "namespace", "node", "batch", "phase", "created", "scheduled", "running",
+                 "time_to_scheduled", "time_to_running"]
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest rank percentile
+    :param sorted_values: sorted list of numbers
+    :param pct: percentile (0-100)
+    :return: value or None for empty list
+    """
+    if not sorted_values:
+        return None
+    rank = int(math.ceil(pct / 100.0 * len(sorted_values))) - 1
+    return sorted_values[max(0, min(rank, len(sorted_values) - 1))]
+
+
+def summarize(values):
+    """
+    :param values: list of numbers
+    :return: dict with count, p50/p90/p99 and max
+    """
+    values = sorted(values)
+    summary = {'count': len(values), 'max': values[-1] if values else None}
+    for pct in config.PERCENTILES:
+        summary['p{pct}'.format(pct=pct)] = percentile(values, pct)
+    return summary
+
+
+class VmLatency(object):
+    __slots__ = ["vm_name", "namespace", "node", "batch", "phase", "created", "scheduled", "running"]
+
+    def __init__(self, vm_name, namespace, node, batch, created, phase=None):
+        self.vm_name = vm_name
+        self.namespace = namespace
+        self.node = node
+        self.batch = batch
+        self.phase = phase
+        self.created = created
+        self.scheduled = None
+        self.running = None
+
+    @property
+    def time_to_scheduled(self):
+        return self.scheduled - self.created if self.scheduled else None
+
+    @property
+    def time_to_running(self):
+        return self.running - self.created if self.running else None
+
+    def to_dict(self):
+        return dict((field, getattr(self, field)) for field in RECORD_FIELDS)
+
+
+class LatencyTracker(object):
+    """
+    Record VM create time and the time its VMI reaches Scheduled and Running.
+    Phase changes come from the VMI cache watch (see VmiCache.add_listener).
+    """
+
+    def __init__(self, on_running=None):
+        """
+        :param on_running: callback(VmLatency) when a VM reaches Running
+        """
+        self.records = {}  # 'namespace/name' -> VmLatency
+        self.batches = []  # (namespace, size, accept seconds, failed) of batched creates
+        self.on_running = on_running
+        self.phase = None  # set by the phased scenario, new records are tagged with it
+        self._lock = threading.Lock()
+
+    def record_create(self, vm_name, namespace, node=None, batch=0):
+        """
+        Save VM create timestamp, call it just before the create request
+        """
+        key = "{ns}/{name}".format(ns=namespace, name=vm_name)
+        with self._lock:
+            self.records[key] = VmLatency(vm_name, namespace, node, batch, time.time(), phase=self.phase)
+
+    def record_batch(self, namespace, size, seconds, failed=0):
+        """
+        Save the time till the apiserver accepted all creates of a batch
+        """
+        with self._lock:
+            self.batches.append((namespace, size, seconds, failed))
+
+    def on_vmi_event(self, event_type, vmi):
+        """
+        VMI cache listener, stamp phase transitions
+        """
+        now = time.time()
+        key = "{ns}/{name}".format(ns=vmi['metadata']['namespace'], name=vmi['metadata']['name'])
+        record = self.records.get(key)
+        if record is None or event_type == 'DELETED':
+            return
+        status = vmi.get('status') or {}
+        phase = status.get('phase')
+        with self._lock:
+            if status.get('nodeName'):
+                record.node = status['nodeName']
+            if record.scheduled is None and phase in SCHEDULED_PHASES:
+                record.scheduled = now
+            if record.running is None and phase == "Running":
+                record.running = now
+            else:
+                return
+        metrics.TIME_TO_RUNNING.observe(record.time_to_running)
+        vm_event('running', vm=record.vm_name, ns=record.namespace, node=record.node,
+                 time_to_scheduled=record.time_to_scheduled, time_to_running=record.time_to_running)
+        if self.on_running is not None:
+            self.on_running(record)
+
+    def add_record(self, record):
+        """
+        Add finished record, like one from a distributed worker
+        :param record: dict from VmLatency.to_dict()
+        """
+        vm = VmLatency(record['vm_name'], record['namespace'], record['node'], record['batch'], record['created'],
+                       phase=record.get('phase'))
+        vm.scheduled = record['scheduled']
+        vm.running = record['running']
+        with self._lock:
+            self.records["{ns}/{name}".format(ns=vm.namespace, name=vm.vm_name)] = vm
+
+    def snapshot(self):
+        """
+        :return: list of VmLatency in create order
+        """
+        with self._lock:
+            return sorted(self.records.values(), key=lambda record: record.created)
+
+    def _group_by(self, field):
+        groups = defaultdict(list)
+        for record in self.records.values():
+            if record.running is not None:
+                groups[getattr(record, field)].append(record.time_to_running)
+        return dict((str(key), summarize(values)) for key, values in groups.items())
+
+    def summary(self):
+        """
+        :return: dict with time to Running percentiles, total and per node/namespace/batch
+        """
+        with self._lock:
+            records = list(self.records.values())
+            return {
+                'vms': len(records),
+                'running': len([r for r in records if r.running is not None]),
+                'time_to_scheduled': summarize([r.time_to_scheduled for r in records if r.scheduled is not None]),
+                'time_to_running': summarize([r.time_to_running for r in records if r.running is not None]),
+                'per_node': self._group_by('node'),
+                'per_namespace': self._group_by('namespace'),
+                'per_batch': self._group_by('batch'),
+                'per_phase': self._group_by('phase'),
+                'batch_accept': summarize([batch[2] for batch in self.batches]),
+                'batch_failed': sum(batch[3] for batch in self.batches)
+            }
+
+    def report(self, dirname=config.RESULTS_DIR):
+        """
+        Write per VM records to CSV and the summary to JSON
+        :param dirname: output directory
+        :return: (csv path, json path)
+        """
+        if not os.path.isdir(dirname):
+            os.mkdir(dirname)
+        prefix = os.path.join(dirname, "latency_" + datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+        with self._lock:
+            rows = [record.to_dict() for record in self.records.values()]
+        with open(prefix + ".csv", 'w') as stream:
+            writer = csv.DictWriter(stream, fieldnames=RECORD_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        summary = self.summary()
+        with open(prefix + ".json", 'w') as stream:
+            json.dump(summary, stream, indent=2, sort_keys=True)
+        logger.info("Time to Running: {summary}".format(summary=summary['time_to_running']))
+        logger.info("Latency report written to {prefix}.csv/.json".format(prefix=prefix))
+        return prefix + ".csv", prefix + ".json"
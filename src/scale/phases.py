@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import datetime
+import src.utils.config as config
+import src.utils.metrics as metrics
+import src.utils.logger as logger
+from src.scale.soak import SoakRunner
+from src.scale.creation_engine import TokenBucket
+from src.scale.ramp import BACKLOG_PHASES
+from src.scale.registry import ACTION_TRANSITIONS
+
+logger = logger.MyLogger.__call__().get_logger()
+
+# phase keys -> constraints they set for the phase
+PHASE_CONSTRAINTS = {
+    config.PHASE_RAMP: {'rate': 'create_rate', 'target': 'ocp_scheduling_total_vms'},
+    config.PHASE_CHURN: {'rate': 'soak_rate', 'target': 'soak_population', 'duration': 'soak_duration',
+                         'mix': 'soak_mix', 'window': 'soak_window'},
+}
+
+
+def validate_phases(phases):
+    """
+    Check the phase list of the yaml, exit on error
+    :param phases: list of phase dicts
+    """
+    if not phases:
+        logger.error("Scenario {phased} needs a 'phases' list in the yaml".format(phased=config.PHASED))
+        exit(1)
+    for index, phase in enumerate(phases):
+        if phase.get('type') not in config.PHASE_TYPES:
+            logger.error("Phase {index}: type {type} is not in {types}".format(
+                index=index, type=phase.get('type'), types=config.PHASE_TYPES))
+            exit(1)
+        if phase['type'] == config.PHASE_BURST and phase.get('action') not in ACTION_TRANSITIONS:
+            logger.error("Phase {index}: burst action {action} is not in {actions}".format(
+                index=index, action=phase.get('action'), actions=list(ACTION_TRANSITIONS)))
+            exit(1)
+
+
+class PhaseRunner(object):
+    """
+    Run a list of phases back to back on one ScaleExecutor, so the client,
+    VMI cache, registry and node list are shared and set up once.
+    Every phase sets its own rate, concurrency and target on top of the
+    constraints; latency records, soak windows and the endurance_phase
+    metric are tagged with the phase name.
+
+    Phase keys: name, type (ramp/hold/burst/churn/drain/teardown/prepull), target,
+    rate (creates, actions or soak operations per second), concurrency, duration, action (burst), mix and window (churn),
+    timeout (drain) and constraints (any other constraint for the phase).
+    """
+
+    def __init__(self, executor, phases):
+        """
+        :param executor: ScaleExecutor
+        :param phases: list of phase dicts
+        """
+        validate_phases(phases)
+        self.executor = executor
+        self.phases = phases
+        self.results = []
+
+    def _phase_constraints(self, phase):
+        constraints = dict(self.executor.constraints)
+        for key, constraint in PHASE_CONSTRAINTS.get(phase['type'], {}).items():
+            if phase.get(key) is not None:
+                constraints[constraint] = phase[key]
+        if phase.get('concurrency') is not None:
+            constraints['create_workers'] = phase['concurrency']
+            constraints['max_in_flight'] = phase['concurrency']
+        constraints.update(phase.get('constraints') or {})
+        return constraints
+
+    def run(self):
+        """
+        :return: list of phase results
+        """
+        executor = self.executor
+        base_constraints = executor.constraints
+        for index, phase in enumerate(self.phases):
+            name = phase.get('name') or "{index}-{type}".format(index=index, type=phase['type'])
+            logger.info("Phase {name} ({type}) started: {phase}".format(name=name, type=phase['type'], phase=phase))
+            executor.constraints = self._phase_constraints(phase)
+            executor.latency.phase = name
+            metrics.PHASE.set(1, name)
+            start = time.time()
+            try:
+                result = getattr(self, "_" + phase['type'])(phase, name)
+            finally:
+                executor.constraints = base_constraints
+                metrics.PHASE.set(0, name)
+            result = {
+                'name': name,
+                'type': phase['type'],
+                'start': start,
+                'elapsed': time.time() - start,
+                'vms': len(executor.registry),
+                'result': result
+            }
+            self.results.append(result)
+            logger.info("Phase {name} done in {elapsed:.1f}s: {result}".format(
+                name=name, elapsed=result['elapsed'], result=result['result']))
+        executor.latency.phase = None
+        self.report()
+        return self.results
+
+    def report(self, dirname=config.RESULTS_DIR):
+        if not os.path.isdir(dirname):
+            os.mkdir(dirname)
+        path = os.path.join(dirname, "phases_" + datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".json")
+        with open(path, 'w') as stream:
+            json.dump(self.results, stream, indent=2, sort_keys=True, default=str)
+        logger.info("Phase report written to {path}".format(path=path))
+        return path
+
+    def _ramp(self, phase, name):
+        target = int(self.executor.constraints['ocp_scheduling_total_vms'])
+        before = len(self.executor.registry)
+        self.executor.scale_out_with_openshift_scheduling(number_of_vms=target)
+        return {'created': len(self.executor.registry) - before}
+
+    def _hold(self, phase, name):
+        duration = float(phase.get('duration', 0))
+        end = time.time() + duration
+        while time.time() < end:
+            time.sleep(min(config.PHASE_STATUS_INTERVAL, max(end - time.time(), 0)))
+            self.executor.client.get_vmis_status_summary()
+        return self.executor.client.vmi_cache.phase_summary()
+
+    def _burst(self, phase, name):
+        executor = self.executor
+        action = phase['action']
+        vm_list = executor.registry.select_for_action(action, phase.get('target'))
+        vms = [vm.key for vm in vm_list]
+        # phase rate: max actions per second, no limit without it
+        rate_limiter = TokenBucket(phase.get('rate'))
+        start = time.time()
+        mode = executor.constraints['lifecycle_mode']
+        if mode == config.LIFECYCLE_VIRTCTL:
+            results = []
+            for vm_name, ns_name in vms:
+                rate_limiter.acquire()
+                results.append(executor._vm_action(action, vm_name, ns_name))
+        else:
+            results = executor.client.vm_action_bulk(
+                action, vms, mode=mode, workers=int(executor.constraints['create_workers']),
+                rate_limiter=rate_limiter)
+        accepted = time.time() - start
+        for (vm_name, ns_name), result in zip(vms, results):
+            executor.journal.record_action(action, vm_name, ns_name, result)
+            if result:
+                executor.registry.apply_action(action, vm_name, ns_name)
+        return {'action': action, 'vms': len(vms), 'ok': results.count(True), 'accepted_seconds': accepted}
+
+    def _churn(self, phase, name):
+        if phase.get('target') is None:
+            # keep the population the earlier phases built
+            self.executor.constraints['soak_population'] = len(self.executor.registry)
+        windows = SoakRunner(self.executor, phase=name).run()
+        return {'windows': len(windows), 'ops': sum(window['ops'] for window in windows)}
+
+    def _drain(self, phase, name):
+        vmi_cache = self.executor.client.vmi_cache
+        timeout = float(phase.get('timeout', config.DRAIN_TIMEOUT))
+        start = time.time()
+        while sum(vmi_cache.count(vmi_phase) for vmi_phase in BACKLOG_PHASES) > 0:
+            if time.time() - start > timeout:
+                logger.error("Phase {name}: VMIs still not Running after {timeout}s".format(name=name, timeout=timeout))
+                return {'drained': False, 'vmis': vmi_cache.phase_summary()}
+            time.sleep(1)
+        return {'drained': True, 'seconds': time.time() - start, 'vmis': vmi_cache.phase_summary()}
+
+    def _prepull(self, phase, name):
+        return self.executor.prepull()
+
+    def _teardown(self, phase, name):
+        teardown = self.executor.cleanup()
+        for vm in list(self.executor.registry.vms.values()):
+            self.executor.registry.remove(vm.name, vm.namespace)
+        self.executor.journal.reset()
+        return teardown
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import heapq
+from collections import OrderedDict
+import src.utils.logger as logger
+
+logger = logger.MyLogger.__call__().get_logger()
+
+RESOURCES = ['cpu', 'memory', 'kvm']
+
+
+class PlacementPlanner(object):
+    """
+    Plan VM to node placement ahead of time.
+    Every VM of a run comes from one template, so a node holds
+    min((allocatable - requested) / request) VMs over cpu, memory and kvm
+    devices, where requested is what the pods and VMIs on the node already take.
+    VMs are bin-packed: each goes to the fullest node it still fits on (the
+    fewest free slots left), so whole nodes stay free and busy nodes are not
+    overcommitted.
+    """
+
+    def __init__(self, nodes, request, used=None):
+        """
+        :param nodes: OrderedDict node name -> allocatable {'cpu', 'memory', 'kvm'} (Client.get_node_resources)
+        :param request: resources of one VM {'cpu', 'memory', 'kvm'} (VmTemplate.requests)
+        :param used: dict node name -> requested {'cpu', 'memory', 'kvm'} (Client.get_node_requests)
+        """
+        self.nodes = nodes
+        self.request = request
+        used = used or {}
+        self.slots = OrderedDict((node_name, self._fit(allocatable, used.get(node_name) or {}))
+                                 for node_name, allocatable in nodes.items())
+
+    def _fit(self, allocatable, used):
+        fits = [int((allocatable.get(resource, 0) - used.get(resource, 0)) // self.request[resource])
+                for resource in RESOURCES if self.request.get(resource)]
+        return max(min(fits), 0) if fits else 0
+
+    @property
+    def capacity(self):
+        return sum(self.slots.values())
+
+    def plan(self, number_of_vms, max_per_node=None):
+        """
+        :param number_of_vms: VMs to place
+        :param max_per_node: cap VMs per node
+        :return: list of node names, one per VM index (shorter than number_of_vms if the cluster is full)
+        """
+        heap = []
+        for order, (node_name, slots) in enumerate(self.slots.items()):
+            if max_per_node is not None:
+                slots = min(slots, max_per_node)
+            if slots > 0:
+                heap.append((slots, order, node_name))
+        heapq.heapify(heap)
+        placement = []
+        while heap and len(placement) < number_of_vms:
+            # fullest node first
+            free, order, node_name = heapq.heappop(heap)
+            placement.append(node_name)
+            if free > 1:
+                heapq.heappush(heap, (free - 1, order, node_name))
+        if len(placement) < number_of_vms:
+            logger.error("Placement: only {placed} of {vms} VMs fit on {nodes} nodes (VM request {request})".format(
+                placed=len(placement), vms=number_of_vms, nodes=len(self.slots), request=self.request
+            ))
+        logger.info("Placement: {slots} VM slots per node".format(slots=dict(self.slots)))
+        return placement
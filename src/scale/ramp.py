@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+import src.utils.config as config
+import src.utils.logger as logger
+
+logger = logger.MyLogger.__call__().get_logger()
+
+BACKLOG_PHASES = ["Pending", "Scheduling", "Scheduled"]
+
+
+class AdaptiveRamp(object):
+    """
+    AIMD controller for the VM create rate.
+    Every interval add RAMP_INCREASE creates/s while the Pending/Scheduling
+    backlog and node CPU are under the thresholds, else multiply the rate
+    by RAMP_DECREASE.
+    """
+
+    def __init__(self, rate_limiter, vmi_cache, node_sampler=None, nodes=None,
+                 max_backlog=config.RAMP_MAX_BACKLOG, cpu_idle_threshold=config.CPU_IDLE_THRESHOLD,
+                 interval=config.RAMP_INTERVAL, min_rate=config.RAMP_MIN_RATE, max_rate=config.RAMP_MAX_RATE):
+        """
+        :param rate_limiter: TokenBucket to control
+        :param vmi_cache: VmiCache for the backlog
+        :param node_sampler: NodeCpuSampler, None to ignore CPU
+        :param nodes: nodes to check CPU on, None for all sampled nodes
+        """
+        self.rate_limiter = rate_limiter
+        self.vmi_cache = vmi_cache
+        self.node_sampler = node_sampler
+        self.nodes = nodes
+        self.max_backlog = max_backlog
+        self.cpu_idle_threshold = cpu_idle_threshold
+        self.interval = interval
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = max(float(rate_limiter.rate or min_rate), min_rate)
+        self.history = []  # (time, rate, backlog, min cpu idle, healthy)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def backlog(self):
+        return sum(self.vmi_cache.count(phase) for phase in BACKLOG_PHASES)
+
+    def min_cpu_idle(self):
+        if self.node_sampler is None:
+            return None
+        nodes = self.nodes if self.nodes is not None else self.node_sampler.node_list
+        samples = [self.node_sampler.latest_idle(node_name) for node_name in nodes]
+        samples = [idle for idle in samples if idle is not None]
+        return min(samples) if samples else None
+
+    def step(self):
+        """
+        One control step
+        :return: new rate
+        """
+        backlog = self.backlog()
+        cpu_idle = self.min_cpu_idle()
+        healthy = backlog < self.max_backlog and (cpu_idle is None or cpu_idle >= self.cpu_idle_threshold)
+        if healthy:
+            rate = min(self.rate + config.RAMP_INCREASE, self.max_rate)
+        else:
+            rate = max(self.rate * config.RAMP_DECREASE, self.min_rate)
+            logger.info("Ramp back off: backlog {backlog}, min CPU idle {idle}, rate {rate:.2f} VMs/s".format(
+                backlog=backlog, idle=cpu_idle, rate=rate))
+        self.history.append((time.time(), self.rate, backlog, cpu_idle, healthy))
+        self.rate = rate
+        self.rate_limiter.set_rate(rate)
+        return rate
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.step()
+            except Exception as err:
+                logger.error("Ramp step failed, err: {err}".format(err=err))
+
+    def start(self):
+        self.rate_limiter.set_rate(self.rate)
+        self._thread = threading.Thread(target=self._run, name="ramp")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        :return: max create rate reached without back off
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        healthy_rates = [entry[1] for entry in self.history if entry[4]]
+        max_rate = max(healthy_rates) if healthy_rates else self.rate
+        logger.info("Ramp: max safe create rate {rate:.2f} VMs/s".format(rate=max_rate))
+        return max_rate
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import random
+import threading
+from collections import OrderedDict, defaultdict
+
+STATE_CREATED = "created"
+STATE_RUNNING = "running"
+STATE_STOPPED = "stopped"
+
+# lifecycle action: (states the action applies to, state after the action)
+ACTION_TRANSITIONS = {
+    "start": ([STATE_STOPPED, STATE_CREATED], STATE_RUNNING),
+    "stop": ([STATE_RUNNING], STATE_STOPPED),
+    "restart": ([STATE_RUNNING], STATE_RUNNING),
+}
+
+
+class VmRecord(object):
+    __slots__ = ["name", "namespace", "node", "state", "created", "updated"]
+
+    def __init__(self, name, namespace, node, state, created):
+        self.name = name
+        self.namespace = namespace
+        self.node = node
+        self.state = state
+        self.created = created
+        self.updated = created
+
+    @property
+    def key(self):
+        return self.name, self.namespace
+
+    def __repr__(self):
+        return "{ns}/{name}({state})".format(ns=self.namespace, name=self.name, state=self.state)
+
+
+class VmRegistry(object):
+    """
+    VMs the tool created, indexed by (name, namespace), state, node and namespace.
+    Indexes keep creation order so "first N" selections are stable.
+    """
+
+    def __init__(self):
+        self.vms = OrderedDict()  # (name, namespace) -> VmRecord
+        self.by_state = defaultdict(OrderedDict)
+        self.by_node = defaultdict(OrderedDict)
+        self.by_namespace = defaultdict(OrderedDict)
+        self.action_counts = defaultdict(int)  # successful actions per action
+        self._keys = []  # for O(1) random pick
+        self._positions = {}  # key -> index in _keys
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.vms)
+
+    def __contains__(self, key):
+        return key in self.vms
+
+    def get(self, name, namespace):
+        return self.vms.get((name, namespace))
+
+    def add(self, name, namespace, node=None, state=STATE_CREATED, created=None):
+        """
+        Register VM, no-op if it is already registered
+        :return: VmRecord
+        """
+        key = (name, namespace)
+        with self._lock:
+            record = self.vms.get(key)
+            if record is None:
+                record = VmRecord(name, namespace, node, state, created or time.time())
+                self.vms[key] = record
+                self._positions[key] = len(self._keys)
+                self._keys.append(key)
+                self.by_state[state][key] = record
+                self.by_namespace[namespace][key] = record
+                if node:
+                    self.by_node[node][key] = record
+            return record
+
+    def set_state(self, name, namespace, state, timestamp=None):
+        """
+        Move VM to state
+        """
+        key = (name, namespace)
+        with self._lock:
+            record = self.vms[key]
+            if record.state != state:
+                del self.by_state[record.state][key]
+                self.by_state[state][key] = record
+                record.state = state
+            record.updated = timestamp or time.time()
+
+    def set_node(self, name, namespace, node):
+        key = (name, namespace)
+        with self._lock:
+            record = self.vms[key]
+            if record.node == node:
+                return
+            if record.node:
+                del self.by_node[record.node][key]
+            if node:
+                self.by_node[node][key] = record
+            record.node = node
+
+    def remove(self, name, namespace):
+        key = (name, namespace)
+        with self._lock:
+            record = self.vms.pop(key, None)
+            if record is None:
+                return
+            last = self._keys.pop()
+            position = self._positions.pop(key)
+            if last != key:
+                self._keys[position] = last
+                self._positions[last] = position
+            del self.by_state[record.state][key]
+            del self.by_namespace[record.namespace][key]
+            if record.node:
+                del self.by_node[record.node][key]
+
+    def apply_action(self, action, name, namespace, timestamp=None):
+        """
+        Record successful lifecycle action
+        """
+        self.set_state(name, namespace, ACTION_TRANSITIONS[action][1], timestamp)
+        with self._lock:
+            self.action_counts[action] += 1
+
+    def count(self, state=None, node=None, namespace=None):
+        """
+        Amount of VMs matching the filters, O(1) with a single filter
+        """
+        if len([value for value in (state, node, namespace) if value is not None]) <= 1:
+            return len(self._candidates(state, node, namespace))
+        return len(self.select(states=[state] if state is not None else None, node=node, namespace=namespace))
+
+    def _candidates(self, state=None, node=None, namespace=None):
+        """
+        Smallest index matching one of the filters
+        """
+        indexes = [self.vms]
+        if state is not None:
+            indexes.append(self.by_state.get(state, {}))
+        if node is not None:
+            indexes.append(self.by_node.get(node, {}))
+        if namespace is not None:
+            indexes.append(self.by_namespace.get(namespace, {}))
+        return min(indexes, key=len)
+
+    def select(self, num_of_vms=None, states=None, node=None, namespace=None):
+        """
+        First VMs matching the filters, for example first 10 stopped VMs on node X
+        :param num_of_vms: max VMs to return, None for all
+        :param states: list of states, None for any
+        :param node: node name
+        :param namespace: namespace name
+        :return: list of VmRecord
+        """
+        selected = []
+        with self._lock:
+            for state in (states or [None]):
+                for record in self._candidates(state, node, namespace).values():
+                    if num_of_vms is not None and len(selected) >= num_of_vms:
+                        return selected
+                    if (state is None or record.state == state) and \
+                            (node is None or record.node == node) and \
+                            (namespace is None or record.namespace == namespace):
+                        selected.append(record)
+        return selected if num_of_vms is None else selected[:num_of_vms]
+
+    def select_for_action(self, action, num_of_vms=None, node=None, namespace=None):
+        """
+        First VMs the lifecycle action applies to
+        :return: list of VmRecord
+        """
+        return self.select(num_of_vms, states=ACTION_TRANSITIONS[action][0], node=node, namespace=namespace)
+
+    def sample(self, states=None, exclude=None, tries=100):
+        """
+        Random VM in one of states
+        :param states: list of states, None for any
+        :param exclude: set of keys to skip (VMs busy with another operation)
+        :param tries: random picks before giving up
+        :return: VmRecord or None
+        """
+        with self._lock:
+            if not self._keys:
+                return None
+            for _ in range(tries):
+                key = self._keys[random.randrange(len(self._keys))]
+                record = self.vms[key]
+                if (states is None or record.state in states) and (exclude is None or key not in exclude):
+                    return record
+        return None
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import gzip
+import errno
+import json
+import math
+import time
+import datetime
+import src.utils.config as config
+import src.utils.logger as logger
+from src.scale.latency import summarize
+
+logger = logger.MyLogger.__call__().get_logger()
+
+FORMAT_VERSION = 1
+DICT_COLUMNS = ["namespace", "node", "phase"]  # few distinct values, stored as values + codes
+TIME_DIGITS = 4
+HIGHER_IS_BETTER = ["create_rate", "running_rate"]
+
+
+def encode_columns(records, start):
+    """
+    Per VM latency records as columns. Timestamps are seconds from the run start
+    and the namespace/node/phase columns are dictionary encoded.
+    :param records: list of VmLatency
+    :param start: run start timestamp
+    :return: dict column name -> list or {'values', 'codes'}
+    """
+    def _time(value):
+        return round(value, TIME_DIGITS) if value is not None else None
+
+    columns = {
+        'vm_name': [record.vm_name for record in records],
+        'batch': [record.batch for record in records],
+        'created': [_time(record.created - start) for record in records],
+        'time_to_scheduled': [_time(record.time_to_scheduled) for record in records],
+        'time_to_running': [_time(record.time_to_running) for record in records]
+    }
+    for column in DICT_COLUMNS:
+        values, codes, positions = [], [], {}
+        for record in records:
+            value = getattr(record, column)
+            if value not in positions:
+                positions[value] = len(values)
+                values.append(value)
+            codes.append(positions[value])
+        columns[column] = {'values': values, 'codes': codes}
+    return columns
+
+
+def decode_column(column):
+    if isinstance(column, dict):
+        return [column['values'][code] for code in column['codes']]
+    return column
+
+
+def throughput(columns):
+    """
+    :param columns: run columns
+    :return: dict with VMs created and Running per second, from the first create
+    """
+    created = [value for value in columns['created'] if value is not None]
+    running = [value + ttr for value, ttr in zip(columns['created'], columns['time_to_running'])
+               if value is not None and ttr is not None]
+    first = min(created) if created else 0.0
+    create_seconds = max(created) - first if created else 0.0
+    running_seconds = max(running) - first if running else 0.0
+    return {
+        'create_rate': len(created) / create_seconds if create_seconds > 0 else None,
+        'running_rate': len(running) / running_seconds if running_seconds > 0 else None
+    }
+
+
+def mann_whitney(first, second):
+    """
+    Two sided Mann-Whitney U test, normal approximation with tie correction
+    :param first: list of numbers
+    :param second: list of numbers
+    :return: p-value, None without samples
+    """
+    n1, n2 = len(first), len(second)
+    if not n1 or not n2:
+        return None
+    values = sorted([(value, 0) for value in first] + [(value, 1) for value in second])
+    n = n1 + n2
+    rank_sum = 0.0
+    ties = 0.0
+    index = 0
+    while index < n:
+        end = index
+        while end + 1 < n and values[end + 1][0] == values[index][0]:
+            end += 1
+        count = end - index + 1
+        rank = (index + end) / 2.0 + 1
+        rank_sum += rank * sum(1 for _, group in values[index:end + 1] if group == 0)
+        ties += count ** 3 - count
+        index = end + 1
+    u = rank_sum - n1 * (n1 + 1) / 2.0
+    mean = n1 * n2 / 2.0
+    sigma = math.sqrt(n1 * n2 / 12.0 * ((n + 1) - ties / (n * (n - 1)))) if n > 1 else 0.0
+    if sigma == 0:
+        return 1.0
+    z = (abs(u - mean) - 0.5) / sigma
+    return math.erfc(max(z, 0.0) / math.sqrt(2))
+
+
+class RunStore(object):
+    """
+    Results store: one gzip JSON file per run with the config, the cluster
+    fingerprint, throughput, latency and per phase aggregates and the per VM
+    timings as columns, plus an index of the run headers (one JSON line per
+    run) so hundreds of runs are listed without opening their files.
+    """
+
+    def __init__(self, dirname=config.RUNS_DIR):
+        self.dirname = dirname
+        self.index_path = os.path.join(dirname, config.RUNS_INDEX)
+
+    def save(self, constraints, fingerprint, latency, started, phases=None):
+        """
+        Simulated backend runs are not saved, they would become the compare baseline
+        :param constraints: scale test constraints of the run
+        :param fingerprint: Client.cluster_fingerprint()
+        :param latency: LatencyTracker
+        :param started: run start timestamp
+        :param phases: PhaseRunner results of a phased run
+        :return: run file path, None when not saved
+        """
+        if constraints.get('backend') == config.BACKEND_SIMULATED:
+            logger.info("Run on the simulated backend, not saved to {dirname}".format(dirname=self.dirname))
+            return None
+        if not os.path.isdir(self.dirname):
+            os.makedirs(self.dirname)
+        run_id, path, stream = self._new_run(datetime.datetime.fromtimestamp(started).strftime("%Y-%m-%d_%H-%M-%S"))
+        records = latency.snapshot()
+        columns = encode_columns(records, started)
+        summary = latency.summary()
+        header = {
+            'format': FORMAT_VERSION,
+            'id': run_id,
+            'scenario': constraints['current_test'],
+            'started': started,
+            'ended': time.time(),
+            'config': constraints,
+            'cluster': fingerprint,
+            'throughput': throughput(columns),
+            'latency': dict((key, summary[key]) for key in ['vms', 'running', 'time_to_scheduled', 'time_to_running',
+                                                            'batch_accept']),
+            'phases': self._phases(summary, phases)
+        }
+        # round trip through json once, so the index and the file hold the same header
+        header = json.loads(json.dumps(header, default=str))
+        with stream:
+            with gzip.GzipFile(filename=os.path.basename(path), mode='wb', fileobj=stream) as gzip_stream:
+                gzip_stream.write(
+                    json.dumps({'run': header, 'columns': columns}, separators=(',', ':')).encode('utf-8'))
+        header['path'] = path
+        with open(self.index_path, 'a') as stream:
+            stream.write(json.dumps(header, sort_keys=True) + "\n")
+        logger.info("Run {run_id} saved to {path}".format(run_id=run_id, path=path))
+        return path
+
+    def _new_run(self, run_id):
+        """
+        Create the run file, runs started in the same second get a _<n> suffix
+        :param run_id: run id from the start time
+        :return: (run id, run file path, binary stream of the new file)
+        """
+        base_id, counter = run_id, 1
+        while True:
+            path = os.path.join(self.dirname, "run_{run_id}.json.gz".format(run_id=run_id))
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+                counter += 1
+                run_id = "{base_id}_{counter}".format(base_id=base_id, counter=counter)
+                continue
+            return run_id, path, os.fdopen(fd, 'wb')
+
+    @staticmethod
+    def _phases(summary, phases):
+        per_phase = dict((name, {'time_to_running': value}) for name, value in summary['per_phase'].items()
+                         if name != 'None')
+        for phase in phases or []:
+            per_phase.setdefault(phase['name'], {}).update(
+                type=phase['type'], elapsed=phase['elapsed'], vms=phase['vms'])
+        return per_phase
+
+    def index(self):
+        """
+        :return: list of run headers, oldest first
+        """
+        if not os.path.isfile(self.index_path):
+            return []
+        with open(self.index_path) as stream:
+            return [json.loads(line) for line in stream if line.strip()]
+
+    def load(self, ref):
+        """
+        :param ref: run id or run file
+        :return: (run header, columns)
+        """
+        path = ref
+        if not os.path.isfile(path):
+            runs = [run for run in self.index() if run['id'] == ref]
+            if not runs:
+                logger.error("Run {ref} is not a file or a run id in {index}".format(ref=ref, index=self.index_path))
+                exit(1)
+            path = runs[-1]['path']
+        with gzip.open(path, 'rb') as stream:
+            run = json.loads(stream.read().decode('utf-8'))
+        return run['run'], dict((name, decode_column(column)) for name, column in run['columns'].items())
+
+
+def _samples(columns, field, phase=None):
+    phases = columns['phase'] if phase is not None else None
+    return [value for index, value in enumerate(columns[field])
+            if value is not None and (phase is None or phases[index] == phase)]
+
+
+def compare(baseline, run, threshold=config.COMPARE_THRESHOLD, alpha=config.COMPARE_ALPHA):
+    """
+    Compare run with the baseline run.
+    Percentile rows get the p-value of a Mann-Whitney U test on the per VM
+    samples; a row is a regression when it is worse by more than threshold
+    percent and (for latencies) the change is significant.
+    :param baseline: (header, columns) of the baseline run
+    :param run: (header, columns) of the run
+    :param threshold: percent
+    :param alpha: max p-value of a significant change
+    :return: list of row dicts
+    """
+    rows = []
+
+    def _row(metric, base, value, p_value=None):
+        delta = (value - base) * 100.0 / base if base and value is not None else None
+        worse = delta is not None and (-delta if metric in HIGHER_IS_BETTER else delta) > threshold
+        rows.append({
+            'metric': metric, 'baseline': base, 'value': value, 'delta_pct': delta, 'p_value': p_value,
+            'regression': worse and (p_value is None or p_value < alpha)
+        })
+
+    base_throughput, run_throughput = throughput(baseline[1]), throughput(run[1])
+    for metric in HIGHER_IS_BETTER:
+        _row(metric, base_throughput[metric], run_throughput[metric])
+    phases = [None] + sorted(set(baseline[1]['phase']) & set(run[1]['phase']) - {None})
+    for phase in phases:
+        for field in ['time_to_scheduled', 'time_to_running']:
+            base_samples, run_samples = _samples(baseline[1], field, phase), _samples(run[1], field, phase)
+            if not base_samples or not run_samples:
+                continue
+            p_value = mann_whitney(base_samples, run_samples)
+            base_summary, run_summary = summarize(base_samples), summarize(run_samples)
+            for pct in config.PERCENTILES:
+                key = "p{pct}".format(pct=pct)
+                metric = "{field} {key}".format(field=field, key=key)
+                if phase is not None:
+                    metric = "phase {phase} {metric}".format(phase=phase, metric=metric)
+                _row(metric, base_summary[key], run_summary[key], p_value)
+    return rows
+
+
+def compare_runs(refs, threshold=config.COMPARE_THRESHOLD, alpha=config.COMPARE_ALPHA, dirname=config.RUNS_DIR):
+    """
+    Compare every run with the first one, log the deltas and write compare_<date>.json
+    :param refs: run ids or files, default the last two runs of the index
+    :return: dict run id -> list of rows
+    """
+    store = RunStore(dirname)
+    if not refs:
+        refs = [run['id'] for run in store.index()[-2:]]
+    if len(refs) < 2:
+        logger.error("Compare needs two runs, found {refs} in {index}".format(refs=refs, index=store.index_path))
+        exit(1)
+    baseline = store.load(refs[0])
+    results = {}
+    for ref in refs[1:]:
+        run = store.load(ref)
+        if run[0]['cluster'] != baseline[0]['cluster']:
+            logger.info("Compare: {run} ran on another cluster or build: {cluster}".format(
+                run=run[0]['id'], cluster=run[0]['cluster']))
+        rows = compare(baseline, run, threshold, alpha)
+        results[run[0]['id']] = rows
+        logger.info("Compare {run} with {baseline} ({scenario}, threshold {threshold}%):".format(
+            run=run[0]['id'], baseline=baseline[0]['id'], scenario=run[0]['scenario'], threshold=threshold))
+        for row in rows:
+            logger.info("  {metric:<40} {baseline:>12} {value:>12} {delta:>9} p={p_value} {flag}".format(
+                metric=row['metric'], baseline=_fmt(row['baseline']), value=_fmt(row['value']),
+                delta="{delta:+.1f}%".format(delta=row['delta_pct']) if row['delta_pct'] is not None else "-",
+                p_value=_fmt(row['p_value']), flag="REGRESSION" if row['regression'] else ""))
+    path = os.path.join(dirname, "compare_" + datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".json")
+    with open(path, 'w') as stream:
+        json.dump({'baseline': baseline[0]['id'], 'threshold': threshold, 'alpha': alpha, 'runs': results}, stream,
+                  indent=2, sort_keys=True)
+    regressions = sum(1 for rows in results.values() for row in rows if row['regression'])
+    logger.info("Compare: {regressions} regressions, written to {path}".format(regressions=regressions, path=path))
+    return results
+
+
+def _fmt(value):
+    return "{value:.4g}".format(value=value) if isinstance(value, float) else str(value)
@@ -1,30 +1,77 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from src.utils import helper
+import argparse
+from src.utils import config, helper
 import src.scale.scale_actions as executor
+import src.scale.benchmark as benchmark
+import src.scale.results as results
+from src.scale.distributed import Coordinator
+from src.scale.journal import RunJournal
 import src.utils.logger as logger
 
 logger = logger.MyLogger.__call__().get_logger()
 
 
-def test_pool(node_name,ns_name,number_of_vms_per_node):
-    import time
-    print ("enter test pool with %s %s %s", ns_name,node_name, number_of_vms_per_node )
-    for i in range(0, 10):
-        print i
-        time.sleep(1)
-
-def runner():
+def runner(scenario=None, fresh=False, workers=config.DISTRIBUTED_WORKERS):
+    """
+    :param scenario: override 'current_test' from the yaml
+    :param fresh: drop the run journal instead of resuming from it
+    :param workers: load generator processes, more than one runs a Coordinator
+    """
     logger.info(' -------------------------')
     logger.info(' ----- Started -----------')
     test_conf = helper.configuration_parser()
+    if scenario is not None:
+        test_conf['current_test'] = scenario
+    if fresh:
+        RunJournal.remove(test_conf['journal'])
+    if workers > 1 and test_conf['current_test'] != config.CLEANUP:
+        if test_conf['current_test'] not in config.DISTRIBUTED_SCENARIOS:
+            logger.error("Scenario {scenario} runs in one process, --workers works with {scenarios}".format(
+                scenario=test_conf['current_test'], scenarios=config.DISTRIBUTED_SCENARIOS))
+            exit(1)
+        Coordinator(test_conf, workers=workers).run()
+        return
     scale_executor = executor.ScaleExecutor(scale_test_constraints=test_conf)
     scale_executor.execute()
 
 
 def main():
-    runner()
+    parser = argparse.ArgumentParser(description="KubeVirt endurance runner")
+    parser.add_argument(
+        'command', nargs='?', default='run', choices=['run', 'cleanup', 'bench', 'compare'],
+        help="run: run the test configured in conf/scale_test.yaml, "
+             "cleanup: delete all VMs and namespaces created by the tool, "
+             "bench: measure the tool overhead against a simulated cluster, "
+             "compare: compare runs of the results store with the first one"
+    )
+    parser.add_argument('runs', nargs='*', help="compare: run ids or files (default the last two runs)")
+    parser.add_argument('--fresh', action='store_true', help="Ignore the run journal, do not resume")
+    parser.add_argument('--sizes', default=",".join(str(size) for size in config.BENCH_SIZES),
+                        help="bench: comma separated number of VMs")
+    parser.add_argument('--scenarios', default=",".join(config.BENCH_SCENARIOS),
+                        help="bench: comma separated scenarios")
+    parser.add_argument('--engine', default=config.ENGINE_THREADS, choices=[config.ENGINE_THREADS, config.ENGINE_ASYNCIO],
+                        help="bench: creation engine")
+    parser.add_argument('--workers', type=int, default=config.DISTRIBUTED_WORKERS,
+                        help="run: number of load generator processes")
+    parser.add_argument('--threshold', type=float, default=config.COMPARE_THRESHOLD,
+                        help="compare: percent a metric may get worse before it is a regression")
+    args = parser.parse_args()
+    if args.command == 'bench':
+        benchmark.run_benchmarks(
+            scenarios=args.scenarios.split(","), sizes=[int(size) for size in args.sizes.split(",")],
+            engine=args.engine
+        )
+    elif args.command == 'compare':
+        compared = results.compare_runs(args.runs, threshold=args.threshold)
+        if any(row['regression'] for rows in compared.values() for row in rows):
+            exit(1)
+    elif args.command == 'cleanup':
+        runner(scenario=config.CLEANUP, fresh=args.fresh)
+    else:
+        runner(fresh=args.fresh, workers=args.workers)
 
 
 if __name__ == "__main__":
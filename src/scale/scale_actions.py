@@ -1,12 +1,28 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
 import time
-from threading import Thread
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 import src.utils.config as config
 import src.utils.helper as helper
+import src.utils.metrics as metrics
 import src.api.client as client
+import src.api.simulator as simulator
+from src.utils.node_sampler import NodeCpuSampler, NodeGate
+from src.scale.creation_engine import CreationEngine
+from src.scale.latency import LatencyTracker, summarize
+from src.scale.ramp import AdaptiveRamp
+from src.scale.placement import PlacementPlanner
+from src.scale.soak import SoakRunner
+from src.scale.phases import PhaseRunner
+from src.scale.warmup import ImageWarmup, target_nodes
+from src.scale.results import RunStore
+from src.scale.journal import RunJournal, OP_CREATE, OP_ACTION, OP_DELETE, OP_DONE, STAGE_LIFECYCLE
+from src.scale.registry import VmRegistry, STATE_CREATED, STATE_RUNNING
 import src.utils.logger as logger
+from src.utils.logger import MyLogger, vm_event
 
 logger = logger.MyLogger.__call__().get_logger()
 
@@ -19,15 +35,77 @@ class ScaleExecutor(object):
     def __init__(self, scale_test_constraints=config.SCALE_TEST_CONSTRAINTS):
         self.base_vm_name = "cnv-scale-vm-"
         self.base_ns_name = "cnv-scale-ns-"
-        self.vm_name_list = []
+        self.registry = VmRegistry()
         self.action_list = ["start", "stop", "restart"]
         self.constraints = scale_test_constraints
         self.vm_yaml = scale_test_constraints['vm_yaml']
-        self.start_vms = []
-        self.stop_vms = []
-        self.restart_vms = []
-        self.client = client.Client()
+        simulated = scale_test_constraints['backend'] == config.BACKEND_SIMULATED
+        self.client = client.Client(dyn_client=simulator.SimulatedDynamicClient() if simulated else None)
+        self.vm_template = self.client.get_vm_template(self.vm_yaml, self.constraints)
         self.node_list = self.client.get_ready_node_list()
+        self._max_kvm_devices = None
+        self._node_resources = None
+        self._node_requests = None
+        # started on first use, only scenarios with a CPU gate or the adaptive ramp ssh to the nodes
+        self.node_sampler = NodeCpuSampler(self.node_list)
+        self._sample_cpu = not simulated
+        if scale_test_constraints['vm_events'] is True:
+            path = None
+            if scale_test_constraints['worker_id'] is not None:
+                path = "./log/events_{worker_id}.jsonl".format(worker_id=scale_test_constraints['worker_id'])
+            logger.info("VM events written to {path}".format(path=MyLogger.__call__().enable_events(path)))
+        self.latency = LatencyTracker()
+        self.metrics_server = None
+        if int(scale_test_constraints['metrics_port']):
+            metrics.VMIS.set_function(self.client.vmi_cache.phase_node_summary)
+            self.metrics_server = metrics.MetricsServer(port=scale_test_constraints['metrics_port']).start()
+        self.client.vmi_cache.add_listener(self.latency.on_vmi_event)
+        self.lifecycle_done = {}  # action -> VMs done by the lifecycle stage
+        self._replay_journal(scale_test_constraints['journal'])
+        self.journal = RunJournal(scale_test_constraints['journal'])
+
+    def _replay_journal(self, path):
+        """
+        Rebuild the VM registry and the lifecycle stage progress from the run
+        journal of a previous (crashed) run. The journal of a completed run is
+        moved aside and the run starts fresh.
+        :param path: journal file
+        """
+        done = False
+        for record in RunJournal.replay(path):
+            if record['op'] == OP_CREATE:
+                self.registry.add(
+                    record['vm'], record['ns'], node=record['node'],
+                    state=record.get('state', STATE_RUNNING), created=record['t']
+                )
+            elif record['op'] == OP_ACTION and record['ok'] and (record['vm'], record['ns']) in self.registry:
+                self.registry.apply_action(record['action'], record['vm'], record['ns'], timestamp=record['t'])
+                if record.get('stage') == STAGE_LIFECYCLE:
+                    self.lifecycle_done[record['action']] = self.lifecycle_done.get(record['action'], 0) + 1
+            elif record['op'] == OP_DELETE:
+                self.registry.remove(record['vm'], record['ns'])
+            elif record['op'] == OP_DONE:
+                done = True
+        if done:
+            self.registry = VmRegistry()
+            self.lifecycle_done = {}
+            logger.warning("Journal {path} is from a completed run, moved to {done}, start a new run".format(
+                path=path, done=RunJournal.rotate(path)))
+            return
+        if len(self.registry):
+            logger.info("Resume from journal {path}: {vms} VMs created, lifecycle stage {lifecycle}".format(
+                path=path, vms=len(self.registry), lifecycle=self.lifecycle_done
+            ))
+
+    def cpu_sampler(self):
+        """
+        Node CPU sampler for the CPU gate and the adaptive ramp, the ssh
+        sessions start on the first call (never with the simulated backend)
+        :return: NodeCpuSampler
+        """
+        if self._sample_cpu:
+            self.node_sampler.start()
+        return self.node_sampler
 
     def scale_out_with_openshift_scheduling(self, number_of_vms):
         """
@@ -39,57 +117,242 @@ class ScaleExecutor(object):
         logger.info(
             "Run ocp scheduling scale out with:\n number of vms :{number_of_vms}".format(number_of_vms=number_of_vms)
         )
-        ns_counter = 1
-        ns_name = "{ns_name}{counter}".format(ns_name=self.base_ns_name, counter=ns_counter)
-        self.client.add_namespace(ns_name)
-        max_kvm_devices = self.client.get_num_of_kvm_devices_from_node()
-        for i in range(0, number_of_vms):
-            if i % max_kvm_devices == 0:
-                ns_name = "{ns_name}{counter}".format(ns_name=self.base_ns_name, counter=ns_counter)
+        if self.constraints['placement'] == config.PLACEMENT_PLANNED:
+            placement = self._planner().plan(number_of_vms)
+            planned_nodes = set(placement)
+            self._run_jobs(
+                self._planned_jobs(placement), nodes=[node for node in self.node_list if node in planned_nodes])
+            return
+        self._run_jobs(self._ocp_scheduling_jobs(number_of_vms, self.max_kvm_devices()))
+
+    def _target_namespace(self):
+        """
+        Namespace of the first VM of the scenario (planned placement: the first node namespace)
+        """
+        counter = 1
+        if self.constraints['current_test'] == config.MULTI_NODE:
+            nodes = self.constraints['nodes'] or self.node_list
+            if nodes and nodes[0] in self.node_list:
+                counter = self.node_list.index(nodes[0]) + 1
+        elif self.constraints['current_test'] == config.OCP_SCHEDULING and \
+                self.constraints['placement'] != config.PLACEMENT_PLANNED:
+            counter = int(self.constraints['vm_offset']) // self.max_kvm_devices() + 1
+        return "{ns_name}{counter}".format(ns_name=self.base_ns_name, counter=counter)
+
+    def max_kvm_devices(self):
+        """
+        KVM devices per node, read once per run
+        """
+        if self._max_kvm_devices is None:
+            self._max_kvm_devices = self.client.get_num_of_kvm_devices_from_node()
+        return self._max_kvm_devices
+
+    def _planner(self):
+        """
+        :return: PlacementPlanner for the ready nodes and the VM template, nodes and the requests
+                 of their pods are read once per run, before the first planned VM
+        """
+        if self._node_resources is None:
+            self._node_resources = self.client.get_node_resources()
+            self._node_requests = self.client.get_node_requests(self._node_resources)
+        return PlacementPlanner(self._node_resources, self.vm_template.requests(), used=self._node_requests)
+
+    def _planned_jobs(self, placement):
+        """
+        Jobs for planned placement, VMs pinned to their node with a namespace per node
+        :param placement: list of node names by VM index (PlacementPlanner.plan)
+        :return: generator of (index, ns_name, vm_name, node_name)
+        """
+        ns_names = {}
+        for i in range(int(self.constraints['vm_offset']), len(placement)):
+            node_name = placement[i]
+            if node_name not in ns_names:
+                ns_names[node_name] = "{ns_name}{counter}".format(
+                    ns_name=self.base_ns_name, counter=self.node_list.index(node_name) + 1)
+                self.client.add_namespace(ns_names[node_name])
+            vm_name = "{vm}{counter}".format(vm=self.base_vm_name, counter=i)
+            yield i, ns_names[node_name], vm_name, node_name
+
+    def _ocp_scheduling_jobs(self, number_of_vms, max_kvm_devices):
+        """
+        Jobs for the ocp scheduling scale out, add namespace every max_kvm_devices VMs
+        :return: generator of (index, ns_name, vm_name, node_name)
+        """
+        start = int(self.constraints['vm_offset'])
+        ns_name = None
+        for i in range(start, number_of_vms):
+            if i == start or i % max_kvm_devices == 0:
+                ns_name = "{ns_name}{counter}".format(ns_name=self.base_ns_name, counter=i // max_kvm_devices + 1)
                 self.client.add_namespace(ns_name)
             vm_name = "{vm}{counter}".format(vm=self.base_vm_name, counter=i)
-            self.add_vm(i, ns_name, vm_name)
+            yield i, ns_name, vm_name, None
+
+    def _run_jobs(self, jobs, nodes=None):
+        """
+        Create the VMs of jobs with the configured engine (threads or asyncio).
+        A job pinned to a node is submitted when the node CPU is idle (NodeGate).
+        :param jobs: iterable of (index, ns_name, vm_name, node_name), node_name None for no node selector
+        :param nodes: nodes the VMs go to, for the ramp CPU check
+        :return: engine stats
+        """
+        batch_size = int(self.constraints['create_batch_size'])
+        if batch_size > 0:
+            engine = self._new_engine(nodes=nodes)
+            # a batch is in one namespace, so on one node
+            gate = NodeGate(self.cpu_sampler, node_of=lambda batch: batch[0][3])
+            for batch in gate.jobs(self._batches(jobs, batch_size), room=engine.wait_for_room):
+                engine.submit_batch(self.add_vm_batch, batch)
+                if any(self._interval_end(job[0]) for job in batch):
+                    self._interval_pause(engine.wait)
+            return self._join_engine(engine)
+        if self.constraints['engine'] == config.ENGINE_ASYNCIO:
+            from src.scale import async_scale
+            return async_scale.run_jobs(self, jobs, nodes=nodes)
+        engine = self._new_engine(nodes=nodes)
+        jobs = (job for job in jobs if (job[2], job[1]) not in self.registry)
+        gate = NodeGate(self.cpu_sampler)
+        for index, ns_name, vm_name, node_name in gate.jobs(jobs, room=engine.wait_for_room):
+            engine.submit(self.add_vm, index, ns_name, vm_name, node_name=node_name)
+            if self._interval_end(index):
+                self._interval_pause(engine.wait)
+        return self._join_engine(engine)
+
+    def _interval_end(self, index):
+        """
+        Fixed ramp: the VM at index ends an interval of number_of_vms_in_interval VMs
+        """
+        interval = int(self.constraints['number_of_vms_in_interval'])
+        return self.constraints['ramp_mode'] == config.RAMP_FIXED and index > 0 and index % interval == 0
+
+    def _interval_pause(self, wait):
+        """
+        Fixed ramp: wait for the submitted creates, then sleep delay_between_intervals.
+        The dispatcher pauses, so no worker creates during the delay.
+        :param wait: function waiting for the submitted creates
+        """
+        wait()
+        time.sleep(int(self.constraints['delay_between_intervals']))
+        self.client.get_vmis_status_summary()
+
+    def _batches(self, jobs, batch_size):
+        """
+        Group jobs per namespace, VMs that exist already are skipped
+        :return: generator of lists of jobs, all in one namespace
+        """
+        pending = OrderedDict()
+        for job in jobs:
+            if (job[2], job[1]) in self.registry:
+                continue
+            batch = pending.setdefault(job[1], [])
+            batch.append(job)
+            if len(batch) >= batch_size:
+                yield pending.pop(job[1])
+        for batch in pending.values():
+            yield batch
+
+    def _new_engine(self, nodes=None):
+        """
+        Create and start a creation engine configured from the constraints.
+        With adaptive ramp mode an AdaptiveRamp drives the engine create rate.
+        :param nodes: nodes the VMs go to, for the ramp CPU check
+        :return: CreationEngine
+        """
+        engine = CreationEngine(
+            workers=int(self.constraints['create_workers']),
+            rate=float(self.constraints['create_rate']),
+            max_in_flight=int(self.constraints['max_in_flight'])
+        )
+        engine.ramp = None
+        if self.constraints['ramp_mode'] == config.RAMP_ADAPTIVE:
+            engine.ramp = AdaptiveRamp(
+                engine.rate_limiter, self.client.vmi_cache, node_sampler=self.cpu_sampler(), nodes=nodes,
+                max_backlog=int(self.constraints['ramp_max_backlog'])
+            ).start()
+        return engine.start()
+
+    def _join_engine(self, engine):
+        """
+        Wait for the engine jobs and stop its ramp
+        :return: engine stats
+        """
+        stats = engine.join()
+        if engine.ramp is not None:
+            stats['max_safe_rate'] = engine.ramp.stop()
+        return stats
 
-    def add_vm(self, index, ns_name, vm_name):
+    def add_vm(self, index, ns_name, vm_name, node_name=None):
         """
         Add VM and run it with virtctl
         :param index: VM index
         :param ns_name: Namespace name
         :param vm_name: VM name
+        :param node_name: Node to pin the VM to with node selector
         :return:
         """
-        self.vm_name_list.append('{vm_name},{namespace}'.format(vm_name=vm_name, namespace=ns_name))
+        if (vm_name, ns_name) in self.registry:
+            return
+        interval = int(self.constraints['number_of_vms_in_interval'])
+        self.latency.record_create(vm_name, ns_name, node=node_name, batch=index // interval)
         self.client.create_vm(
-            yaml_body=self.client.update_vm_yaml(
-                yaml_file=self.vm_yaml, vm_name=vm_name,
-                constraints=self.constraints
-            ),
-            namespace=ns_name
+            yaml_body=self.vm_template.render(vm_name, namespace=ns_name, node_name=node_name),
+            namespace=ns_name, method=self.constraints['create_method']
         )
-        if not self.constraints["running_state"]:
+        state = STATE_RUNNING if self.constraints["running_state"] is True else STATE_CREATED
+        if state == STATE_CREATED and self._vm_action(self.action_list[0], vm_name, ns_name):
+            state = STATE_RUNNING
+        self._vm_created(vm_name, ns_name, node_name, state)
+
+    def add_vm_batch(self, batch):
+        """
+        Add batch of VMs in one namespace, the creates go out together and
+        the batch accept latency is recorded
+        :param batch: list of (index, ns_name, vm_name, node_name)
+        """
+        ns_name = batch[0][1]
+        interval = int(self.constraints['number_of_vms_in_interval'])
+        bodies = []
+        for index, _, vm_name, node_name in batch:
+            self.latency.record_create(vm_name, ns_name, node=node_name, batch=index // interval)
+            bodies.append(self.vm_template.render(vm_name, namespace=ns_name, node_name=node_name))
+        start = time.time()
+        results = self.client.create_vms(bodies, ns_name, method=self.constraints['create_method'])
+        self.latency.record_batch(ns_name, len(batch), time.time() - start, failed=results.count(False))
+        created = [job for job, result in zip(batch, results) if result]
+        states = [STATE_RUNNING if self.constraints["running_state"] is True else STATE_CREATED] * len(created)
+        if created and states[0] == STATE_CREATED:
+            vms = [(vm_name, ns_name) for _, _, vm_name, _ in created]
+            if self.constraints['lifecycle_mode'] == config.LIFECYCLE_VIRTCTL:
+                started = [self._vm_action(self.action_list[0], vm_name, ns_name) for vm_name, ns_name in vms]
+            else:
+                started = self.client.vm_action_bulk(self.action_list[0], vms, mode=self.constraints['lifecycle_mode'])
+            states = [STATE_RUNNING if result else STATE_CREATED for result in started]
+        for (_, _, vm_name, node_name), state in zip(created, states):
+            self._vm_created(vm_name, ns_name, node_name, state)
+
+    def _vm_created(self, vm_name, ns_name, node_name, state):
+        """
+        Register and journal a created VM
+        """
+        self.registry.add(vm_name, ns_name, node=node_name, state=state)
+        metrics.VMS_CREATED.inc()
+        vm_event('created', vm=vm_name, ns=ns_name, node=node_name, state=state)
+        self.journal.record_create(vm_name, ns_name, node=node_name, state=state)
+
+    def _vm_action(self, action, vm_name, ns_name):
+        """
+        Run VM lifecycle action with the configured lifecycle mode
+        :return: True if the action was accepted
+        """
+        mode = self.constraints['lifecycle_mode']
+        if mode == config.LIFECYCLE_VIRTCTL:
             helper.execute_command(
                 config.VIRTCTL_ACTION.format(
-                    virtctl_path=config.VIRTCTL_PATH, action=self.action_list[0], vm_name=vm_name, namespace=ns_name
+                    virtctl_path=config.VIRTCTL_PATH, action=action, vm_name=vm_name, namespace=ns_name
                 )
             )
-        time.sleep(1)
-        if index > 0 and index % config.NUMBER_OF_VMS_IN_INTERVAL == 0:
-            time.sleep(config.DELAY)
-            self.client.get_vmis_status_summary()
-
-    def _handle_threads(self, thread_info_list):
-        """
-        Get list with threads info and execute threads
-        :param thread_info_list:
-        """
-        threads = []
-        for args in thread_info_list:
-            t = Thread(target=self.scale_up_one_node, kwargs=args)
-            threads.append(t)
-        for t in threads:
-            t.start()
-        for t in threads:
-            t.join()
+            metrics.VM_ACTIONS.inc(action, "ok")
+            return True
+        return self.client.vm_action(action, vm_name, ns_name, mode=mode)
 
     def scale_out_nodes_ramp_up(self, nodes_list, number_of_vms_per_node):
         """
@@ -103,24 +366,25 @@ class ScaleExecutor(object):
                 number_of_vms=number_of_vms_per_node
             )
         )
-        ns_counter = 1
-        pool_size = 1
-        thread_pool = []
-        if len(nodes_list) > 10:
-            pool_size = len(nodes_list) / 10
-            logger.debug("pool size: %s", pool_size)
+        vms_per_node = dict((node_name, number_of_vms_per_node) for node_name in nodes_list)
+        if self.constraints['placement'] == config.PLACEMENT_PLANNED:
+            slots = self._planner().slots
+            vms_per_node = dict((node_name, min(number_of_vms_per_node, slots.get(node_name, 0)))
+                                for node_name in nodes_list)
+            logger.info("Planned VMs per node: {vms}".format(vms=vms_per_node))
+        ns_names = {}
         for node_name in nodes_list:
-            ns_name = "{ns_name}{counter}".format(ns_name=self.base_ns_name, counter=ns_counter)
-            ns_counter += 1
-            thread_args = {
-                'ns_name': ns_name,
-                'number_of_vms_per_node': number_of_vms_per_node,
-                'node_name': node_name
-            }
-            thread_pool.append(thread_args)
-            if len(thread_pool) == pool_size:
-                self._handle_threads(thread_info_list=thread_pool)
-                thread_pool = []
+            # namespace number from the position in the full node list, the same in every worker
+            ns_counter = self.node_list.index(node_name) + 1 if node_name in self.node_list else len(ns_names) + 1
+            ns_names[node_name] = "{ns_name}{counter}".format(ns_name=self.base_ns_name, counter=ns_counter)
+            self.client.add_namespace(ns_names[node_name])
+        # interleave the nodes so a slow node does not hold the others
+        self._run_jobs((
+            (i, ns_names[node_name], "{vm}{counter}".format(vm=self.base_vm_name, counter=i), node_name)
+            for i in range(int(self.constraints['vm_offset']), number_of_vms_per_node)
+            for node_name in nodes_list if i < vms_per_node[node_name]
+        ), nodes=nodes_list)
+        self.client.get_vmis_status_summary()
 
     def scale_up_one_node(self, ns_name, number_of_vms_per_node, node_name=None):
         """
@@ -134,19 +398,18 @@ class ScaleExecutor(object):
         ))
         self.client.add_namespace(ns_name)
         node_name = node_name if node_name is not None else self.node_list[0]
-        self.constraints.update({'node_selector': node_name})
         logger.info(
             "Run single node scale up with:\n namespace:{ns}\n node:{node}\n number of vms:{number_of_vms}".format(
                 ns=ns_name,
                 number_of_vms=self.constraints['max_number_of_vm_per_node'],
                 node=node_name)
         )
-        for i in range(int(self.constraints['vm_offset']), number_of_vms_per_node):
-            vm_name = "{vm}{counter}".format(vm=self.base_vm_name, counter=i)
-            self.add_vm(i, ns_name, vm_name)
-            helper.check_cpu_on_node(node_name=node_name)
+        self._run_jobs((
+            (i, ns_name, "{vm}{counter}".format(vm=self.base_vm_name, counter=i), node_name)
+            for i in range(int(self.constraints['vm_offset']), number_of_vms_per_node)
+        ), nodes=[node_name])
         self.client.get_vmis_status_summary()
-        helper.check_cpu_on_node(node_name=node_name)
+        self.cpu_sampler().wait_for_idle(node_name)
 
     def vm_lifecycle(self, action, num_of_vms):
         """
@@ -154,8 +417,7 @@ class ScaleExecutor(object):
         :param action: Action: Start, Stop, Restart
         :param num_of_vms: List size
         """
-        err = "VM life cycle action: Action {action} requires that will be a least {vms}"
-        vm_list = []
+        err = "VM life cycle action: Action {action} requires that will be a least {vms} VMs, found {found}"
 
         if action not in self.action_list:
             logger.error("VM life cycle action:  Action {action} is not in list {action_list}".format(
@@ -164,34 +426,124 @@ class ScaleExecutor(object):
             )
             return
 
-        if action == self.action_list[0]:  # start action
-            if len(self.stop_vms) >= num_of_vms:
-                vm_list = self.stop_vms
-            else:
-                logger.error(err.format(action=action, vms=self.stop_vms))
+        # on resume only the VMs the lifecycle stage did not do the action on yet
+        num_of_vms -= self.lifecycle_done.get(action, 0)
+        if num_of_vms <= 0:
+            return
+        vm_list = self.registry.select_for_action(action, num_of_vms)
+        if len(vm_list) < num_of_vms:
+            logger.error(err.format(action=action, vms=num_of_vms, found=len(vm_list)))
+            return
+        vms = [vm.key for vm in vm_list]
+        mode = self.constraints['lifecycle_mode']
+        if mode == config.LIFECYCLE_VIRTCTL:
+            results = [self._vm_action(action, vm_name, ns_name) for vm_name, ns_name in vms]
+        elif self.constraints['engine'] == config.ENGINE_ASYNCIO:
+            from src.scale import async_scale
+            results = async_scale.run_action(self, action, vms)
         else:
-            if len(self.vm_name_list) >= num_of_vms:
-                vm_list = self.vm_name_list[0: num_of_vms]
-            else:
-                logger.error(err.format(action=action, vms=self.vm_name_list))
-        for entity in vm_list:
-            vm_name = entity.split(",")[0]
-            ns_name = entity.split(",")[1]
-            helper.execute_command(
-                config.VIRTCTL_ACTION.format(
-                    virtctl_path=config.VIRTCTL_PATH, action=action, vm_name=vm_name, namespace=ns_name
-                )
-            )
+            results = self.client.vm_action_bulk(action, vms, mode=mode)
+        for (vm_name, ns_name), result in zip(vms, results):
+            self.journal.record_action(action, vm_name, ns_name, result, stage=STAGE_LIFECYCLE)
+            if result:
+                self.registry.apply_action(action, vm_name, ns_name)
+                self.lifecycle_done[action] = self.lifecycle_done.get(action, 0) + 1
+        logger.info("VM life cycle action: {action} done on {ok}/{total} VMs".format(
+            action=action, ok=results.count(True), total=len(vms)))
+        logger.info([vm for vm, result in zip(vm_list, results) if result])
+
+    def _teardown_namespace(self, ns_name, timeout):
+        """
+        Delete VMs in namespace with deletecollection and wait for their VMIs to go
+        :return: (number of VMs, seconds till VMIs are gone or None on timeout)
+        """
+        num_of_vms = self.client.count_vms(ns_name)
+        start = time.time()
+        self.client.delete_vms(ns_name)
+        while self.client.vmi_cache.count_in_namespace(ns_name) > 0:
+            if time.time() - start > timeout:
+                logger.error("Namespace {ns}: VMIs not gone after {timeout}s".format(ns=ns_name, timeout=timeout))
+                return num_of_vms, None
             time.sleep(1)
-            eval("self.{action}_vms".format(action=action)).append(
-                '{vm_name},{namespace}'.format(vm_name=vm_name, namespace=ns_name)
-            )
-        logger.info(eval("self.{action}_vms".format(action=action)))
+        self.client.delete_namespace(ns_name)
+        return num_of_vms, time.time() - start
+
+    def cleanup(self, timeout=config.CLEANUP_TIMEOUT, workers=config.CLEANUP_WORKERS):
+        """
+        Delete all VMs and namespaces created by the tool (found by the run label).
+        Namespaces are torn down in parallel.
+        :param timeout: seconds to wait for the VMs and namespaces to be gone
+        :param workers: namespaces torn down at the same time
+        :return: dict with teardown measurements
+        """
+        ns_names = self.client.get_namespaces()
+        logger.info("Cleanup: {num} namespaces {ns}".format(num=len(ns_names), ns=ns_names))
+        if not ns_names:
+            return {}
+        start = time.time()
+        pool = ThreadPool(min(int(workers), len(ns_names)))
+        try:
+            results = pool.map(lambda ns_name: self._teardown_namespace(ns_name, timeout), ns_names)
+        finally:
+            pool.close()
+            pool.join()
+        vms_gone = time.time() - start
+        deleted = self.client.wait_for_namespaces_deleted(ns_names, timeout=timeout)
+        num_of_vms = sum(result[0] for result in results)
+        teardown = {
+            'namespaces': len(ns_names),
+            'namespaces_deleted': len(deleted),
+            'vms': num_of_vms,
+            'vms_gone_seconds': vms_gone,
+            'total_seconds': time.time() - start,
+            'vms_per_second': num_of_vms / vms_gone if vms_gone > 0 else 0.0,
+            'namespace_vmis_gone': summarize([result[1] for result in results if result[1] is not None])
+        }
+        logger.info("Cleanup done: {teardown}".format(teardown=teardown))
+        return teardown
+
+    def prepull(self):
+        """
+        Pull the containerDisk images of the VM template on the nodes of the scenario
+        :return: dict with prepull measurements
+        """
+        nodes = target_nodes(self.constraints, self.node_list)
+        return ImageWarmup(self.client, self.vm_template, nodes, timeout=self.constraints['prepull_timeout']).run()
 
     def execute(self):
         """
         Run the scenarios according to the constraints configure in the yaml.
         """
+        try:
+            self._execute()
+        finally:
+            self.journal.close()
+            self.node_sampler.stop()
+
+    def _execute(self):
+        started = time.time()
+        phase_results = None
+        # teardown
+        if self.constraints['current_test'] == config.CLEANUP:
+            self.cleanup()
+            self.journal.reset()
+            # journals of distributed runs, a later run would resume from them
+            for journal in RunJournal.worker_paths(self.journal.path):
+                os.remove(journal)
+                logger.info("Cleanup: removed worker journal {journal}".format(journal=journal))
+            return
+        # catch a bad template before the first real create, in the namespace the VMs go to
+        ns_name = self._target_namespace()
+        self.client.add_namespace(ns_name)
+        err = self.client.validate_vm(
+            self.vm_template.render(self.base_vm_name + "dry-run", namespace=ns_name), namespace=ns_name)
+        if err is not None:
+            logger.error("VM template {yaml} failed server side dry run in namespace {ns}, err: {err}".format(
+                yaml=self.vm_yaml, ns=ns_name, err=err))
+            exit(1)
+        # distributed workers: the coordinator pulled the images
+        if self.constraints['prepull'] is True and self.constraints['worker_id'] is None:
+            self.prepull()
         # single node scale up
         if self.constraints['current_test'] == config.SINGLE_NODE:
             ns_name = "{ns_name}{counter}".format(ns_name=self.base_ns_name, counter=1)
@@ -202,19 +554,33 @@ class ScaleExecutor(object):
         # multi nodes scale out
         if self.constraints['current_test'] == config.MULTI_NODE:
             self.scale_out_nodes_ramp_up(
-                nodes_list=self.node_list,
+                nodes_list=self.constraints['nodes'] or self.node_list,
                 number_of_vms_per_node=int(self.constraints['max_number_of_vm_per_node'])
             )
         # ocp scheduling scale out
         if self.constraints['current_test'] == config.OCP_SCHEDULING:
-            self.scale_out_with_openshift_scheduling(number_of_vms=self.constraints['total_vms'])
+            self.scale_out_with_openshift_scheduling(number_of_vms=int(self.constraints['ocp_scheduling_total_vms']))
+        # soak
+        if self.constraints['current_test'] == config.SOAK:
+            SoakRunner(self).run()
+        # phased workload plan
+        if self.constraints['current_test'] == config.PHASED:
+            phase_results = PhaseRunner(self, self.constraints['phases']).run()
         # vm lifecycle
         count = 0
         action_list_ = self.constraints['vm_lifecycle_action_list']
-        if action_list_:
+        if action_list_ and self.constraints['current_test'] not in config.LIFECYCLE_SCENARIOS:
+            # soak and phased runs do their actions themselves (burst phases), their VMs may be gone
+            logger.info("VM life cycle stage skipped for {test}".format(test=self.constraints['current_test']))
+        elif action_list_:
             num_of_vms = int(self.constraints['vm_lifecycle_number_of_vms'])
-            while self.client.get_vmis_at_status(config.VMI_STATUS[0]) < int(num_of_vms) and count <= 10:
+            while self.client.count_vmis_at_status(config.VMI_STATUS[0]) < num_of_vms and count <= 10:
                 time.sleep(60)
                 count += 1
             for action in action_list_.split(","):
                 self.vm_lifecycle(action=action, num_of_vms=num_of_vms)
+        self.journal.record_done()
+        if self.constraints['worker_id'] is None:
+            self.latency.report()
+            RunStore().save(self.constraints, self.client.cluster_fingerprint(), self.latency, started,
+                            phases=phase_results)
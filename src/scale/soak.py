@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import random
+import datetime
+import threading
+from collections import defaultdict
+import src.utils.config as config
+import src.utils.logger as logger
+from src.scale.creation_engine import CreationEngine, TokenBucket
+from src.scale.latency import summarize
+from src.scale.registry import ACTION_TRANSITIONS, STATE_CREATED, STATE_RUNNING
+
+logger = logger.MyLogger.__call__().get_logger()
+
+OP_CREATE = "create"
+OP_DELETE = "delete"
+OP_RUNNING = "running"  # time from create to Running, from the VMI watch
+
+
+def parse_mix(mix):
+    """
+    :param mix: 'start:3,stop:3,restart:2,create:1,delete:1'
+    :return: list of (operation, weight)
+    """
+    weights = []
+    for item in mix.split(","):
+        operation, _, weight = item.strip().partition(":")
+        if operation not in ACTION_TRANSITIONS and operation not in (OP_CREATE, OP_DELETE):
+            logger.error("Soak: unknown operation {op} in mix {mix}".format(op=operation, mix=mix))
+            exit(1)
+        weights.append((operation, float(weight or 1)))
+    return weights
+
+
+class RollingStats(object):
+    """
+    Operation latency and errors in fixed time windows.
+    Every closed window is logged, appended to soak_<date>.jsonl and compared
+    with the first window so a slow degradation over hours shows up as a
+    growing p99 ratio.
+    """
+
+    def __init__(self, window=config.SOAK_WINDOW, dirname=config.RESULTS_DIR, phase=None, target_rate=None):
+        """
+        :param window: window length in seconds
+        :param dirname: output directory
+        :param phase: phase name windows are tagged with
+        :param target_rate: target operations per second, logged next to the achieved rate
+        """
+        self.window = window
+        self.phase = phase
+        self.target_rate = target_rate
+        if not os.path.isdir(dirname):
+            os.mkdir(dirname)
+        self.path = os.path.join(dirname, "soak_" + datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".jsonl")
+        self.windows = []
+        self.baseline = {}  # operation -> p99 of the first window it showed up in
+        self._latencies = defaultdict(list)
+        self._errors = defaultdict(int)
+        self._start = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, operation, seconds, ok=True):
+        with self._lock:
+            if ok:
+                self._latencies[operation].append(seconds)
+            else:
+                self._errors[operation] += 1
+
+    def roll(self, population=None):
+        """
+        Close the current window
+        :param population: VMs at the end of the window
+        :return: window summary dict
+        """
+        now = time.time()
+        with self._lock:
+            latencies, self._latencies = self._latencies, defaultdict(list)
+            errors, self._errors = self._errors, defaultdict(int)
+            start, self._start = self._start, now
+        operations = {}
+        for operation in set(latencies) | set(errors):
+            summary = summarize(latencies[operation])
+            summary['errors'] = errors[operation]
+            total = summary['count'] + summary['errors']
+            summary['error_rate'] = float(summary['errors']) / total if total else 0.0
+            if summary['p99'] is not None:
+                self.baseline.setdefault(operation, summary['p99'])
+                baseline = self.baseline[operation]
+                summary['p99_vs_first'] = summary['p99'] / baseline if baseline else None
+            operations[operation] = summary
+        done = sum(summary['count'] + summary['errors'] for name, summary in operations.items() if name != OP_RUNNING)
+        window = {
+            'window': len(self.windows),
+            'phase': self.phase,
+            'start': start,
+            'end': now,
+            'ops': done,
+            'ops_per_second': done / (now - start) if now > start else 0.0,
+            'target_ops_per_second': self.target_rate,
+            'population': population,
+            'operations': operations
+        }
+        self.windows.append(window)
+        with open(self.path, 'a') as stream:
+            stream.write(json.dumps(window, sort_keys=True) + "\n")
+        message = "Soak window {window}: {ops} ops ({rate:.2f}/s, target {target}/s), population {population}, {detail}"
+        logger.info(message.format(
+            window=window['window'], ops=done, rate=window['ops_per_second'], target=self.target_rate,
+            population=population,
+            detail=", ".join("{op} p99 {p99} err {errors}".format(op=name, p99=summary['p99'], errors=summary['errors'])
+                             for name, summary in sorted(operations.items()))
+        ))
+        return window
+
+
+class SoakRunner(object):
+    """
+    Endurance soak: keep a stable VM population and run a weighted random mix
+    of start/stop/restart/create/delete on it at a target rate for hours.
+    Creates and deletes are paired around the target population, so the
+    cluster size stays the same while VMs keep churning.
+    """
+
+    def __init__(self, executor, phase=None):
+        """
+        :param executor: ScaleExecutor
+        :param phase: phase name for the stats windows
+        """
+        self.phase = phase
+        self.executor = executor
+        constraints = executor.constraints
+        self.duration = float(constraints['soak_duration'])
+        self.rate = float(constraints['soak_rate'])
+        self.population = int(constraints['soak_population'])
+        self.mix = parse_mix(constraints['soak_mix'])
+        self.window = float(constraints['soak_window'])
+        self.stats = None
+        self.max_kvm_devices = None
+        self.namespaces = set()
+        self.next_index = 0
+        self._busy = set()
+        self._lock = threading.Lock()
+
+    def _vm_index(self, vm_name):
+        try:
+            return int(vm_name[len(self.executor.base_vm_name):])
+        except ValueError:
+            return -1
+
+    def _next_index(self):
+        return max([self._vm_index(name) for name, _ in self.executor.registry.vms] + [-1]) + 1
+
+    def _namespace(self, index):
+        """
+        Namespace of the VM at index, max_kvm_devices VMs per namespace, added on first use
+        """
+        ns_name = "{ns_name}{counter}".format(ns_name=self.executor.base_ns_name,
+                                              counter=index // self.max_kvm_devices + 1)
+        if ns_name not in self.namespaces:
+            self.executor.client.add_namespace(ns_name)
+            self.namespaces.add(ns_name)
+        return ns_name
+
+    def fill(self):
+        """
+        Create the VMs missing from the soak population, after the highest VM index,
+        so VMs deleted before do not come back on top of the population
+        """
+        executor = self.executor
+        self.max_kvm_devices = executor.max_kvm_devices()
+        self.namespaces.update(executor.registry.by_namespace.keys())
+        self.next_index = self._next_index()
+        missing = self.population - len(executor.registry)
+        if missing > 0:
+            logger.info("Soak: create {vms} VMs to reach population {population}".format(
+                vms=missing, population=self.population))
+            executor._run_jobs(
+                (index, self._namespace(index), "{vm}{counter}".format(vm=executor.base_vm_name, counter=index), None)
+                for index in range(self.next_index, self.next_index + missing)
+            )
+            self.next_index = self._next_index()
+
+    def _choose(self):
+        """
+        Pick the next operation and its VM, mark the VM busy
+        :return: (operation, VmRecord or None) or None if no VM fits
+        """
+        registry = self.executor.registry
+        total = sum(weight for _, weight in self.mix)
+        pick = random.uniform(0, total)
+        for operation, weight in self.mix:
+            pick -= weight
+            if pick <= 0:
+                break
+        # pair creates and deletes around the population
+        if operation in (OP_CREATE, OP_DELETE):
+            operation = OP_CREATE if len(registry) < self.population else OP_DELETE
+        if operation == OP_CREATE:
+            return operation, None
+        with self._lock:
+            states = ACTION_TRANSITIONS[operation][0] if operation in ACTION_TRANSITIONS else None
+            record = registry.sample(states=states, exclude=self._busy)
+            if record is None:
+                return None
+            self._busy.add(record.key)
+        return operation, record
+
+    def _run_op(self, operation, record):
+        executor = self.executor
+        start = time.time()
+        try:
+            if operation == OP_CREATE:
+                ok = self._create()
+            elif operation == OP_DELETE:
+                ok = executor.client.delete_vm(record.name, record.namespace)
+                if ok:
+                    executor.journal.record_delete(record.name, record.namespace)
+                    executor.registry.remove(record.name, record.namespace)
+            else:
+                ok = executor._vm_action(operation, record.name, record.namespace)
+                executor.journal.record_action(operation, record.name, record.namespace, ok)
+                if ok:
+                    executor.registry.apply_action(operation, record.name, record.namespace)
+        except Exception as err:
+            logger.error("Soak: {op} failed, err: {err}".format(op=operation, err=err))
+            ok = False
+        finally:
+            if record is not None:
+                with self._lock:
+                    self._busy.discard(record.key)
+        self.stats.record(operation, time.time() - start, ok)
+
+    def _create(self):
+        executor = self.executor
+        with self._lock:
+            index = self.next_index
+            self.next_index += 1
+        ns_name = self._namespace(index)
+        vm_name = "{vm}{counter}".format(vm=executor.base_vm_name, counter=index)
+        executor.latency.record_create(vm_name, ns_name)
+        executor.client.create_vm(yaml_body=executor.vm_template.render(vm_name, namespace=ns_name), namespace=ns_name,
+                                  method=executor.constraints['create_method'])
+        state = STATE_RUNNING if executor.constraints["running_state"] is True else STATE_CREATED
+        if state == STATE_CREATED and executor._vm_action(executor.action_list[0], vm_name, ns_name):
+            state = STATE_RUNNING
+        executor._vm_created(vm_name, ns_name, None, state)
+        return True
+
+    def _on_running(self, record):
+        self.stats.record(OP_RUNNING, record.time_to_running)
+
+    def run(self):
+        """
+        Fill to the population and churn for soak_duration seconds (Ctrl-C stops early)
+        :return: list of window summaries
+        """
+        self.fill()
+        self.stats = RollingStats(window=self.window, phase=self.phase, target_rate=self.rate)
+        executor = self.executor
+        executor.latency.on_running = self._on_running
+        engine = CreationEngine(
+            workers=int(executor.constraints['create_workers']),
+            max_in_flight=int(executor.constraints['max_in_flight'])
+        ).start()
+        rate_limiter = TokenBucket(self.rate)
+        logger.info("Soak: {rate} ops/s for {duration}s on {population} VMs, mix {mix}".format(
+            rate=self.rate, duration=self.duration, population=self.population, mix=self.mix))
+        end = time.time() + self.duration
+        next_roll = time.time() + self.stats.window
+        try:
+            while time.time() < end:
+                # do not queue more than the engine can run, the rate is a target not a backlog,
+                # a token is taken only for an operation that goes out
+                if engine.submitted - engine.done - engine.failed < engine.workers * 2:
+                    rate_limiter.acquire()
+                    choice = self._choose()
+                    if choice is not None:
+                        engine.submit(self._run_op, *choice)
+                else:
+                    time.sleep(0.01)
+                if time.time() >= next_roll:
+                    next_roll += self.stats.window
+                    self.stats.roll(population=len(executor.registry))
+        except KeyboardInterrupt:
+            logger.info("Soak: interrupted, wait for running operations")
+        engine.join()
+        self.stats.roll(population=len(executor.registry))
+        logger.info("Soak results written to {path}".format(path=self.stats.path))
+        return self.stats.windows
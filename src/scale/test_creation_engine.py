@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+from src.scale.creation_engine import TokenBucket, CreationEngine
+
+
+def test_token_bucket_without_rate_never_waits():
+    bucket = TokenBucket(0)
+    assert all(bucket.reserve() == 0.0 for _ in range(100))
+
+
+def test_token_bucket_waits_after_burst():
+    bucket = TokenBucket(10, burst=5)
+    assert [bucket.reserve() for _ in range(5)] == [0.0] * 5
+    # one token short, a tenth of a second at 10 tokens/s
+    assert 0.05 < bucket.reserve() <= 0.1
+
+
+def test_engine_limits_in_flight_and_counts_failures():
+    lock = threading.Lock()
+    running = [0, 0]  # current, max
+
+    def job(fail):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        if fail:
+            raise ValueError("create failed")
+
+    engine = CreationEngine(workers=8, max_in_flight=2).start()
+    for index in range(20):
+        engine.submit(job, index % 5 == 0)
+    engine.submit_batch(lambda batch: None, ["vm-1", "vm-2", "vm-3"])
+    stats = engine.join()
+    assert running[1] <= 2
+    assert (stats['submitted'], stats['done'], stats['failed']) == (23, 19, 4)
+
+
+def test_engine_room_waits_for_a_free_worker():
+    release = threading.Event()
+    engine = CreationEngine(workers=1).start()
+    engine.submit(release.wait)
+    engine.submit(lambda: None)
+    waiter = threading.Thread(target=engine.wait_for_room)
+    waiter.start()
+    waiter.join(0.05)
+    assert waiter.is_alive()
+    release.set()
+    waiter.join(1)
+    assert not waiter.is_alive()
+    engine.join()
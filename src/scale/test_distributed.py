@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import copy
+import pytest
+import src.utils.config as config
+from src.scale.distributed import split_range, split_constraints
+
+
+def _constraints(scenario, **kwargs):
+    constraints = copy.deepcopy(config.SCALE_TEST_CONSTRAINTS)
+    constraints.update(current_test=scenario, vm_lifecycle_number_of_vms=5, **kwargs)
+    return constraints
+
+
+def test_split_range():
+    assert split_range(0, 10, 3) == [(0, 4), (4, 7), (7, 10)]
+    assert split_range(5, 7, 4) == [(5, 6), (6, 7)]
+    assert split_range(3, 3, 2) == []
+    assert split_range(0, 10, 0) == []
+
+
+def test_split_multi_node_by_nodes():
+    nodes = ["node-{i}".format(i=i) for i in range(5)]
+    workers = split_constraints(_constraints(config.MULTI_NODE), nodes, 2)
+    assert [worker['nodes'] for worker in workers] == [nodes[0::2], nodes[1::2]]
+    assert [worker['worker_id'] for worker in workers] == [0, 1]
+    assert [worker['journal'] for worker in workers] == [config.JOURNAL_FILE + ".0", config.JOURNAL_FILE + ".1"]
+    assert sum(worker['vm_lifecycle_number_of_vms'] for worker in workers) == 5
+
+
+def test_split_ocp_scheduling_by_index():
+    workers = split_constraints(_constraints(config.OCP_SCHEDULING, ocp_scheduling_total_vms=100, vm_offset=10),
+                                [], 4)
+    assert [(worker['vm_offset'], worker['ocp_scheduling_total_vms']) for worker in workers] == \
+        [(10, 33), (33, 56), (56, 78), (78, 100)]
+
+
+@pytest.mark.parametrize("scenario", [config.SOAK, config.PHASED, "unknown"])
+def test_split_of_single_process_scenario(scenario):
+    assert split_constraints(_constraints(scenario), ["node-0"], 2) == []
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+from src.scale.journal import RunJournal, OP_CREATE, OP_ACTION, OP_DONE, STAGE_LIFECYCLE
+
+
+def test_replay_skips_torn_record(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = RunJournal(path)
+    journal.record_create("vm-1", "ns-1", node="node-1", state="Running")
+    journal.record_action("stop", "vm-1", "ns-1", True, stage=STAGE_LIFECYCLE)
+    journal.record_done()
+    journal.close()
+    with open(path, 'a') as stream:
+        stream.write('{"op": "create", "vm": "vm-')
+    records = list(RunJournal.replay(path))
+    assert [record['op'] for record in records] == [OP_CREATE, OP_ACTION, OP_DONE]
+    assert records[1]['stage'] == STAGE_LIFECYCLE
+    # a new journal ends the torn line before appending
+    journal = RunJournal(path)
+    journal.record_create("vm-2", "ns-1")
+    journal.close()
+    assert [record.get('vm') for record in RunJournal.replay(path)] == ["vm-1", "vm-1", None, "vm-2"]
+
+
+def test_reset_drops_records(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = RunJournal(path)
+    journal.record_create("vm-1", "ns-1")
+    journal.flush()
+    journal.reset()
+    journal.close()
+    assert list(RunJournal.replay(path)) == []
+
+
+def test_replay_of_missing_journal(tmp_path):
+    assert list(RunJournal.replay(str(tmp_path / "none.jsonl"))) == []
+
+
+def test_remove_drops_worker_journals(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    for name in ["journal.jsonl", "journal.jsonl.0", "journal.jsonl.1", "journal.jsonl.bak"]:
+        (tmp_path / name).write_text(u"")
+    assert RunJournal.worker_paths(path) == [path + ".0", path + ".1"]
+    assert sorted(RunJournal.remove(path)) == [path, path + ".0", path + ".1"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["journal.jsonl.bak"]
+
+
+class PausingLock(object):
+    """
+    Lock that pauses its owner once, right after the armed release
+    """
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.armed = None
+        self.paused = threading.Event()
+        self.resume = threading.Event()
+
+    def __enter__(self):
+        self.lock.acquire()
+
+    def __exit__(self, *args):
+        self.lock.release()
+        if self.armed is threading.current_thread():
+            self.armed = None
+            self.paused.set()
+            self.resume.wait(0.5)
+
+
+def test_batches_reach_the_file_in_append_order(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = RunJournal(path, batch_size=100, flush_interval=60)
+    journal._lock = lock = PausingLock(journal._lock)
+
+    def _first():
+        journal.record_create("vm-1", "ns-1")
+        lock.armed = threading.current_thread()
+        # pauses after taking its batch
+        journal.flush()
+
+    first = threading.Thread(target=_first)
+    first.start()
+    assert lock.paused.wait(5)
+    journal.record_action("stop", "vm-1", "ns-1", True)
+    journal.flush()
+    lock.resume.set()
+    first.join()
+    journal.close()
+    assert [record['op'] for record in RunJournal.replay(path)] == [OP_CREATE, OP_ACTION]
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+from src.scale.placement import PlacementPlanner
+
+GI = 1024.0 ** 3
+REQUEST = {'cpu': 1.0, 'memory': 2 * GI, 'kvm': 1}
+
+
+def _nodes(*allocatable):
+    return OrderedDict(("node-{i}".format(i=i), {'cpu': cpu, 'memory': memory * GI, 'kvm': kvm})
+                       for i, (cpu, memory, kvm) in enumerate(allocatable))
+
+
+def test_slots_from_the_scarcest_resource():
+    planner = PlacementPlanner(_nodes((8, 64, 110), (64, 8, 110), (64, 64, 3)), REQUEST)
+    assert list(planner.slots.values()) == [8, 4, 3]
+    assert planner.capacity == 15
+
+
+def test_slots_subtract_requests_on_the_node():
+    used = {'node-0': {'cpu': 6.0, 'memory': 4 * GI, 'kvm': 6}}
+    planner = PlacementPlanner(_nodes((8, 64, 110), (8, 64, 110)), REQUEST, used=used)
+    assert list(planner.slots.values()) == [2, 8]
+
+
+def test_overcommitted_node_has_no_slots():
+    used = {'node-0': {'cpu': 12.0, 'memory': 0, 'kvm': 0}}
+    planner = PlacementPlanner(_nodes((8, 64, 110)), REQUEST, used=used)
+    assert planner.slots['node-0'] == 0
+    assert planner.plan(1) == []
+
+
+def test_plan_packs_the_fullest_node_first():
+    used = {'node-1': {'cpu': 5.0, 'memory': 0, 'kvm': 0}}
+    planner = PlacementPlanner(_nodes((8, 64, 110), (8, 64, 110), (8, 64, 110)), REQUEST, used=used)
+    assert planner.plan(6) == ['node-1'] * 3 + ['node-0'] * 3
+
+
+def test_plan_stops_when_the_cluster_is_full():
+    planner = PlacementPlanner(_nodes((2, 64, 110), (1, 64, 110)), REQUEST)
+    assert sorted(planner.plan(10)) == ['node-0', 'node-0', 'node-1']
+    assert planner.plan(10, max_per_node=1) == ['node-0', 'node-1']
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import src.utils.config as config
+from src.scale.creation_engine import TokenBucket
+from src.scale.ramp import AdaptiveRamp
+
+
+class FakeVmiCache(object):
+    def __init__(self, pending=0):
+        self.pending = pending
+
+    def count(self, phase):
+        return self.pending if phase == "Pending" else 0
+
+
+class FakeSampler(object):
+    node_list = ["node-0", "node-1"]
+
+    def __init__(self, idle):
+        self.idle = idle
+
+    def latest_idle(self, node_name):
+        return self.idle.get(node_name)
+
+
+def test_ramp_increases_while_healthy():
+    bucket = TokenBucket(2)
+    ramp = AdaptiveRamp(bucket, FakeVmiCache(), max_backlog=10)
+    assert ramp.step() == 2 + config.RAMP_INCREASE
+    assert bucket.rate == ramp.rate
+
+
+def test_ramp_backs_off_on_backlog():
+    vmi_cache = FakeVmiCache()
+    bucket = TokenBucket(8)
+    ramp = AdaptiveRamp(bucket, vmi_cache, max_backlog=10)
+    vmi_cache.pending = 10
+    assert ramp.step() == 8 * config.RAMP_DECREASE
+    vmi_cache.pending = 0
+    assert ramp.step() == 8 * config.RAMP_DECREASE + config.RAMP_INCREASE
+    # 8 backed off, 4 kept up
+    assert ramp.stop() == 8 * config.RAMP_DECREASE
+
+
+def test_ramp_backs_off_on_node_cpu():
+    sampler = FakeSampler({'node-0': 80.0, 'node-1': config.CPU_IDLE_THRESHOLD - 1})
+    ramp = AdaptiveRamp(TokenBucket(config.RAMP_MIN_RATE), FakeVmiCache(), node_sampler=sampler)
+    assert ramp.step() == config.RAMP_MIN_RATE
+    # only node-0 is checked
+    ramp.nodes = ["node-0"]
+    assert ramp.step() == config.RAMP_MIN_RATE + config.RAMP_INCREASE
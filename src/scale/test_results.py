@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import src.utils.config as config
+from src.scale.latency import LatencyTracker
+from src.scale.results import RunStore, encode_columns, decode_column, throughput, mann_whitney, compare
+
+STARTED = 1700000000.0
+
+
+def _tracker(count, scale=1.0):
+    latency = LatencyTracker()
+    for index in range(count):
+        created = STARTED + index
+        latency.add_record({
+            'vm_name': "vm-{index}".format(index=index), 'namespace': "ns-{ns}".format(ns=index % 2),
+            'node': "node-0", 'batch': 0, 'phase': None, 'created': created,
+            'scheduled': created + 1.0 * scale, 'running': created + (2.0 + index % 5 * 0.1) * scale
+        })
+    return latency
+
+
+def _constraints(backend=config.BACKEND_CLUSTER):
+    return {'backend': backend, 'current_test': config.SINGLE_NODE}
+
+
+def test_mann_whitney():
+    assert mann_whitney([], [1.0]) is None
+    assert mann_whitney([1.0, 2.0, 3.0], [1.0, 2.0, 3.0]) > 0.9
+    assert mann_whitney(list(range(30)), [value + 20 for value in range(30)]) < 0.01
+
+
+def test_columns_round_trip():
+    records = _tracker(4).snapshot()
+    columns = encode_columns(records, STARTED)
+    assert columns['namespace']['values'] == ["ns-0", "ns-1"]
+    assert decode_column(columns['namespace']) == [record.namespace for record in records]
+    assert columns['created'] == [0.0, 1.0, 2.0, 3.0]
+    assert throughput(columns)['create_rate'] == 4 / 3.0
+
+
+def test_runs_of_the_same_second_get_unique_ids(tmp_path):
+    store = RunStore(str(tmp_path))
+    first = store.save(_constraints(), {}, _tracker(3), STARTED)
+    second = store.save(_constraints(), {}, _tracker(3), STARTED)
+    assert first != second
+    ids = [run['id'] for run in store.index()]
+    assert len(set(ids)) == 2
+    assert store.load(second)[0]['id'] == ids[1] == ids[0] + "_2"
+
+
+def test_simulated_run_is_not_saved(tmp_path):
+    store = RunStore(str(tmp_path / "runs"))
+    assert store.save(_constraints(config.BACKEND_SIMULATED), {}, _tracker(3), STARTED) is None
+    assert not os.path.exists(store.dirname)
+
+
+def test_compare_flags_regression(tmp_path):
+    store = RunStore(str(tmp_path))
+    baseline = store.save(_constraints(), {}, _tracker(30), STARTED)
+    run = store.save(_constraints(), {}, _tracker(30, scale=2.0), STARTED)
+    rows = dict((row['metric'], row) for row in compare(store.load(baseline), store.load(run)))
+    assert rows['time_to_running p50']['regression']
+    assert not rows['create_rate']['regression']
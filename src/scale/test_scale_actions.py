@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import pytest
+import src.utils.config as config
+import src.scale.scale_actions as scale_actions
+from src.scale.benchmark import bench_constraints
+from src.scale.phases import PhaseRunner
+
+
+@pytest.fixture
+def constraints(tmp_path, monkeypatch):
+    # results and reports go to ./log
+    monkeypatch.chdir(tmp_path)
+    return bench_constraints(config.OCP_SCHEDULING, 20, str(tmp_path / "journal.jsonl"))
+
+
+def test_cpu_sampler_not_started_without_cpu_gate(constraints):
+    executor = scale_actions.ScaleExecutor(scale_test_constraints=constraints)
+    # as with a live cluster: ocp scheduling with the fixed ramp has no CPU gate
+    executor._sample_cpu = True
+    executor.execute()
+    assert len(executor.registry) == 20
+    assert executor.node_sampler._threads == []
+
+
+@pytest.mark.parametrize("batch_size", [0, 5])
+def test_fixed_ramp_pauses_all_workers(constraints, batch_size):
+    constraints.update({
+        'ocp_scheduling_total_vms': 50, 'number_of_vms_in_interval': 10, 'delay_between_intervals': 1,
+        'create_workers': 10, 'max_in_flight': 10, 'create_batch_size': batch_size
+    })
+    executor = scale_actions.ScaleExecutor(scale_test_constraints=constraints)
+    start = time.time()
+    executor.execute()
+    # a pause after the VMs 10, 20, 30 and 40
+    assert time.time() - start >= 4
+    assert len(executor.registry) == 50
+
+
+def test_cleanup_removes_vms_and_namespaces(constraints):
+    constraints['ocp_scheduling_total_vms'] = 250
+    executor = scale_actions.ScaleExecutor(scale_test_constraints=constraints)
+    executor.execute()
+    teardown = executor.cleanup(timeout=30, workers=2)
+    assert teardown['namespaces'] == teardown['namespaces_deleted'] == 3
+    assert teardown['vms'] == 250
+    assert executor.client.get_namespaces() == []
+
+
+def test_lifecycle_progress_is_journaled_apart_from_soak_actions(constraints):
+    executor = scale_actions.ScaleExecutor(scale_test_constraints=constraints)
+    executor.scale_out_with_openshift_scheduling(number_of_vms=10)
+    # stops of a soak before the lifecycle stage
+    for vm in executor.registry.select_for_action('stop', 3):
+        executor.registry.apply_action('stop', vm.name, vm.namespace)
+        executor.journal.record_action('stop', vm.name, vm.namespace, True)
+    executor.vm_lifecycle('stop', 2)
+    assert executor.lifecycle_done == {'stop': 2}
+    executor.journal.close()
+    resumed = scale_actions.ScaleExecutor(scale_test_constraints=constraints)
+    assert resumed.lifecycle_done == {'stop': 2}
+    assert resumed.registry.action_counts['stop'] == 5
+    resumed.journal.close()
+
+
+def test_planned_placement_packs_nodes(constraints):
+    constraints['placement'] = config.PLACEMENT_PLANNED
+    executor = scale_actions.ScaleExecutor(scale_test_constraints=constraints)
+    executor.execute()
+    assert len(executor.registry) == 20
+    assert len(set(vm.node for vm in executor.registry.vms.values())) == 1
+
+
+@pytest.mark.parametrize("scenario, nodes, namespace", [
+    (config.SINGLE_NODE, None, "cnv-scale-ns-1"),
+    (config.MULTI_NODE, ["sim-node-3"], "cnv-scale-ns-4"),
+    (config.OCP_SCHEDULING, None, "cnv-scale-ns-1"),
+])
+def test_dry_run_in_target_namespace(constraints, scenario, nodes, namespace):
+    constraints.update(current_test=scenario, nodes=nodes, max_number_of_vm_per_node=2)
+    executor = scale_actions.ScaleExecutor(scale_test_constraints=constraints)
+    validated = []
+    validate_vm = executor.client.validate_vm
+    executor.client.validate_vm = lambda body, namespace: validated.append(namespace) or validate_vm(body, namespace)
+    executor.execute()
+    assert validated == [namespace]
+    assert set(vm.namespace for vm in executor.registry.vms.values()) == {namespace}
+
+
+def test_asyncio_engine_creates_and_runs_lifecycle(constraints):
+    constraints.update(engine=config.ENGINE_ASYNCIO, running_state=False, vm_lifecycle_action_list='stop',
+                       vm_lifecycle_number_of_vms=5, max_in_flight=8)
+    executor = scale_actions.ScaleExecutor(scale_test_constraints=constraints)
+    executor.execute()
+    assert len(executor.registry) == 20
+    assert executor.lifecycle_done == {'stop': 5}
+    assert executor.client.count_vmis_at_status('Running') == 15
+
+
+@pytest.mark.parametrize("engine, batch_size", [
+    (config.ENGINE_THREADS, 0), (config.ENGINE_THREADS, 5), (config.ENGINE_ASYNCIO, 0)
+])
+def test_busy_node_does_not_hold_other_nodes(constraints, engine, batch_size):
+    constraints.update(current_test=config.MULTI_NODE, nodes=["sim-node-1", "sim-node-2"], max_number_of_vm_per_node=10,
+                       engine=engine, create_batch_size=batch_size, create_workers=4, max_in_flight=4)
+    executor = scale_actions.ScaleExecutor(scale_test_constraints=constraints)
+    executor.node_sampler.interval = 0.05
+    executor.node_sampler.samples["sim-node-1"].append((0, 5.0))
+    created = []
+    vm_created = executor._vm_created
+
+    def _vm_created(vm_name, ns_name, node_name, state):
+        created.append(node_name)
+        if len(created) == 10:
+            executor.node_sampler.samples["sim-node-1"].append((1, 90.0))
+        vm_created(vm_name, ns_name, node_name, state)
+
+    executor._vm_created = _vm_created
+    executor.execute()
+    assert created == ["sim-node-2"] * 10 + ["sim-node-1"] * 10
+
+
+def test_phased_run_skips_lifecycle_stage(constraints):
+    constraints.update(current_test=config.PHASED, vm_lifecycle_action_list='stop', vm_lifecycle_number_of_vms=5,
+                       phases=[{'type': config.PHASE_RAMP, 'target': 10}, {'type': config.PHASE_TEARDOWN}])
+    executor = scale_actions.ScaleExecutor(scale_test_constraints=constraints)
+    start = time.time()
+    executor.execute()
+    assert time.time() - start < 30
+    assert executor.lifecycle_done == {}
+    assert len(executor.registry) == 0
+
+
+def test_burst_phase_runs_at_its_rate(constraints):
+    constraints.update(current_test=config.PHASED, phases=[
+        {'type': config.PHASE_RAMP, 'target': 20},
+        {'name': 'stop-all', 'type': config.PHASE_BURST, 'action': 'stop', 'rate': 10}
+    ])
+    executor = scale_actions.ScaleExecutor(scale_test_constraints=constraints)
+    results = PhaseRunner(executor, constraints['phases']).run()
+    burst = results[1]
+    assert burst['result']['ok'] == 20
+    # 10 actions from the full bucket, 10 more at 10/s
+    assert burst['elapsed'] >= 0.9
+
+
+def test_completed_journal_starts_a_fresh_run(constraints):
+    scale_actions.ScaleExecutor(scale_test_constraints=constraints).execute()
+    executor = scale_actions.ScaleExecutor(scale_test_constraints=constraints)
+    assert len(executor.registry) == 0
+    executor.execute()
+    assert len(executor.registry) == 20
+    assert os.path.isfile(constraints['journal'] + ".done")
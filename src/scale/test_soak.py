@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+import src.utils.config as config
+import src.scale.scale_actions as scale_actions
+from src.scale.benchmark import bench_constraints
+from src.scale.soak import SoakRunner, RollingStats
+
+
+@pytest.fixture
+def executor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    constraints = bench_constraints(config.OCP_SCHEDULING, 12, str(tmp_path / "journal.jsonl"))
+    constraints['soak_population'] = 10
+    return scale_actions.ScaleExecutor(scale_test_constraints=constraints)
+
+
+def test_fill_creates_only_the_missing_vms(executor):
+    # a churned population: VMs above the population index, low ones deleted
+    executor.scale_out_with_openshift_scheduling(12)
+    for i in [3, 4, 5]:
+        vm_name = "{vm}{counter}".format(vm=executor.base_vm_name, counter=i)
+        executor.client.delete_vm(vm_name, "cnv-scale-ns-1")
+        executor.registry.remove(vm_name, "cnv-scale-ns-1")
+    runner = SoakRunner(executor)
+    runner.fill()
+    assert len(executor.registry) == 10
+    assert (executor.base_vm_name + "12", "cnv-scale-ns-1") in executor.registry
+    assert (executor.base_vm_name + "3", "cnv-scale-ns-1") not in executor.registry
+    assert runner.next_index == 13
+
+
+def test_window_has_target_and_achieved_rate(tmp_path):
+    stats = RollingStats(window=1, dirname=str(tmp_path), target_rate=5.0)
+    stats.record('stop', 0.1)
+    window = stats.roll(population=10)
+    assert window['target_ops_per_second'] == 5.0
+    assert window['ops'] == 1 and window['ops_per_second'] > 0
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import copy
+import src.utils.config as config
+import src.api.client as client
+import src.api.simulator as simulator
+from src.scale.benchmark import VM_YAML
+from src.scale.warmup import ImageWarmup, target_nodes, daemonset_body
+
+NODES = ["node-0", "node-1", "node-2"]
+
+
+def _constraints(scenario, **kwargs):
+    constraints = copy.deepcopy(config.SCALE_TEST_CONSTRAINTS)
+    constraints.update(current_test=scenario, **kwargs)
+    return constraints
+
+
+def test_target_nodes():
+    assert target_nodes(_constraints(config.SINGLE_NODE, node="node-2"), NODES) == ["node-2"]
+    assert target_nodes(_constraints(config.SINGLE_NODE, node=None), NODES) == ["node-0"]
+    assert target_nodes(_constraints(config.SINGLE_NODE, node=None), []) == []
+    assert target_nodes(_constraints(config.MULTI_NODE, nodes=["node-1"]), NODES) == ["node-1"]
+    assert target_nodes(_constraints(config.OCP_SCHEDULING), NODES) == NODES
+
+
+def test_daemonset_pins_the_nodes():
+    body = daemonset_body(["quay.io/disk:1"], nodes=["node-1"])
+    spec = body['spec']['template']['spec']
+    assert [container['image'] for container in spec['initContainers']][1:] == ["quay.io/disk:1"]
+    terms = spec['affinity']['nodeAffinity']['requiredDuringSchedulingIgnoredDuringExecution']['nodeSelectorTerms']
+    assert terms[0]['matchExpressions'][0]['values'] == ["node-1"]
+    assert 'affinity' not in daemonset_body(["quay.io/disk:1"])['spec']['template']['spec']
+
+
+def test_prepull_on_the_first_node_without_node(monkeypatch):
+    monkeypatch.setattr(config, 'PREPULL_POLL_INTERVAL', 0.05)
+    cluster = client.Client(dyn_client=simulator.SimulatedDynamicClient())
+    constraints = _constraints(config.SINGLE_NODE, node=None, vm_yaml=VM_YAML)
+    nodes = target_nodes(constraints, cluster.get_ready_node_list())
+    result = ImageWarmup(cluster, cluster.get_vm_template(VM_YAML, constraints), nodes, timeout=10).run()
+    assert result['nodes'] == 1
+    assert result['ready'] == 1
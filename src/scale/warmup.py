@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import src.utils.config as config
+import src.utils.logger as logger
+
+logger = logger.MyLogger.__call__().get_logger()
+
+PREPULL_NAME = "endurance-prepull"
+PREPULL_VOLUME = "prepull"
+PREPULL_MOUNT = "/prepull"
+
+
+def target_nodes(constraints, node_list):
+    """
+    Nodes the scenario loads
+    :param constraints: scale test constraints
+    :param node_list: ready compute nodes
+    :return: list of node names
+    """
+    if constraints['current_test'] == config.SINGLE_NODE:
+        # without a node the scenario takes the first ready node
+        return [constraints['node']] if constraints['node'] else list(node_list[:1])
+    if constraints['current_test'] == config.MULTI_NODE and constraints['nodes']:
+        return list(constraints['nodes'])
+    return list(node_list)
+
+
+def daemonset_body(images, nodes=None):
+    """
+    DaemonSet pulling the images on every compute node (or only on nodes).
+    containerDisk images have no shell, so a static busybox is copied to an
+    emptyDir and every image runs it as an init container; the pod is ready
+    once all images are on the node.
+    :param images: list of image names
+    :param nodes: node names, None for all compute nodes
+    :return: DaemonSet body
+    """
+    volume_mounts = [{'name': PREPULL_VOLUME, 'mountPath': PREPULL_MOUNT}]
+    init_containers = [{
+        'name': 'busybox',
+        'image': config.PREPULL_HELPER_IMAGE,
+        'command': ['cp', '/bin/busybox', PREPULL_MOUNT + '/busybox'],
+        'volumeMounts': volume_mounts
+    }]
+    for index, image in enumerate(images):
+        init_containers.append({
+            'name': "image-{index}".format(index=index),
+            'image': image,
+            'imagePullPolicy': 'IfNotPresent',
+            'command': [PREPULL_MOUNT + '/busybox', 'true'],
+            'volumeMounts': volume_mounts
+        })
+    node_key, _, node_value = config.COMPUTE_NODE_SELECTOR.partition("=")
+    pod_spec = {
+        'nodeSelector': {node_key: node_value},
+        'tolerations': [{'operator': 'Exists'}],
+        'terminationGracePeriodSeconds': 0,
+        'initContainers': init_containers,
+        'containers': [{
+            'name': 'pause',
+            'image': config.PREPULL_PAUSE_IMAGE,
+            'resources': {'requests': {'cpu': '1m', 'memory': '8Mi'}}
+        }],
+        'volumes': [{'name': PREPULL_VOLUME, 'emptyDir': {}}]
+    }
+    if nodes is not None:
+        pod_spec['affinity'] = {'nodeAffinity': {'requiredDuringSchedulingIgnoredDuringExecution': {
+            'nodeSelectorTerms': [{'matchExpressions': [
+                {'key': 'kubernetes.io/hostname', 'operator': 'In', 'values': list(nodes)}
+            ]}]
+        }}}
+    labels = {'app': PREPULL_NAME, config.RUN_LABEL_KEY: config.RUN_LABEL_VALUE}
+    return {
+        'apiVersion': 'apps/v1',
+        'kind': 'DaemonSet',
+        'metadata': {'name': PREPULL_NAME, 'labels': labels},
+        'spec': {
+            'selector': {'matchLabels': {'app': PREPULL_NAME}},
+            'template': {'metadata': {'labels': labels}, 'spec': pod_spec}
+        }
+    }
+
+
+class ImageWarmup(object):
+    """
+    Pull the containerDisk images of the VM template on the target nodes in
+    parallel before the measured ramp, so the first VMs on a node do not pay
+    the image pull in their time to Running.
+    The node status image list is capped by the kubelet (50 images), so a node
+    has the images when its DaemonSet pod is ready.
+    """
+
+    def __init__(self, client, vm_template, nodes, timeout=config.PREPULL_TIMEOUT,
+                 namespace=config.PREPULL_NAMESPACE):
+        """
+        :param client: Client
+        :param vm_template: VmTemplate
+        :param nodes: node names to pull the images on
+        :param timeout: seconds to wait for the images on all nodes
+        :param namespace: namespace for the DaemonSet (labeled, removed by cleanup)
+        """
+        self.client = client
+        self.vm_template = vm_template
+        self.nodes = nodes
+        self.timeout = float(timeout)
+        self.namespace = namespace
+
+    def run(self):
+        """
+        :return: dict with images, nodes, ready nodes and seconds
+        """
+        images = self.vm_template.images()
+        if not self.nodes:
+            logger.error("Prepull: no target nodes, skipped")
+            return {'images': [], 'nodes': 0, 'ready': 0, 'seconds': 0.0}
+        if not images:
+            logger.info("Prepull: no containerDisk images in the VM template")
+            return {'images': [], 'nodes': len(self.nodes), 'ready': 0, 'seconds': 0.0}
+        for image, pull_policy in images:
+            if pull_policy is None and (image.endswith(":latest") or ":" not in image.rsplit("/", 1)[-1]):
+                logger.info("Prepull: {image} has the latest tag, every VM start checks the registry again "
+                            "(imagePullPolicy Always), set the containerDisk imagePullPolicy to IfNotPresent "
+                            "to skip it".format(image=image))
+        images = [image for image, _ in images]
+        logger.info("Prepull: {images} on {nodes} nodes".format(images=images, nodes=len(self.nodes)))
+        start = time.time()
+        self.client.add_namespace(self.namespace)
+        self.client.create_daemonset(daemonset_body(images, self.nodes), self.namespace)
+        ready = 0
+        try:
+            while True:
+                status = self.client.get_daemonset_status(PREPULL_NAME, self.namespace)
+                ready = int(status.get('numberReady') or 0)
+                if ready >= len(self.nodes):
+                    break
+                if time.time() - start > self.timeout:
+                    logger.error("Prepull: images on {ready} of {nodes} nodes after {timeout}s, start anyway".format(
+                        ready=ready, nodes=len(self.nodes), timeout=self.timeout))
+                    break
+                logger.info("Prepull: images on {ready} of {nodes} nodes".format(ready=ready, nodes=len(self.nodes)))
+                time.sleep(config.PREPULL_POLL_INTERVAL)
+        finally:
+            self.client.delete_daemonset(PREPULL_NAME, self.namespace)
+        seconds = time.time() - start
+        logger.info("Prepull: done in {seconds:.1f}s".format(seconds=seconds))
+        return {'images': images, 'nodes': len(self.nodes), 'ready': ready, 'seconds': seconds}
@@ -6,20 +6,125 @@
 SINGLE_NODE = "single_node"
 MULTI_NODE = "multi_node"
 OCP_SCHEDULING = "ocp_scheduling"
+CLEANUP = "cleanup"
+SOAK = "soak"
+PHASED = "phased"  # run the 'phases' list of the yaml
+DISTRIBUTED_SCENARIOS = [SINGLE_NODE, MULTI_NODE, OCP_SCHEDULING]  # scenarios split between worker processes
+LIFECYCLE_SCENARIOS = [SINGLE_NODE, MULTI_NODE, OCP_SCHEDULING]  # scenarios followed by the vm lifecycle stage
+
+# phase types of the phased scenario
+PHASE_RAMP = "ramp"  # create VMs up to target
+PHASE_HOLD = "hold"  # keep the VMs for duration seconds
+PHASE_BURST = "burst"  # run action on target VMs at once
+PHASE_CHURN = "churn"  # soak churn for duration seconds
+PHASE_DRAIN = "drain"  # wait till no VMI is Pending/Scheduling/Scheduled
+PHASE_TEARDOWN = "teardown"  # delete all VMs and namespaces
+PHASE_PREPULL = "prepull"  # pull the containerDisk images on the nodes
+PHASE_TYPES = [PHASE_RAMP, PHASE_HOLD, PHASE_BURST, PHASE_CHURN, PHASE_DRAIN, PHASE_TEARDOWN, PHASE_PREPULL]
 
 
 # virtctl
 VIRTCTL_ACTION = "{virtctl_path} {action} {vm_name} -n {namespace}"
 
+# labels on every VM and namespace the tool creates
+RUN_LABEL_KEY = "endurance.kubevirt.io/created-by"
+RUN_LABEL_VALUE = "enduranceRunner"
+RUN_LABEL_SELECTOR = "{key}={value}".format(key=RUN_LABEL_KEY, value=RUN_LABEL_VALUE)
+COMPUTE_NODE_SELECTOR = "node-role.kubernetes.io/compute=true"  # nodes the tool loads
+
+# kubevirt api
+KUBEVIRT_API_VERSION = "kubevirt.io/v1alpha3"
+VM_SUBRESOURCE_PATH = "/apis/subresources.kubevirt.io/v1alpha3/namespaces/{namespace}/virtualmachines/{vm_name}/{action}"
+
+# lifecycle modes
+LIFECYCLE_SUBRESOURCE = "subresource"  # PUT start/stop/restart subresource
+LIFECYCLE_PATCH = "patch"  # patch spec.running (no restart)
+LIFECYCLE_VIRTCTL = "virtctl"  # fork virtctl per VM
+CREATE_POST = "post"  # create VMs with POST
+CREATE_APPLY = "apply"  # create VMs with server side apply, safe to repeat
+
 
 # general
 OC_PATH = "/usr/bin/oc"
 VIRTCTL_PATH = "/usr/bin/virtctl"
 DELAY = 30  # delay between X running VMs
 NUMBER_OF_VMS_IN_INTERVAL = 10
+CREATE_WORKERS = 10  # creation engine worker threads
+CREATE_RATE = 5  # max VM creates per second, 0 means no limit
+CREATE_BATCH_SIZE = 0  # VMs per namespace batch, 0 creates VM by VM
+MAX_IN_FLIGHT = 10  # max create requests in flight
+ENGINE_THREADS = "threads"  # CreationEngine worker pool
+ENGINE_ASYNCIO = "asyncio"  # coroutines on one event loop (python 3)
+ASYNC_CONCURRENCY = 1000  # max requests in flight with the asyncio engine
+ASYNC_POOL_MAXSIZE = 100  # keep-alive connections of the asyncio client
+CONNECTION_POOL_MAXSIZE = 50  # pooled HTTP connections to the apiserver
+LIST_PAGE_SIZE = 500  # objects per LIST page (limit/continue)
+VMI_CACHE_SYNC_TIMEOUT = 120  # seconds to wait for the first VMI LIST of the cache
+DISCOVERY_CACHE_DIR = "~/.kube/cache/endurance"  # API discovery per cluster URL and server version
+DISCOVERY_CACHE_TTL = 600  # seconds before the discovery cache is read again from the cluster, 0 always reads it
+LIFECYCLE_WORKERS = 10  # threads for bulk lifecycle actions
+CPU_SAMPLE_INTERVAL = 5  # seconds between node CPU samples
+CPU_SAMPLE_HISTORY = 60  # samples kept per node
+CPU_IDLE_THRESHOLD = 20.0  # min CPU idle percent on node to add VMs
+RAMP_FIXED = "fixed"  # sleep delay_between_intervals every number_of_vms_in_interval VMs
+RAMP_ADAPTIVE = "adaptive"  # AIMD on the create rate
+RAMP_INTERVAL = 10  # seconds between adaptive ramp steps
+RAMP_INCREASE = 1.0  # creates/s added when the cluster keeps up
+RAMP_DECREASE = 0.5  # rate multiplier on back off
+RAMP_MIN_RATE = 0.5
+RAMP_MAX_RATE = 200.0
+RAMP_MAX_BACKLOG = 50  # max Pending/Scheduling/Scheduled VMIs before back off
+CLEANUP_WORKERS = 10  # namespaces deleted in parallel
+CLEANUP_TIMEOUT = 1800  # seconds to wait for VMs and namespaces to be gone
+JOURNAL_FILE = "./log/run_journal.jsonl"  # run state, replayed on start to resume
+JOURNAL_BATCH_SIZE = 100  # records per fsync
+JOURNAL_FLUSH_INTERVAL = 1  # max seconds a record waits for fsync
+BACKEND_CLUSTER = "cluster"  # live cluster from kubeconfig
+BACKEND_SIMULATED = "simulated"  # in process simulated cluster (src/api/simulator.py)
+SIM_NODES = 10
+SIM_API_LATENCY = 0.0  # seconds per simulated API call
+SIM_SCHEDULE_DELAY = 0.0  # seconds from VMI Pending to Scheduled
+SIM_START_DELAY = 0.0  # seconds from VMI Scheduled to Running
+SIM_FAILURE_RATE = 0.0  # fraction of simulated API calls that fail
+SIM_KVM_DEVICES = 110
+SIM_IMAGE_PULL_DELAY = 0.0  # seconds a node takes to pull an image the first time
+BENCH_SIZES = [1000, 10000, 100000]
+BENCH_SCENARIOS = [SINGLE_NODE, MULTI_NODE, OCP_SCHEDULING]
+PLACEMENT_SCHEDULER = "scheduler"  # let the openshift scheduler place the VMs
+PLACEMENT_PLANNED = "planned"  # bin-pack the VMs on the nodes ahead of time and pin them
+KVM_RESOURCE = "devices.kubevirt.io/kvm"
+CPU_ALLOCATION_RATIO = 10  # KubeVirt default, vCPU per requested core when the VM has no cpu request
+VM_MEMORY_OVERHEAD = "256Mi"  # virt-launcher memory on top of the VM memory
+SOAK_DURATION = 4 * 3600  # seconds of churn
+SOAK_RATE = 2  # target operations per second
+SOAK_POPULATION = 100  # VMs kept on the cluster
+SOAK_MIX = "start:3,stop:3,restart:2,create:1,delete:1"  # operation:weight
+SOAK_WINDOW = 60  # seconds per rolling stats window
+METRICS_PORT = 0  # Prometheus /metrics endpoint, 0 disables it
+METRICS_ADDRESS = "0.0.0.0"
+METRICS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]  # API call seconds
+METRICS_RUNNING_BUCKETS = [1, 2, 5, 10, 20, 30, 60, 120, 300, 600]  # time to Running seconds
+LOG_ASYNC = True  # log through a queue and a background writer thread
+LOG_BATCH_SIZE = 256  # max log records per write
+LOG_QUEUE_SIZE = 10000  # max queued log records, logging blocks when the writer falls behind
+PHASE_STATUS_INTERVAL = 60  # seconds between VMI status lines in hold phases
+DRAIN_TIMEOUT = 1800  # seconds a drain phase waits
+PREPULL_NAMESPACE = "endurance-prepull"
+PREPULL_HELPER_IMAGE = "docker.io/library/busybox:1.36"  # static busybox, runs 'true' in the containerDisk images
+PREPULL_PAUSE_IMAGE = "registry.k8s.io/pause:3.9"
+PREPULL_TIMEOUT = 900  # seconds to wait for the images on all nodes
+PREPULL_POLL_INTERVAL = 5  # seconds between DaemonSet status checks
+DISTRIBUTED_WORKERS = 1  # load generator processes
+PROGRESS_INTERVAL = 5  # seconds between worker progress messages
 VMI_STATUS = ["Running", "Scheduling", "Pending", "Unknown", "CrashLoopBackOff"]
 TEST_SCALE = "scale"
 LOG_FILE = "/tmp/enduranceRunner.log"
+RESULTS_DIR = "./log"  # latency reports are written next to the log
+RUNS_DIR = "./log/runs"  # run results store, one file per run and an index
+RUNS_INDEX = "index.jsonl"
+COMPARE_THRESHOLD = 10.0  # percent a metric may get worse before compare flags a regression
+COMPARE_ALPHA = 0.05  # max p-value of a significant latency change
+PERCENTILES = [50, 90, 99]
 
 # test info
 SCALE_TEST_CONSTRAINTS = {
@@ -38,7 +143,31 @@ SCALE_TEST_CONSTRAINTS = {
     'number_of_vms_in_interval': NUMBER_OF_VMS_IN_INTERVAL,
     'vm_lifecycle_action_list': 'stop',
     'vm_lifecycle_number_of_vms': 1,
-    'vm_offset': 0
+    'vm_offset': 0,
+    'create_workers': CREATE_WORKERS,
+    'create_rate': CREATE_RATE,
+    'max_in_flight': MAX_IN_FLIGHT,
+    'create_method': CREATE_POST,
+    'create_batch_size': CREATE_BATCH_SIZE,
+    'lifecycle_mode': LIFECYCLE_SUBRESOURCE,
+    'ramp_mode': RAMP_ADAPTIVE,
+    'ramp_max_backlog': RAMP_MAX_BACKLOG,
+    'journal': JOURNAL_FILE,
+    'backend': BACKEND_CLUSTER,
+    'engine': ENGINE_THREADS,
+    'placement': PLACEMENT_SCHEDULER,
+    'soak_duration': SOAK_DURATION,
+    'soak_rate': SOAK_RATE,
+    'soak_population': SOAK_POPULATION,
+    'soak_mix': SOAK_MIX,
+    'soak_window': SOAK_WINDOW,
+    'metrics_port': METRICS_PORT,
+    'phases': None,  # list of phase dicts for the phased scenario
+    'prepull': False,  # pull the containerDisk images on the nodes before the measured ramp
+    'prepull_timeout': PREPULL_TIMEOUT,
+    'vm_events': False,  # write per VM events to ./log/events_<date>.jsonl
+    'nodes': None,  # multi_node: load only these nodes (distributed workers)
+    'worker_id': None  # set in distributed workers
 }
 
 
@@ -3,17 +3,38 @@
 import subprocess
 import yaml
 import shlex
-import time
 from pprint import pformat
 import copy
+import importlib
 from . import config, logger
 
-CPU_IDLE_CHECK = "ssh -o StrictHostKeyChecking=no root@{node_name} top -bn1"
-CPU_IDLE_CHECK_PIPE = "grep Cpu "
+QUANTITY_SUFFIXES = [
+    ("Ki", 2 ** 10), ("Mi", 2 ** 20), ("Gi", 2 ** 30), ("Ti", 2 ** 40), ("Pi", 2 ** 50), ("Ei", 2 ** 60),
+    ("m", 1e-3), ("k", 1e3), ("K", 1e3), ("M", 1e6), ("G", 1e9), ("T", 1e12), ("P", 1e15), ("E", 1e18)
+]
 
 logger = logger.MyLogger.__call__().get_logger()
 
 
+class LazyModule(object):
+    """
+    Module imported on the first attribute access, for the heavy kubernetes
+    and openshift imports that config only paths do not need
+    """
+
+    def __init__(self, name):
+        """
+        :param name: module name, like 'openshift.dynamic'
+        """
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
 def execute_command(command):
     """
     Execute command
@@ -30,61 +51,47 @@ def execute_command(command):
     return output
 
 
-def configuration_parser():
+def parse_quantity(quantity):
+    """
+    Parse kubernetes resource quantity like '500m', '64Mi' or '2'
+    :param quantity: str or number
+    :return: float (cores for cpu, bytes for memory)
+    """
+    quantity = str(quantity).strip()
+    for suffix, multiplier in QUANTITY_SUFFIXES:
+        if quantity.endswith(suffix):
+            return float(quantity[:-len(suffix)]) * multiplier
+    return float(quantity)
+
+
+def configuration_parser(test_name=config.TEST_SCALE):
     """
     Parse the test yaml. First check the 'current_test' and update
     the dict SCALE_TEST_CONSTRAINTS with test constraints.
+    :param test_name: test in config.TESTS_CONF
     """
-    test_new_config = {}
-    test_name = ""
-    for key in config.TESTS_CONF.keys():
-        yaml_obj = None
-        test_name = key
-        yaml_file = config.TESTS_CONF[key][0]
-        config_dict = config.TESTS_CONF[key][1]
-
-        with open(yaml_file, 'r') as stream:
-            try:
-                yaml_obj = yaml.load(stream)
-            except yaml.YAMLError as exc:
-                logger.error("Failed to read yaml file {yaml}, err: \n {err}".format(yaml=yaml_file, err=exc.message))
-                exit(1)
+    if test_name not in config.TESTS_CONF:
+        logger.error("Test {test_name} is not in {tests}".format(test_name=test_name, tests=list(config.TESTS_CONF)))
+        exit(1)
+    yaml_file, config_dict = config.TESTS_CONF[test_name]
+    with open(yaml_file, 'r') as stream:
+        try:
+            yaml_obj = yaml.safe_load(stream)
+        except yaml.YAMLError as exc:
+            logger.error("Failed to read yaml file {yaml}, err: \n {err}".format(yaml=yaml_file, err=str(exc)))
+            exit(1)
 
-        test_new_config = copy.deepcopy(config_dict)
-        current_test = yaml_obj['current_test']
-        test_new_config.update({'vm_offset': yaml_obj['constraints']['vm_offset']})
-        test_new_config.update({'current_test': current_test})
-        test_new_config['vm_yaml'] = yaml_obj['vm_yaml']
-        test_new_config['oc_path'] = yaml_obj['general']['oc_path']
-        test_new_config['virtctl_path'] = yaml_obj['general']['virtctl_path']
-        test_new_config.update(yaml_obj['vm_info'])
-        test_new_config.update(yaml_obj['constraints'])
+    test_new_config = copy.deepcopy(config_dict)
+    current_test = yaml_obj['current_test']
+    test_new_config.update({'vm_offset': yaml_obj['constraints']['vm_offset']})
+    test_new_config.update({'current_test': current_test})
+    test_new_config['vm_yaml'] = yaml_obj['vm_yaml']
+    test_new_config['oc_path'] = yaml_obj['general']['oc_path']
+    test_new_config['virtctl_path'] = yaml_obj['general']['virtctl_path']
+    test_new_config.update(yaml_obj['vm_info'])
+    test_new_config.update(yaml_obj['constraints'])
+    test_new_config['phases'] = yaml_obj.get('phases')
     logger.info("For test {test_name} using this configration: \n {config}".format(
         test_name=test_name, config=pformat(test_new_config))
     )
     return test_new_config
-
-
-def check_cpu_on_node(node_name):
-    """
-    Check CPU idle status on node. If idle is lower then 20%
-    Wait till CPU idle is more then 20% again.
-    :param node_name: node address (node_name)
-    """
-    idle_status = _get_cpu_idle_status(node_name)
-    logger.info("idle status: %s", idle_status)
-    while float(idle_status) < 20.0:
-        logger.info("CPU usage is above 80% , current idle status: {idle_status}".format(idle_status=idle_status))
-        time.sleep(10)
-        idle_status = _get_cpu_idle_status(node_name)
-
-
-def _get_cpu_idle_status(node_name):
-    p1 = subprocess.Popen(shlex.split(CPU_IDLE_CHECK.format(node_name=node_name)), stdout=subprocess.PIPE)
-    p2 = subprocess.Popen(["grep", "Cpu"], stdin=p1.stdout, stdout=subprocess.PIPE)
-    p1.stdout.close()
-    output = p2.communicate()[0]
-    fields = output.strip().split()
-    logger.info('out %s', output)
-    return fields[7]
-
@@ -2,8 +2,17 @@
 # -*- coding: utf-8 -*-
 
 import os
+import json
 import datetime
 import logging
+import threading
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+from . import config
+
+_STOP = object()
 
 
 class SingletonType(type):
@@ -15,8 +24,127 @@ class SingletonType(type):
         return cls._instances[cls]
 
 
-class MyLogger(object):
-    __metaclass__ = SingletonType
+class AsyncLogHandler(logging.Handler):
+    """
+    Queue log records and write them from a background thread.
+    The caller only pays for the enqueue; the writer formats a batch of
+    records and writes it to every target handler with one write and one flush.
+    Like the stdlib handlers, a bad record is reported with handleError and
+    never raises in the code that logged it.
+    """
+
+    def __init__(self, handlers, batch_size=config.LOG_BATCH_SIZE, queue_size=config.LOG_QUEUE_SIZE):
+        """
+        :param handlers: target handlers (their formatter, level and stream are used)
+        :param batch_size: max records per write
+        :param queue_size: max queued records, emit blocks when the queue is full
+        """
+        logging.Handler.__init__(self)
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_writer(self):
+        # a forked process does not have the writer thread of its parent
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._thread = threading.Thread(target=self._run, name="log-writer")
+            self._thread.daemon = True
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def emit(self, record):
+        try:
+            # resolve what can change or can not be formatted later in the writer
+            if record.args:
+                record.msg = record.getMessage()
+                record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            self._ensure_writer()
+            self._queue.put(record)
+        except Exception:
+            self.handleError(record)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is _STOP
+            records = [record for record in batch if record is not _STOP]
+            try:
+                self._write(records)
+            except Exception:
+                # the writer thread has to outlive a bad record or handler
+                if records:
+                    self.handleError(records[0])
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, batch):
+        for handler in self.handlers:
+            lines = []
+            for record in batch:
+                if record.levelno < handler.level:
+                    continue
+                try:
+                    lines.append(handler.format(record) + "\n")
+                except Exception:
+                    handler.handleError(record)
+            if not lines:
+                continue
+            handler.acquire()
+            try:
+                handler.stream.write("".join(lines))
+                handler.stream.flush()
+            except Exception:
+                handler.handleError(batch[0])
+            finally:
+                handler.release()
+
+    def flush(self):
+        """
+        Wait until the queued records are written
+        """
+        if self._pid == os.getpid() and self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """
+        Write the queued records and stop the writer
+        """
+        if self._pid == os.getpid() and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        for handler in self.handlers:
+            handler.close()
+        logging.Handler.close(self)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        event = dict(record.msg)
+        event['t'] = record.created
+        return json.dumps(event, separators=(',', ':'))
+
+
+class MyLogger(SingletonType('SingletonBase', (object,), {})):
     _logger = None
 
     def __init__(self):
@@ -26,15 +154,48 @@ class MyLogger(object):
 
         now = datetime.datetime.now()
         dirname = "./log"
-        
+
         if not os.path.isdir(dirname):
             os.mkdir(dirname)
         file_handler = logging.FileHandler(dirname + "/log_" + now.strftime("%Y-%m-%d")+".log")
         stream_handler = logging.StreamHandler()
         file_handler.setFormatter(formatter)
         stream_handler.setFormatter(formatter)
-        self._logger.addHandler(file_handler)
-        self._logger.addHandler(stream_handler)
+        if config.LOG_ASYNC:
+            self._logger.addHandler(AsyncLogHandler([file_handler, stream_handler]))
+        else:
+            self._logger.addHandler(file_handler)
+            self._logger.addHandler(stream_handler)
+        self._events = logging.getLogger("endurance.events")
+        self._events.propagate = False
 
     def get_logger(self):
         return self._logger
+
+    def enable_events(self, path=None):
+        """
+        Write per VM events (vm_event) as JSON lines
+        :param path: events file, default ./log/events_<date>.jsonl
+        :return: events file path
+        """
+        if self._events.handlers:
+            return self._events.handlers[0].handlers[0].baseFilename
+        path = path or "./log/events_" + datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".jsonl"
+        file_handler = logging.FileHandler(path)
+        file_handler.setFormatter(JsonLinesFormatter())
+        self._events.addHandler(AsyncLogHandler([file_handler]))
+        self._events.setLevel(logging.INFO)
+        return path
+
+    def event(self, event, **fields):
+        """
+        Log per VM event to the JSON lines sink, no-op when it is not enabled
+        :param event: event name, like 'created'
+        """
+        if self._events.handlers:
+            fields['event'] = event
+            self._events.info(fields)
+
+
+def vm_event(event, **fields):
+    MyLogger.__call__().event(event, **fields)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import bisect
+import threading
+import functools
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+from . import config, logger
+
+logger = logger.MyLogger.__call__().get_logger()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join('{name}="{value}"'.format(
+        name=name, value=str(value).replace("\\", "\\\\").replace('"', '\\"')) for name, value in pairs) + "}"
+
+
+class Metric(object):
+    """
+    Metric with label values, kept in a dict under a short lock so updates are
+    cheap enough for the create hot path
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames or [])
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        """
+        :return: list of (suffix, label values, extra labels, value)
+        """
+        with self._lock:
+            return [("", labels, None, value) for labels, value in self._values.items()]
+
+    def render(self):
+        lines = ["# HELP {name} {doc}".format(name=self.name, doc=self.documentation),
+                 "# TYPE {name} {type}".format(name=self.name, type=self.type)]
+        for suffix, labels, extra, value in self.samples():
+            lines.append("{name}{suffix}{labels} {value}".format(
+                name=self.name, suffix=suffix, labels=_labels(self.labelnames, labels, extra), value=float(value)))
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, **kwargs):
+        """
+        :param labels: label values in the order of labelnames
+        :param kwargs: amount (default 1)
+        """
+        amount = kwargs.get('amount', 1)
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Gauge set directly or read at scrape time from a function returning
+    {label values tuple: value}
+    """
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=None):
+        super(Gauge, self).__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def set_function(self, function):
+        self._function = function
+
+    def samples(self):
+        if self._function is None:
+            return super(Gauge, self).samples()
+        try:
+            values = self._function()
+        except Exception as err:
+            logger.error("Gauge {name} failed, err: {err}".format(name=self.name, err=err))
+            return []
+        return [("", labels, None, value) for labels, value in values.items()]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=None, buckets=config.METRICS_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labelnames)
+        self.buckets = sorted(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # bucket counts, +Inf, sum
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, list(counts)) for labels, counts in self._values.items()]
+        samples = []
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ["+Inf"], counts):
+                cumulative += count
+                samples.append(("_bucket", labels, [("le", bound)], cumulative))
+            samples.append(("_count", labels, None, cumulative))
+            samples.append(("_sum", labels, None, counts[-1]))
+        return samples
+
+
+class MetricsRegistry(object):
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=None):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=None):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=None, buckets=config.METRICS_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """
+        :return: all metrics in Prometheus text format
+        """
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+VMS_CREATED = REGISTRY.counter("endurance_vms_created_total", "VMs created by the tool")
+VM_ACTIONS = REGISTRY.counter("endurance_vm_actions_total", "VM lifecycle actions issued", ["action", "result"])
+API_ERRORS = REGISTRY.counter("endurance_api_errors_total", "API calls that raised", ["call"])
+API_LATENCY = REGISTRY.histogram("endurance_api_call_seconds", "API call latency", ["call"])
+TIME_TO_RUNNING = REGISTRY.histogram(
+    "endurance_time_to_running_seconds", "Time from VM create to VMI Running", buckets=config.METRICS_RUNNING_BUCKETS)
+PHASE = REGISTRY.gauge("endurance_phase", "1 while the phase of a phased scenario runs", ["phase"])
+VMIS = REGISTRY.gauge("endurance_vmis", "VMIs per phase and node (VMI watch cache)", ["phase", "node"])
+
+
+def timed(call):
+    """
+    Decorator, observe the call latency in API_LATENCY and count exceptions in API_ERRORS
+    :param call: call label
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                API_ERRORS.inc(call)
+                raise
+            finally:
+                API_LATENCY.observe(time.time() - start, call)
+        return wrapper
+    return decorator
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MetricsServer(object):
+    """
+    Serve REGISTRY on http://<address>:<port>/metrics from a daemon thread
+    """
+
+    def __init__(self, port=config.METRICS_PORT, address=config.METRICS_ADDRESS):
+        self.port = int(port)
+        self.address = address
+        self._server = None
+
+    def start(self):
+        try:
+            self._server = _Server((self.address, self.port), _Handler)
+        except Exception as err:
+            logger.error("Metrics endpoint on {address}:{port} failed, err: {err}".format(
+                address=self.address, port=self.port, err=err))
+            return self
+        thread = threading.Thread(target=self._server.serve_forever, name="metrics-server")
+        thread.daemon = True
+        thread.start()
+        logger.info("Metrics on http://{address}:{port}/metrics".format(address=self.address, port=self.port))
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
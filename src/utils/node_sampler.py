@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import shlex
+import subprocess
+import threading
+from collections import deque, OrderedDict
+from . import config, logger
+
+CPU_STAT_STREAM = "ssh -o StrictHostKeyChecking=no -o ServerAliveInterval=30 root@{node_name} " \
+                  "'while true; do head -1 /proc/stat; sleep {interval}; done'"
+
+logger = logger.MyLogger.__call__().get_logger()
+
+
+def parse_cpu_line(line):
+    """
+    Parse the first /proc/stat line
+    :param line: 'cpu  user nice system idle iowait irq softirq steal ...'
+    :return: (idle ticks, total ticks) or None
+    """
+    fields = line.split()
+    if not fields or fields[0] != 'cpu':
+        return None
+    ticks = [int(value) for value in fields[1:]]
+    idle = ticks[3] + (ticks[4] if len(ticks) > 4 else 0)
+    return idle, sum(ticks)
+
+
+class NodeCpuSampler(object):
+    """
+    Background CPU sampler for all nodes.
+    Keep one ssh session per node streaming /proc/stat, turn the deltas into
+    idle percent and keep the last samples in a ring buffer per node.
+    """
+
+    def __init__(self, node_list, interval=config.CPU_SAMPLE_INTERVAL, history=config.CPU_SAMPLE_HISTORY):
+        self.node_list = list(node_list)
+        self.interval = interval
+        self.samples = dict((node_name, deque(maxlen=history)) for node_name in self.node_list)
+        self._processes = {}
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """
+        Start the ssh sessions, a started sampler is not started again
+        """
+        with self._lock:
+            if self._threads or self._stopped.is_set():
+                return self
+            for node_name in self.node_list:
+                t = threading.Thread(target=self._sample_node, args=(node_name,), name="cpu-" + node_name)
+                t.daemon = True
+                t.start()
+                self._threads.append(t)
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        for process in list(self._processes.values()):
+            process.terminate()
+
+    def _sample_node(self, node_name):
+        command = CPU_STAT_STREAM.format(node_name=node_name, interval=self.interval)
+        while not self._stopped.is_set():
+            previous = None
+            try:
+                process = subprocess.Popen(shlex.split(command), stdout=subprocess.PIPE, universal_newlines=True)
+                self._processes[node_name] = process
+                for line in iter(process.stdout.readline, ''):
+                    current = parse_cpu_line(line)
+                    if current is None:
+                        continue
+                    if previous is not None and current[1] > previous[1]:
+                        idle = 100.0 * (current[0] - previous[0]) / (current[1] - previous[1])
+                        self.samples[node_name].append((time.time(), idle))
+                    previous = current
+                process.wait()
+            except Exception as err:
+                logger.error("CPU sampler on node {node} failed, err: {err}".format(node=node_name, err=err))
+            if not self._stopped.is_set():
+                logger.info("CPU sampler on node {node} disconnected, reconnecting".format(node=node_name))
+                self._stopped.wait(self.interval)
+
+    def latest_idle(self, node_name):
+        """
+        Latest CPU idle percent, does not block
+        :return: float or None when there is no sample yet
+        """
+        samples = self.samples.get(node_name)
+        return samples[-1][1] if samples else None
+
+    def is_idle(self, node_name, threshold=config.CPU_IDLE_THRESHOLD):
+        """
+        Admission check, a node without samples is idle
+        """
+        idle = self.latest_idle(node_name)
+        return idle is None or idle >= threshold
+
+    def wait_for_idle(self, node_name, threshold=config.CPU_IDLE_THRESHOLD):
+        """
+        Wait till CPU idle on node is above threshold
+        """
+        while not self.is_idle(node_name, threshold):
+            logger.info("CPU idle on node {node} is {idle:.1f}%, waiting".format(
+                node=node_name, idle=self.latest_idle(node_name)))
+            time.sleep(self.interval)
+
+
+class NodeGate(object):
+    """
+    Per node CPU gate for the job dispatcher.
+    A job pinned to a busy node waits in the queue of its node and is let
+    through when the node is idle again, the jobs of the other nodes go on
+    meanwhile. The wait happens before the job is submitted, so it never
+    holds a worker, a rate token or an in-flight slot.
+    """
+
+    def __init__(self, cpu_sampler, node_of=lambda job: job[3]):
+        """
+        :param cpu_sampler: function returning the NodeCpuSampler, called on the first job pinned to a node
+        :param node_of: function returning the node of a job, None for no node
+        """
+        self.cpu_sampler = cpu_sampler
+        self.node_of = node_of
+        self.node_sampler = None
+        self.pending = OrderedDict()
+
+    @property
+    def interval(self):
+        return self.node_sampler.interval
+
+    def _is_idle(self, node_name):
+        if self.node_sampler is None:
+            self.node_sampler = self.cpu_sampler()
+        return self.node_sampler.is_idle(node_name)
+
+    def __len__(self):
+        return sum(len(jobs) for jobs in self.pending.values())
+
+    def offer(self, job):
+        """
+        :return: True if the job can go now, else it waits in the queue of its node
+        """
+        node_name = self.node_of(job)
+        if node_name is None or (node_name not in self.pending and self._is_idle(node_name)):
+            return True
+        self.pending.setdefault(node_name, deque()).append(job)
+        return False
+
+    def release(self):
+        """
+        Take the first waiting job of every idle node
+        :return: list of jobs
+        """
+        released = []
+        for node_name in list(self.pending):
+            if self._is_idle(node_name):
+                jobs = self.pending[node_name]
+                released.append(jobs.popleft())
+                if not jobs:
+                    del self.pending[node_name]
+        return released
+
+    def jobs(self, jobs, room=None):
+        """
+        Gate jobs, blocking
+        :param jobs: iterable of jobs
+        :param room: function called before every job is let through, waits till the engine can take it
+        :return: generator of jobs in the order they can go
+        """
+        room = room or (lambda: None)
+        for job in jobs:
+            room()
+            for ready in self.release():
+                yield ready
+                room()
+            if self.offer(job):
+                yield job
+        while self.pending:
+            released = self.release()
+            if not released:
+                logger.info("Waiting for CPU idle on nodes {nodes}".format(nodes=list(self.pending)))
+                time.sleep(self.interval)
+            for ready in released:
+                room()
+                yield ready
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+import src.utils.config as config
+from src.utils.helper import parse_quantity, configuration_parser
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+
+
+@pytest.mark.parametrize("quantity,value", [
+    ("500m", 0.5), ("2", 2.0), (4, 4.0), ("1.5", 1.5), ("64Mi", 64 * 2 ** 20), ("1Gi", 2 ** 30),
+    ("32Ki", 32 * 1024), ("1G", 1e9), ("100k", 1e5), (" 2Ti ", 2 * 2 ** 40)
+])
+def test_parse_quantity(quantity, value):
+    assert parse_quantity(quantity) == value
+
+
+def test_configuration_parser_reads_scale_yaml(monkeypatch):
+    monkeypatch.chdir(REPO)
+    constraints = configuration_parser()
+    assert constraints['current_test'] in config.DISTRIBUTED_SCENARIOS + [config.SOAK, config.PHASED, config.CLEANUP]
+    assert constraints['phases'][0]['type'] in config.PHASE_TYPES
+    assert constraints['journal'] == config.JOURNAL_FILE
+
+
+def test_configuration_parser_exits_on_bad_yaml(tmp_path, monkeypatch):
+    path = tmp_path / "scale_test.yaml"
+    path.write_text(u"constraints: [unclosed\n")
+    monkeypatch.setitem(config.TESTS_CONF, config.TEST_SCALE, [str(path), config.SCALE_TEST_CONSTRAINTS])
+    with pytest.raises(SystemExit):
+        configuration_parser()
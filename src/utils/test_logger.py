@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import logging
+import pytest
+from src.utils.logger import AsyncLogHandler
+
+
+class BadFormatter(logging.Formatter):
+    def format(self, record):
+        if record.msg == "bad":
+            raise ValueError("bad record")
+        return logging.Formatter.format(self, record)
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    # handleError reports to stderr only with raiseExceptions
+    monkeypatch.setattr(logging, 'raiseExceptions', False)
+    stream = io.StringIO() if str is not bytes else io.BytesIO()
+    target = logging.StreamHandler(stream)
+    target.setFormatter(BadFormatter('%(message)s'))
+    async_handler = AsyncLogHandler([target], queue_size=5)
+    yield async_handler, stream
+    async_handler.close()
+
+
+def _record(msg, *args):
+    return logging.LogRecord("test", logging.INFO, __file__, 1, msg, args, None)
+
+
+def test_bad_arguments_do_not_raise(handler):
+    async_handler, stream = handler
+    async_handler.emit(_record("%s %s", 1))
+    async_handler.emit(_record("after %s", 1))
+    async_handler.flush()
+    assert stream.getvalue() == "after 1\n"
+
+
+def test_format_error_keeps_the_writer(handler):
+    async_handler, stream = handler
+    async_handler.emit(_record("bad"))
+    async_handler.flush()
+    async_handler.emit(_record("good"))
+    async_handler.flush()
+    assert stream.getvalue() == "good\n"
+    assert async_handler._thread.is_alive()
+
+
+def test_queue_is_bounded(handler):
+    async_handler, stream = handler
+    async_handler.emit(_record("first"))
+    assert async_handler._queue.maxsize == 5
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from src.utils.node_sampler import NodeCpuSampler, NodeGate, parse_cpu_line
+
+
+def test_parse_cpu_line():
+    assert parse_cpu_line("cpu  10 0 5 80 5 0 0 0") == (85, 100)
+    assert parse_cpu_line("cpu0 10 0 5 80 5 0 0 0") is None
+    assert parse_cpu_line("") is None
+
+
+def test_node_without_samples_is_idle():
+    sampler = NodeCpuSampler(["node-1"])
+    assert sampler.latest_idle("node-1") is None
+    assert sampler.is_idle("node-1")
+    sampler.samples["node-1"].append((0, 5.0))
+    assert not sampler.is_idle("node-1", threshold=20.0)
+
+
+def test_stopped_sampler_does_not_start():
+    sampler = NodeCpuSampler(["node-1"])
+    sampler.stop()
+    sampler.start()
+    assert sampler._threads == []
+
+
+def test_gate_holds_busy_node_jobs_only():
+    sampler = NodeCpuSampler(["node-1", "node-2"], interval=0.01)
+    sampler.samples["node-1"].append((0, 5.0))
+    jobs = [(0, "ns-1", "vm0", "node-1"), (1, "ns-2", "vm1", "node-2"),
+            (2, "ns-1", "vm2", "node-1"), (3, "ns-3", "vm3", None)]
+    order = []
+    for job in NodeGate(lambda: sampler).jobs(jobs):
+        order.append(job[0])
+        if job[0] == 3:
+            sampler.samples["node-1"].append((1, 90.0))
+    # node-1 jobs wait, in their order, till the node is idle
+    assert order == [1, 3, 0, 2]